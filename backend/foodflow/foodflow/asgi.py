@@ -0,0 +1,22 @@
+"""
+ASGI config for foodflow project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Use it (e.g. ``daphne foodflow.asgi:application``) when serving the
+``/api/eventos/pedidos/`` SSE stream, so open connections do not hold sync
+workers. Set ``VIEWS_ASSINCRONAS=True`` as well so the polling reads (tables,
+kitchen queue, order by code) go to the async views in
+``foodflow_app/assincrono.py``; ``manage.py benchmark_http`` compares this
+setup with gunicorn.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodflow.settings')
+
+application = get_asgi_application()
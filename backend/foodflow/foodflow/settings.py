@@ -1,6 +1,7 @@
 import os
 import dj_database_url
 from pathlib import Path
+from corsheaders.defaults import default_headers
 from decouple import config, Csv
 
 SECRET_KEY = config('SECRET_KEY', default='chave-insegura-apenas-para-build')
@@ -26,11 +27,13 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'foodflow_app.assincrono.WhiteNoiseAssincrono',  # WhiteNoise que não força a cadeia para síncrono no ASGI
+    'foodflow_app.respostas.RespostasApiMiddleware',
+    'foodflow_app.autenticacao.SessaoSeletivaMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'foodflow_app.auditoria.AuditoriaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -53,13 +56,22 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'foodflow.wsgi.application'
+ASGI_APPLICATION = 'foodflow.asgi.application'
+
+# Deploy ASGI (daphne foodflow.asgi:application): as leituras de polling
+# (mesas, fila da cozinha, pedido por código) passam para as views async de
+# assincrono.py. No WSGI (gunicorn) deixe False: lá as views async rodam num
+# event loop por requisição e só ficam mais lentas.
+VIEWS_ASSINCRONAS = config('VIEWS_ASSINCRONAS', default=False, cast=bool)
 
 DATABASES = {
     'default': dj_database_url.config(
         # 1. Tenta ler a variável DATABASE_URL (que é injetada pelo Kubernetes)
         default=config('DATABASE_URL', default=None),
         # 2. Se a variável não existir, usa um fallback seguro
-        conn_max_age=600 # Mantém a conexão viva por 10 minutos (performance)
+        # Mantém a conexão viva por 10 minutos (performance). No ASGI cada
+        # requisição usa uma thread nova, e conexões persistentes se acumulariam
+        conn_max_age=0 if VIEWS_ASSINCRONAS else 600
     )
 }
 
@@ -72,6 +84,33 @@ if not DATABASES['default']:
         }
     }
 
+# Cache: memória local por padrão; com REDIS_URL passa a ser compartilhado
+# entre workers e réplicas
+REDIS_URL = config('REDIS_URL', default=None)
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Snapshot do cardápio (/api/cardapio/), chaveado pela VersaoCardapio
+CARDAPIO_CACHE = 'default'
+CARDAPIO_CACHE_TIMEOUT = config('CARDAPIO_CACHE_TIMEOUT', default=24 * 60 * 60, cast=int)
+
+# Resumo de status por código (/api/pedidos/status_resumo/), apagado a cada
+# evento do pedido. Com o locmem cada worker tem o seu cache, então o TTL
+# curto limita por quanto tempo outro worker pode responder o status antigo.
+STATUS_RESUMO_CACHE = 'default'
+STATUS_RESUMO_CACHE_TIMEOUT = config('STATUS_RESUMO_CACHE_TIMEOUT', default=30, cast=int)
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',},
@@ -93,15 +132,44 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.AllowAny',],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'foodflow_app.autenticacao.TokenEmCache',
         'rest_framework.authentication.SessionAuthentication',
     ],
 }
 
+# Tokens resolvidos ficam em memória por worker (autenticacao.py). Logout e
+# troca de senha limpam o cache do próprio worker; nos demais o token some
+# em até AUTENTICACAO_CACHE_TTL segundos.
+AUTENTICACAO_CACHE_TTL = config('AUTENTICACAO_CACHE_TTL', default=60, cast=int)
+AUTENTICACAO_CACHE_MAX = config('AUTENTICACAO_CACHE_MAX', default=1024, cast=int)
+
+# Rotas públicas de clientes e cozinha: a sessão (cookie) não é lida nem
+# gravada, então o polling não consulta a tabela de sessões
+ROTAS_SEM_SESSAO = [
+    '/api/cardapio/',
+    '/api/iniciar-comanda/',
+    '/api/pedido-por-codigo/',
+    '/api/pedidos/status_resumo/',
+    '/api/cozinha/',
+    '/api/eventos/',
+    '/api/imagens/',
+]
+
 AUTH_USER_MODEL = 'foodflow_app.Usuario'
 
+# Feed de eventos de pedidos (SSE em /api/eventos/pedidos/)
+# A conexão é encerrada após EVENTOS_SSE_DURACAO segundos e o EventSource
+# reconecta com o Last-Event-ID, para não prender um worker WSGI para sempre.
+EVENTOS_SSE_DURACAO = config('EVENTOS_SSE_DURACAO', default=25, cast=int)
+EVENTOS_SSE_INTERVALO = config('EVENTOS_SSE_INTERVALO', default=1.0, cast=float)
+EVENTOS_SSE_HEARTBEAT = config('EVENTOS_SSE_HEARTBEAT', default=15, cast=int)
+EVENTOS_SSE_RETRY_MS = config('EVENTOS_SSE_RETRY_MS', default=2000, cast=int)
+EVENTOS_RETENCAO_HORAS = config('EVENTOS_RETENCAO_HORAS', default=24, cast=int)
+
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
+# Idempotency-Key: o cardápio repete o "Confirmar" com a mesma chave (idempotencia.py)
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
 
 CSRF_TRUSTED_ORIGINS = [
     'http://localhost:8080',
@@ -109,3 +177,45 @@ CSRF_TRUSTED_ORIGINS = [
     'http://54.94.65.113:30087',
     'http://54.94.65.113:32000'
 ]
+
+# Auditoria (LogAlteracao): gravada em lotes por uma thread, depois do commit.
+# A fila é limitada; se encher, quem grava espera até AUDITORIA_ESPERA_MAX
+# segundos e depois o registro é descartado (contado nas métricas).
+AUDITORIA_ASSINCRONA = config('AUDITORIA_ASSINCRONA', default=True, cast=bool)
+AUDITORIA_FILA_MAX = config('AUDITORIA_FILA_MAX', default=10000, cast=int)
+AUDITORIA_LOTE = config('AUDITORIA_LOTE', default=200, cast=int)
+AUDITORIA_INTERVALO = config('AUDITORIA_INTERVALO', default=0.5, cast=float)
+AUDITORIA_ESPERA_MAX = config('AUDITORIA_ESPERA_MAX', default=0.05, cast=float)
+
+# Estimativa de preparo (Pedido.tempo_estimado, em minutos), aprendida dos
+# pedidos prontos dos últimos ESTIMATIVA_JANELA_DIAS dias. Cada worker relê só
+# o que ficou pronto desde a última leitura, no máximo a cada
+# ESTIMATIVA_ATUALIZACAO segundos.
+ESTIMATIVA_ATUALIZACAO = config('ESTIMATIVA_ATUALIZACAO', default=30, cast=int)
+ESTIMATIVA_JANELA_DIAS = config('ESTIMATIVA_JANELA_DIAS', default=30, cast=int)
+ESTIMATIVA_PADRAO_MINUTOS = config('ESTIMATIVA_PADRAO_MINUTOS', default=15, cast=int)
+ESTIMATIVA_PEDIDOS_SIMULTANEOS = config('ESTIMATIVA_PEDIDOS_SIMULTANEOS', default=4, cast=int)
+
+# Fila por praça da cozinha (estacoes.py). Cada worker relê os pedidos
+# alterados no máximo a cada COZINHA_ATUALIZACAO segundos; a espera da mesa
+# antecipa o item em COZINHA_PESO_ESPERA_MESA segundos por segundo esperado.
+COZINHA_ATUALIZACAO = config('COZINHA_ATUALIZACAO', default=2, cast=float)
+COZINHA_PESO_ESPERA_MESA = config('COZINHA_PESO_ESPERA_MESA', default=0.5, cast=float)
+COZINHA_FILA_LIMITE = config('COZINHA_FILA_LIMITE', default=50, cast=int)
+COZINHA_FILA_LIMITE_MAX = config('COZINHA_FILA_LIMITE_MAX', default=200, cast=int)
+
+# Delta da cozinha (?updated_since=): acima deste número de pedidos alterados,
+# ou com carimbo mais antigo que EVENTOS_RETENCAO_HORAS, a resposta é
+# {"reset": true} e o cliente recarrega a fila paginada
+COZINHA_DELTA_LIMITE = config('COZINHA_DELTA_LIMITE', default=500, cast=int)
+
+# Compressão das respostas JSON da API (respostas.py): brotli se o pacote
+# estiver instalado e o cliente aceitar, senão gzip; abaixo do mínimo não compensa
+COMPRESSAO_MINIMO = config('COMPRESSAO_MINIMO', default=1024, cast=int)
+COMPRESSAO_GZIP_NIVEL = config('COMPRESSAO_GZIP_NIVEL', default=6, cast=int)
+COMPRESSAO_BROTLI_QUALIDADE = config('COMPRESSAO_BROTLI_QUALIDADE', default=5, cast=int)
+
+# Criação de pedidos com Idempotency-Key (idempotencia.py): a primeira
+# resposta fica no banco e as repetições da mesma chave a recebem de volta
+# por até IDEMPOTENCIA_RETENCAO_HORAS; depois a chave pode ser reaproveitada.
+IDEMPOTENCIA_RETENCAO_HORAS = config('IDEMPOTENCIA_RETENCAO_HORAS', default=24, cast=int)
@@ -0,0 +1,120 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_safe
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from .leitura import RespostaJSON, amesas_em_dicts, apedidos_em_dicts, instante, linhas_pedidos
+from .models import Mesa, Pedido
+from .views import (
+    MARGEM_SINCRONIA, RESET_DELTA, CozinhaPagination, MesaViewSet, PedidoViewSet, consultas_delta, delta_expirado,
+    ler_updated_since,
+)
+
+# Views async dos endpoints de polling (mesas do garçom, fila da cozinha,
+# acompanhamento do cliente) para o deploy ASGI (VIEWS_ASSINCRONAS, urls.py).
+# Com as consultas no ORM async, uma requisição esperando o banco não segura
+# uma thread inteira, e as conexões SSE abertas não disputam workers com o
+# polling. Mesmo formato das views síncronas (leitura.py); as rotas são
+# públicas e não leem request.user, então não passam pela autenticação do DRF.
+# Escrita (POST etc.) nessas mesmas URLs continua nos viewsets síncronos.
+
+_mesas_sync = sync_to_async(MesaViewSet.as_view({'get': 'list', 'post': 'create'}))
+_cozinha_sync = sync_to_async(PedidoViewSet.as_view({'get': 'cozinha', 'post': 'cozinha'}))
+
+# ----------------------------
+# VIEWS
+# ----------------------------
+
+@require_safe
+async def pedido_por_codigo(request, codigo):
+    linhas = [linha async for linha in linhas_pedidos(Pedido.objects.da_comanda(codigo))]
+    if not linhas:
+        return RespostaJSON({'erro': 'Nenhuma comanda encontrada.'}, status=404)
+    return RespostaJSON(await apedidos_em_dicts(linhas))
+
+
+@csrf_exempt
+async def mesas(request):
+    if request.method not in ('GET', 'HEAD'):
+        return await _mesas_sync(request)
+    return RespostaJSON(await amesas_em_dicts(Mesa.objects.order_by('numero').com_valor_total()))
+
+
+@csrf_exempt
+async def cozinha(request):
+    if request.method not in ('GET', 'HEAD'):
+        return await _cozinha_sync(request)
+
+    pedidos = Pedido.objects.all()
+    if request.GET.get('updated_since'):
+        return await _cozinha_delta(request, pedidos)
+
+    status_param = request.GET.get('status')
+    pedidos = pedidos.filter(status=status_param) if status_param else pedidos.ativos()
+    paginator = CozinhaPagination()
+    try:
+        # A paginação por cursor do DRF é síncrona e quer um Request do DRF
+        pagina = await sync_to_async(paginator.paginate_queryset)(linhas_pedidos(pedidos), Request(request))
+    except APIException as erro:  # cursor inválido
+        return RespostaJSON({'detail': str(erro.detail)}, status=erro.status_code)
+    return paginator.get_paginated_response(await apedidos_em_dicts(pagina))
+
+
+async def _cozinha_delta(request, pedidos):
+    desde = ler_updated_since(request.GET['updated_since'])
+    if desde is None:
+        return RespostaJSON({'erro': 'updated_since inválido.'}, status=400)
+    if delta_expirado(desde):
+        return RespostaJSON(RESET_DELTA)
+
+    inicio = timezone.now()
+    alterados, removidos = consultas_delta(pedidos, desde)
+    alterados = [linha async for linha in alterados]
+    if len(alterados) > settings.COZINHA_DELTA_LIMITE:
+        return RespostaJSON(RESET_DELTA)
+    return RespostaJSON({
+        'reset': False,
+        'sincronizado_em': instante(inicio - MARGEM_SINCRONIA),
+        'resultados': await apedidos_em_dicts(alterados),
+        'removidos': [pedido_id async for pedido_id in removidos],
+    })
+
+# ----------------------------
+# ESTÁTICOS
+# ----------------------------
+
+class WhiteNoiseAssincrono(WhiteNoiseMiddleware):
+    """
+    WhiteNoiseMiddleware que também roda em modo async.
+
+    O original é só síncrono: no ASGI o Django põe a cadeia inteira abaixo
+    dele numa thread, e as views async deixam de ganhar alguma coisa. Aqui só
+    a entrega do arquivo estático vai para thread; o resto segue async.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
@@ -0,0 +1,268 @@
+import atexit
+import json
+import logging
+import queue
+import threading
+import time
+from contextvars import ContextVar
+from functools import partial
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, transaction
+from django.db.models.signals import post_delete, post_save
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from .models import Categoria, LogAlteracao, Mesa, Pedido, PedidoItem, Prato
+
+logger = logging.getLogger(__name__)
+
+MODELOS_AUDITADOS = [Pedido, PedidoItem, Prato, Categoria, Mesa]
+
+# Requisição em andamento, para saber quem fez a alteração. O DRF repassa o
+# usuário autenticado (token) para o HttpRequest, então basta guardar este.
+_requisicao = ContextVar('auditoria_requisicao', default=None)
+
+# ----------------------------
+# ESCRITOR EM SEGUNDO PLANO
+# ----------------------------
+
+class EscritorAuditoria:
+    """
+    Fila limitada + thread que grava LogAlteracao em lotes (bulk_create).
+
+    Quem enfileira espera no máximo `espera` segundos por espaço na fila;
+    passado isso o registro é descartado e contado em `descartados`, para
+    a auditoria nunca segurar a requisição.
+    """
+
+    def __init__(self, tamanho_max, lote, intervalo, espera):
+        self.fila = queue.Queue(maxsize=tamanho_max)
+        self.lote = lote
+        self.intervalo = intervalo
+        self.espera = espera
+        self._thread = None
+        self._trava = threading.Lock()
+        self._metricas = {
+            'enfileirados': 0,
+            'gravados': 0,
+            'descartados': 0,
+            'erros': 0,
+            'lotes': 0,
+            'esperas': 0,         # enfileiramentos que acharam a fila cheia
+            'espera_total_ms': 0.0,
+            'maior_fila': 0,
+        }
+        # O que ainda estiver na fila é gravado na saída do processo
+        atexit.register(self.descarregar)
+
+    def _contar(self, **valores):
+        with self._trava:
+            for nome, valor in valores.items():
+                self._metricas[nome] += valor
+
+    def metricas(self):
+        with self._trava:
+            metricas = dict(self._metricas)
+        metricas['na_fila'] = self.fila.qsize()
+        metricas['capacidade'] = self.fila.maxsize
+        metricas['thread_ativa'] = bool(self._thread and self._thread.is_alive())
+        return metricas
+
+    def iniciar(self):
+        # Sobe sob demanda (depois do fork do gunicorn, nunca durante migrate)
+        with self._trava:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._rodar, name='auditoria', daemon=True)
+            self._thread.start()
+
+    def enfileirar(self, registro):
+        if not settings.AUDITORIA_ASSINCRONA:
+            self._gravar([registro])
+            return
+
+        self.iniciar()
+        cheia = self.fila.full()
+        inicio = time.monotonic()
+        try:
+            self.fila.put(registro, timeout=self.espera)
+        except queue.Full:
+            self._contar(descartados=1, esperas=1, espera_total_ms=self.espera * 1000)
+            logger.warning("Fila de auditoria cheia; registro de %s descartado.", registro.tabela_nome)
+            return
+
+        tamanho = self.fila.qsize()
+        with self._trava:
+            self._metricas['enfileirados'] += 1
+            self._metricas['maior_fila'] = max(self._metricas['maior_fila'], tamanho)
+            if cheia:
+                self._metricas['esperas'] += 1
+                self._metricas['espera_total_ms'] += (time.monotonic() - inicio) * 1000
+
+    def _proximo_lote(self):
+        lote = [self.fila.get()]
+        # Junta o que chegar até o lote encher ou o intervalo acabar
+        limite = time.monotonic() + self.intervalo
+        while len(lote) < self.lote:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                lote.append(self.fila.get(timeout=restante))
+            except queue.Empty:
+                break
+        return lote
+
+    def _rodar(self):
+        while True:
+            lote = self._proximo_lote()
+            close_old_connections()
+            self._gravar(lote)
+            for _ in lote:
+                self.fila.task_done()
+
+    def _gravar(self, lote):
+        try:
+            for registro in lote:
+                registro.dados_anteriores = _para_json(registro.dados_anteriores)
+                registro.dados_novos = _para_json(registro.dados_novos)
+            LogAlteracao.objects.bulk_create(lote)
+        except Exception:
+            logger.exception("Falha ao gravar %d registros de auditoria.", len(lote))
+            self._contar(erros=len(lote))
+        else:
+            self._contar(gravados=len(lote), lotes=1)
+
+    def descarregar(self):
+        """Grava na hora tudo que está na fila (saída do processo, testes)."""
+        while True:
+            lote = []
+            while len(lote) < self.lote:
+                try:
+                    lote.append(self.fila.get_nowait())
+                except queue.Empty:
+                    break
+            if not lote:
+                return
+            self._gravar(lote)
+            for _ in lote:
+                self.fila.task_done()
+
+
+escritor = EscritorAuditoria(
+    tamanho_max=settings.AUDITORIA_FILA_MAX,
+    lote=settings.AUDITORIA_LOTE,
+    intervalo=settings.AUDITORIA_INTERVALO,
+    espera=settings.AUDITORIA_ESPERA_MAX,
+)
+
+
+def _para_json(dados):
+    # Ida e volta pelo encoder para guardar datas/decimais como no JSON da API
+    return None if dados is None else json.loads(json.dumps(dados, cls=DjangoJSONEncoder))
+
+# ----------------------------
+# CAPTURA
+# ----------------------------
+
+def instantaneo(instance):
+    return {campo.attname: getattr(instance, campo.attname) for campo in instance._meta.concrete_fields}
+
+
+def _usuario_atual():
+    requisicao = _requisicao.get()
+    usuario = getattr(requisicao, 'user', None)
+    return usuario.pk if usuario is not None and usuario.is_authenticated else None
+
+
+def registrar_alteracao(instance, acao, antes=None, depois=None):
+    """
+    Agenda um registro de auditoria para depois do commit.
+
+    Nada é gravado se a transação for desfeita. Use direto nos caminhos que
+    escrevem com update()/bulk_*, que não disparam os sinais do Django.
+    """
+    registro = LogAlteracao(
+        tabela_nome=instance._meta.db_table,
+        registro_id=instance.pk,
+        usuario_id=_usuario_atual(),
+        acao=acao,
+        dados_anteriores=antes,
+        dados_novos=depois,
+    )
+    transaction.on_commit(partial(escritor.enfileirar, registro))
+
+
+def registrar_lote(acao, instances):
+    for instance in instances:
+        registrar_alteracao(
+            instance, acao,
+            antes=instantaneo(instance) if acao == 'delete' else None,
+            depois=None if acao == 'delete' else instantaneo(instance),
+        )
+
+
+def _apos_salvar(sender, instance, created, **kwargs):
+    depois = instantaneo(instance)
+    antes = None if created else getattr(instance, '_auditoria_antes', None)
+    if antes is not None:
+        # Só os campos que mudaram, dos dois lados
+        mudaram = [campo for campo, valor in depois.items() if campo in antes and antes[campo] != valor]
+        if not mudaram:
+            return
+        antes = {campo: antes[campo] for campo in mudaram}
+        depois = {campo: depois[campo] for campo in mudaram}
+    registrar_alteracao(instance, 'insert' if created else 'update', antes, depois)
+    instance._auditoria_antes = instantaneo(instance)
+
+
+def _apos_apagar(sender, instance, **kwargs):
+    registrar_alteracao(instance, 'delete', antes=instantaneo(instance))
+
+
+def conectar_sinais():
+    for modelo in MODELOS_AUDITADOS:
+        post_save.connect(_apos_salvar, sender=modelo, dispatch_uid=f'auditoria_save_{modelo.__name__}')
+        post_delete.connect(_apos_apagar, sender=modelo, dispatch_uid=f'auditoria_delete_{modelo.__name__}')
+
+# ----------------------------
+# MIDDLEWARE / MÉTRICAS
+# ----------------------------
+
+class AuditoriaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = _requisicao.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            _requisicao.reset(token)
+
+    async def __acall__(self, request):
+        # O contextvar acompanha o sync_to_async até as views síncronas
+        token = _requisicao.set(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            _requisicao.reset(token)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def metricas_auditoria(request):
+    """Métricas da fila deste processo (cada worker tem a sua)."""
+    return Response(escritor.metricas())
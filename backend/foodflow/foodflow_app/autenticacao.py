@@ -0,0 +1,99 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.sessions.middleware import SessionMiddleware
+from rest_framework.authentication import TokenAuthentication
+
+# ----------------------------
+# TOKEN EM CACHE
+# ----------------------------
+
+class CacheTokens:
+    """
+    Token -> usuário em memória, com validade (TTL) e limite de tamanho (LRU).
+
+    O cache é de cada worker: logout e troca de senha limpam na hora o do
+    worker que atendeu (e os sinais do mesmo processo); nos outros o token
+    vale no máximo AUTENTICACAO_CACHE_TTL segundos a mais.
+    """
+
+    def __init__(self):
+        self._itens = OrderedDict()   # chave -> ((usuario, token), expira_em)
+        self._trava = threading.Lock()
+
+    def obter(self, chave):
+        with self._trava:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            if item[1] <= time.monotonic():
+                del self._itens[chave]
+                return None
+            self._itens.move_to_end(chave)
+            return item[0]
+
+    def guardar(self, chave, credenciais):
+        with self._trava:
+            self._itens[chave] = (credenciais, time.monotonic() + settings.AUTENTICACAO_CACHE_TTL)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > settings.AUTENTICACAO_CACHE_MAX:
+                self._itens.popitem(last=False)
+
+    def invalidar_token(self, chave):
+        with self._trava:
+            self._itens.pop(chave, None)
+
+    def invalidar_usuario(self, usuario_id):
+        with self._trava:
+            for chave in [c for c, ((usuario, _), _) in self._itens.items() if usuario.pk == usuario_id]:
+                del self._itens[chave]
+
+    def limpar(self):
+        with self._trava:
+            self._itens.clear()
+
+
+tokens = CacheTokens()
+
+
+class TokenEmCache(TokenAuthentication):
+    """TokenAuthentication que só vai ao banco (Token + Usuario) quando o token não está no cache."""
+
+    def authenticate_credentials(self, key):
+        credenciais = tokens.obter(key)
+        if credenciais is None:
+            credenciais = super().authenticate_credentials(key)
+            tokens.guardar(key, credenciais)
+        usuario, token = credenciais
+        # Cópia por requisição: quem altera request.user não mexe no objeto das outras threads
+        return copy.copy(usuario), token
+
+# ----------------------------
+# SESSÃO SÓ ONDE PRECISA
+# ----------------------------
+
+class SessaoSeletivaMiddleware(SessionMiddleware):
+    """
+    SessionMiddleware que ignora a sessão nas rotas públicas (ROTAS_SEM_SESSAO).
+
+    Nessas rotas o cookie de sessão não é lido nem regravado: o usuário fica
+    anônimo (ou o do token) e o polling de clientes e cozinha não consulta a
+    tabela de sessões. O cookie continua valendo no admin e no resto da API.
+    """
+
+    def _sem_sessao(self, request):
+        return request.path_info.startswith(tuple(settings.ROTAS_SEM_SESSAO))
+
+    def process_request(self, request):
+        if self._sem_sessao(request):
+            request.session = self.SessionStore()
+            return
+        super().process_request(request)
+
+    def process_response(self, request, response):
+        if self._sem_sessao(request):
+            return response
+        return super().process_response(request, response)
@@ -0,0 +1,419 @@
+import asyncio
+import random
+import statistics
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from urllib.parse import urlsplit
+
+from django.db import close_old_connections, connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .models import (
+    Usuario, Mesa, Categoria, Prato, Pedido, PedidoItem, PedidoStatus,
+    STATUS_ATIVOS, gerar_codigo_acesso,
+)
+
+# Tudo que o gerador cria é marcado com este nome para poder ser apagado depois
+MARCA = 'benchmark'
+LOTE = 5000
+
+# ----------------------------
+# GERADOR DE DADOS
+# ----------------------------
+
+def gerar_cardapio(categorias=5, pratos_por_categoria=10):
+    usuario, _ = Usuario.objects.get_or_create(username=MARCA, defaults={'role': 'gerente'})
+    pratos = []
+    for c in range(categorias):
+        categoria, _ = Categoria.objects.get_or_create(nome=f'{MARCA} {c}', defaults={'criado_por': usuario})
+        for p in range(pratos_por_categoria):
+            prato, _ = Prato.objects.get_or_create(
+                nome=f'{MARCA} {c}-{p}', categoria=categoria,
+                defaults={'criado_por': usuario, 'preco': Decimal(random.randint(800, 9000)) / 100},
+            )
+            pratos.append(prato)
+    return usuario, pratos
+
+
+def gerar_mesas(quantidade, numero_inicial=9000):
+    Mesa.objects.bulk_create(
+        [Mesa(numero=numero_inicial + i, capacidade=4, status='disponivel') for i in range(quantidade)],
+        ignore_conflicts=True,
+    )
+    return list(Mesa.objects.filter(numero__gte=numero_inicial, numero__lt=numero_inicial + quantidade))
+
+
+def gerar_historico(mesas, pratos, fechados, ativos_por_mesa=1, itens_por_pedido=3, dias=365):
+    """
+    Cria `fechados` pedidos pagos/cancelados espalhados em `dias` dias e
+    `ativos_por_mesa` pedidos em andamento por mesa, todos com itens.
+
+    Usa bulk_create direto (sem Pedido.save), em lotes, para aguentar
+    centenas de milhares de linhas.
+    """
+    agora = timezone.now()
+    em_andamento = [PedidoStatus.PENDENTE, PedidoStatus.EM_PREPARO, PedidoStatus.PRONTO, PedidoStatus.ENTREGUE]
+
+    def novo_pedido(status, criado_em):
+        return Pedido(
+            mesa=random.choice(mesas), status=status, nome_cliente=MARCA,
+            codigo_acesso=gerar_codigo_acesso(), data=criado_em,
+        )
+
+    def gravar(pedidos, datas):
+        pedidos = Pedido.objects.bulk_create(pedidos)
+        # auto_now_add ignora o valor passado; corrige as datas para espalhar o histórico
+        for pedido, criado_em in zip(pedidos, datas):
+            pedido.criado_em = criado_em
+            pedido.atualizado_em = criado_em
+        Pedido.objects.bulk_update(pedidos, ['criado_em', 'atualizado_em'], batch_size=LOTE)
+        PedidoItem.objects.bulk_create([
+            PedidoItem(pedido=pedido, prato=prato, quantidade=random.randint(1, 3), preco_unitario=prato.preco)
+            for pedido in pedidos
+            for prato in random.sample(pratos, min(itens_por_pedido, len(pratos)))
+        ], batch_size=LOTE)
+
+    for inicio in range(0, fechados, LOTE):
+        tamanho = min(LOTE, fechados - inicio)
+        datas = [agora - timedelta(seconds=random.randint(3600, dias * 86400)) for _ in range(tamanho)]
+        status = random.choices([PedidoStatus.PAGO, PedidoStatus.CANCELADO], weights=[95, 5], k=tamanho)
+        gravar([novo_pedido(s, d) for s, d in zip(status, datas)], datas)
+
+    ativos = []
+    for mesa in mesas:
+        for _ in range(ativos_por_mesa):
+            pedido = novo_pedido(random.choice(em_andamento), agora)
+            pedido.mesa = mesa
+            ativos.append(pedido)
+    gravar(ativos, [agora - timedelta(minutes=random.randint(1, 90)) for _ in ativos])
+
+
+def limpar_dados():
+    pedidos = Pedido.objects.filter(nome_cliente=MARCA)
+    PedidoItem.objects.filter(pedido__in=pedidos).delete()
+    pedidos.delete()
+    Mesa.objects.filter(pedido__isnull=True, numero__gte=9000).delete()
+    Prato.objects.filter(nome__startswith=MARCA).delete()
+    Categoria.objects.filter(nome__startswith=MARCA).delete()
+    Usuario.objects.filter(username=MARCA).delete()
+
+# ----------------------------
+# MEDIÇÃO
+# ----------------------------
+
+def resumir_tempos(tempos):
+    tempos = sorted(tempos)
+    if not tempos:
+        return {'p50': 0.0, 'p95': 0.0, 'max': 0.0}
+    return {
+        'p50': statistics.median(tempos),
+        'p95': tempos[max(0, int(len(tempos) * 0.95) - 1)],
+        'max': tempos[-1],
+    }
+
+
+def medir(funcao, repeticoes=50):
+    """Roda `funcao` várias vezes e devolve latências (ms) e queries por execução."""
+    funcao()  # aquece caches e conexões
+    tempos = []
+    with CaptureQueriesContext(connection) as ctx:
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            funcao()
+            tempos.append((time.perf_counter() - inicio) * 1000)
+    return {**resumir_tempos(tempos), 'queries': len(ctx.captured_queries) / repeticoes}
+
+
+def formatar_medicao(nome, resultado):
+    return (
+        f"{nome:<40} p50={resultado['p50']:8.2f}ms  p95={resultado['p95']:8.2f}ms  "
+        f"max={resultado['max']:8.2f}ms  queries={resultado['queries']:.1f}"
+    )
+
+# ----------------------------
+# ENDPOINTS QUENTES (micro-benchmarks)
+# ----------------------------
+
+# Mesas livres para iniciar_comanda: cada repetição precisa de uma mesa sem
+# comanda aberta, senão mede só o caminho "comanda já existe"
+NUMERO_MESAS_LIVRES = 9500
+
+
+def _cliente():
+    # Import local: o APIClient puxa o test runner, que não precisa carregar em produção
+    from rest_framework.test import APIClient
+    return APIClient()
+
+
+def _mesas_livres(quantidade):
+    # As comandas que uma execução anterior abriu nessas mesas continuam
+    # ativas; sem cancelá-las a segunda rodada (sem --limpar) fica sem mesa
+    abertas = Pedido.objects.filter(mesa__numero__gte=NUMERO_MESAS_LIVRES, nome_cliente=MARCA).ativos()
+    abertas.update(status=PedidoStatus.CANCELADO, atualizado_em=timezone.now())
+    gerar_mesas(quantidade, numero_inicial=NUMERO_MESAS_LIVRES)
+    livres = Mesa.objects.filter(numero__gte=NUMERO_MESAS_LIVRES).exclude(pedido__status__in=STATUS_ATIVOS)
+    numeros = list(livres.order_by('numero').values_list('numero', flat=True)[:quantidade])
+    if len(numeros) < quantidade:
+        raise RuntimeError(f"Só {len(numeros)} mesa(s) livre(s) a partir de {NUMERO_MESAS_LIVRES}; rode com --limpar.")
+    return numeros
+
+
+def _requisitar(cliente, metodo, url, dados=None, esperado=(200, 201)):
+    if dados is None:
+        response = getattr(cliente, metodo)(url)
+    else:
+        response = getattr(cliente, metodo)(url, dados, format='json')
+    if response.status_code not in esperado:
+        raise RuntimeError(f"{metodo.upper()} {url} respondeu {response.status_code}")
+    return response
+
+
+def medir_endpoints(pratos, repeticoes=50):
+    """
+    Latência e queries por requisição dos caminhos quentes, pela pilha HTTP
+    inteira (middleware, DRF, serializers). Devolve {nome: medição}.
+    """
+    cliente = _cliente()
+    mesas = list(Mesa.objects.filter(numero__gte=9000, numero__lt=NUMERO_MESAS_LIVRES).values_list('id', flat=True))
+    codigos = list(
+        Pedido.objects.filter(mesa_id__in=mesas, nome_cliente=MARCA, comanda_pai__isnull=True).ativos()
+        .values_list('codigo_acesso', flat=True)
+    )
+    livres = iter(_mesas_livres(repeticoes + 1))
+
+    def iniciar():
+        itens = [{'prato': prato.id, 'quantidade': random.randint(1, 3)} for prato in random.sample(pratos, 3)]
+        _requisitar(cliente, 'post', '/api/iniciar-comanda/', {'mesa': next(livres), 'nome_cliente': MARCA, 'itens': itens})
+
+    cenarios = {
+        'iniciar_comanda (3 itens)': iniciar,
+        'listagem de mesas (/api/mesas/)': lambda: _requisitar(cliente, 'get', '/api/mesas/'),
+        'fila da cozinha (PedidoViewSet.cozinha)': lambda: _requisitar(cliente, 'get', '/api/cozinha/'),
+        'pedido_por_codigo': lambda: _requisitar(cliente, 'get', f'/api/pedido-por-codigo/{random.choice(codigos)}/'),
+    }
+    if not codigos:
+        del cenarios['pedido_por_codigo']
+    return {nome: medir(funcao, repeticoes) for nome, funcao in cenarios.items()}
+
+def pedidos_disponiveis(pedidos):
+    """Quantos pedidos comparar_serializacao(pedidos) vai usar de fato."""
+    return Pedido.objects.order_by('-id')[:pedidos].count()
+
+
+def comparar_serializacao(pedidos=500, repeticoes=20):
+    """
+    Serializers do DRF x caminho rápido (leitura.py) para os `pedidos`
+    pedidos mais recentes do banco (do histórico também: só os ativos seriam
+    algumas dezenas), incluindo a renderização para bytes. Com menos pedidos
+    no banco do que o pedido, a comparação roda com os que houver; quem chama
+    confere com pedidos_disponiveis().
+    """
+    from rest_framework.renderers import JSONRenderer
+
+    from .leitura import linhas_pedidos, pedidos_em_dicts, renderizar
+    from .serializers import PedidoReadSerializer
+
+    ids = list(Pedido.objects.order_by('-id').values_list('id', flat=True)[:pedidos])
+    consulta = Pedido.objects.filter(pk__in=ids).order_by('id')
+    return {
+        f'{len(ids)} pedidos: PedidoReadSerializer': medir(
+            lambda: JSONRenderer().render(PedidoReadSerializer(consulta.com_relacionados(), many=True).data), repeticoes,
+        ),
+        f'{len(ids)} pedidos: values() + orjson': medir(
+            lambda: renderizar(pedidos_em_dicts(linhas_pedidos(consulta))), repeticoes,
+        ),
+    }
+
+# ----------------------------
+# CARGA (hora do jantar)
+# ----------------------------
+
+def _papel_cozinha(cliente, contexto):
+    _requisitar(cliente, 'get', '/api/cozinha/')
+    return 'cozinha: fila'
+
+
+def _papel_garcom(cliente, contexto):
+    if random.random() < 0.2:
+        _requisitar(cliente, 'post', f"/api/mesas/{random.choice(contexto['mesas'])}/adicionar_item/", {
+            'prato_id': random.choice(contexto['pratos']), 'quantidade': 1,
+        })
+        return 'garçom: adicionar item'
+    _requisitar(cliente, 'get', '/api/mesas/')
+    return 'garçom: mesas'
+
+
+def _papel_cliente(cliente, contexto):
+    codigo = random.choice(contexto['codigos'])
+    if random.random() < 0.8:
+        _requisitar(cliente, 'get', f'/api/pedidos/status_resumo/?codigo={codigo}', esperado=(200, 404))
+        return 'cliente: status resumido'
+    _requisitar(cliente, 'get', f'/api/pedido-por-codigo/{codigo}/', esperado=(200, 404))
+    return 'cliente: comanda completa'
+
+
+PAPEIS = {'cozinha': _papel_cozinha, 'garcom': _papel_garcom, 'cliente': _papel_cliente}
+
+
+def simular_jantar(pratos, clientes, duracao=30, intervalo=1.0):
+    """
+    Vários clientes em threads, cada um com sua conexão, fazendo polling
+    como no salão: `clientes` é {'cozinha': n, 'garcom': n, 'cliente': n}
+    e cada um dispara uma ação a cada ~`intervalo` segundos (com variação),
+    por `duracao` segundos.
+
+    Devolve {ação: {'requisicoes', 'erros', 'p50', 'p95', 'max'}} e o total
+    de requisições por segundo em '_total'.
+    """
+    mesas = list(Mesa.objects.filter(numero__gte=9000, numero__lt=NUMERO_MESAS_LIVRES).values_list('id', flat=True))
+    contexto = {
+        'mesas': mesas,
+        'pratos': [prato.id for prato in pratos],
+        'codigos': list(
+            Pedido.objects.filter(mesa_id__in=mesas, comanda_pai__isnull=True).ativos().values_list('codigo_acesso', flat=True)
+        ) or ['XXXXXX'],
+    }
+    tempos = defaultdict(list)
+    erros = defaultdict(int)
+    trava = threading.Lock()
+    fim = time.monotonic() + duracao
+
+    def rodar(papel):
+        cliente = _cliente()
+        try:
+            while time.monotonic() < fim:
+                inicio = time.perf_counter()
+                try:
+                    acao = PAPEIS[papel](cliente, contexto)
+                except Exception:
+                    with trava:
+                        erros[papel] += 1
+                else:
+                    with trava:
+                        tempos[acao].append((time.perf_counter() - inicio) * 1000)
+                time.sleep(random.uniform(0.5, 1.5) * intervalo)
+        finally:
+            close_old_connections()
+
+    threads = [
+        threading.Thread(target=rodar, args=(papel,), name=f'{papel}-{i}')
+        for papel, quantidade in clientes.items()
+        for i in range(quantidade)
+    ]
+    inicio = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    decorrido = time.monotonic() - inicio
+
+    resultado = {acao: {'requisicoes': len(lista), **resumir_tempos(lista)} for acao, lista in sorted(tempos.items())}
+    total = sum(len(lista) for lista in tempos.values())
+    resultado['_total'] = {'requisicoes': total, 'por_segundo': total / decorrido, 'erros': dict(erros)}
+    return resultado
+
+# ----------------------------
+# CARGA HTTP (WSGI x ASGI)
+# ----------------------------
+
+# Rodada contra um servidor de verdade (gunicorn ou daphne), não pelo client
+# de testes: o que se mede é quantas requisições de polling o deploy aguenta
+# enquanto conexões SSE ficam abertas. No gunicorn sync cada SSE prende um
+# worker até EVENTOS_SSE_DURACAO; no ASGI elas só ocupam o event loop.
+
+ROTAS_POLLING = ['/api/mesas/', '/api/cozinha/', '/api/pedido-por-codigo/{codigo}/']
+
+
+def _requisicao_http(host, caminho, cabecalhos=()):
+    linhas = [f'GET {caminho} HTTP/1.1', f'Host: {host}', *cabecalhos]
+    return ('\r\n'.join(linhas) + '\r\n\r\n').encode()
+
+
+async def _get_http(host, porta, caminho, timeout):
+    # HTTP/1.1 cru com Connection: close (o gunicorn sync não mantém keep-alive)
+    leitor, escritor = await asyncio.wait_for(asyncio.open_connection(host, porta), timeout)
+    try:
+        escritor.write(_requisicao_http(f'{host}:{porta}', caminho, ['Connection: close', 'Accept-Encoding: gzip']))
+        await escritor.drain()
+        status = await asyncio.wait_for(leitor.readline(), timeout)
+        await asyncio.wait_for(leitor.read(), timeout)
+    finally:
+        escritor.close()
+    return int(status.split()[1])
+
+
+async def _segurar_sse(host, porta, fim):
+    # Tela esperando eventos; reconecta como o EventSource quando o servidor fecha
+    while time.monotonic() < fim:
+        try:
+            leitor, escritor = await asyncio.open_connection(host, porta)
+        except OSError:
+            await asyncio.sleep(1)
+            continue
+        try:
+            escritor.write(_requisicao_http(f'{host}:{porta}', '/api/eventos/pedidos/', ['Accept: text/event-stream']))
+            await escritor.drain()
+            while time.monotonic() < fim:
+                if not await asyncio.wait_for(leitor.read(4096), fim - time.monotonic()):
+                    break
+        except (asyncio.TimeoutError, OSError):
+            pass
+        finally:
+            escritor.close()
+
+
+async def _carga_http(host, porta, rotas, conexoes, sse, duracao, timeout):
+    tempos = defaultdict(list)
+    erros = defaultdict(int)
+    fim = time.monotonic() + duracao
+
+    async def rodar(indice):
+        numero = indice
+        while time.monotonic() < fim:
+            rota = rotas[numero % len(rotas)]
+            numero += 1
+            inicio = time.perf_counter()
+            try:
+                status = await _get_http(host, porta, rota, timeout)
+            except (asyncio.TimeoutError, OSError, IndexError, ValueError):
+                erros[rota] += 1
+                continue
+            if status >= 400:
+                erros[rota] += 1
+            else:
+                tempos[rota].append((time.perf_counter() - inicio) * 1000)
+
+    segurando = [asyncio.create_task(_segurar_sse(host, porta, fim)) for _ in range(sse)]
+    # Dá tempo das conexões SSE ocuparem o servidor antes do polling começar
+    await asyncio.sleep(0.5 if sse else 0)
+    inicio = time.monotonic()
+    await asyncio.gather(*(rodar(i) for i in range(conexoes)))
+    decorrido = time.monotonic() - inicio
+    await asyncio.gather(*segurando)
+
+    resultado = {
+        rota: {'requisicoes': len(tempos[rota]), 'erros': erros[rota], **resumir_tempos(tempos[rota])}
+        for rota in rotas
+    }
+    total = sum(len(lista) for lista in tempos.values())
+    resultado['_total'] = {'requisicoes': total, 'por_segundo': total / decorrido, 'erros': sum(erros.values())}
+    return resultado
+
+
+def carga_http(url, conexoes=50, sse=0, duracao=20, codigo=None, timeout=10.0):
+    """
+    `conexoes` clientes em laço fechado (sem pausa) alternando entre as
+    ROTAS_POLLING de um servidor em `url`, enquanto `sse` conexões ficam no
+    stream de eventos. Sem `codigo` de comanda, a rota do pedido por código
+    fica de fora. Status >= 400 e timeouts contam como erro.
+
+    Devolve {rota: {'requisicoes', 'erros', 'p50', 'p95', 'max'}} e o total
+    por segundo em '_total'.
+    """
+    partes = urlsplit(url)
+    rotas = [rota.format(codigo=codigo) for rota in ROTAS_POLLING if codigo or '{codigo}' not in rota]
+    return asyncio.run(_carga_http(partes.hostname, partes.port or 80, rotas, conexoes, sse, duracao, timeout))
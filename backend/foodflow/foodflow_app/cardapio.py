@@ -0,0 +1,75 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import require_GET
+from rest_framework.renderers import JSONRenderer
+
+from .models import Categoria, Prato, VersaoCardapio
+
+# ----------------------------
+# VERSÃO DO CARDÁPIO
+# ----------------------------
+
+def versao_atual():
+    # A versão fica no banco para valer igual em todos os workers e réplicas
+    return VersaoCardapio.objects.filter(pk=1).values_list('versao', flat=True).first() or 0
+
+
+def _incrementar_versao():
+    if not VersaoCardapio.objects.filter(pk=1).update(versao=F('versao') + 1):
+        VersaoCardapio.objects.get_or_create(pk=1, defaults={'versao': 1})
+
+
+def invalidar_cardapio():
+    """Invalida o snapshot do cardápio quando a transação atual confirmar."""
+    transaction.on_commit(_incrementar_versao)
+
+# ----------------------------
+# SNAPSHOT
+# ----------------------------
+
+def _montar_snapshot(request, versao):
+    # Import local para evitar import circular (serializers -> imagens -> models)
+    from .serializers import CategoriaSerializer, PratoSerializer
+
+    contexto = {'request': request}
+    categorias = Categoria.objects.filter(ativo=True).order_by('id')
+    # Esgotados (índice de disponibilidade em 0) saem do cardápio
+    pratos = Prato.objects.filter(ativo=True).exclude(porcoes_disponiveis=0).select_related('categoria').order_by('id')
+    return JSONRenderer().render({
+        'versao': versao,
+        'categorias': CategoriaSerializer(categorias, many=True, context=contexto).data,
+        'pratos': PratoSerializer(pratos, many=True, context=contexto).data,
+    })
+
+
+@require_GET
+def cardapio(request):
+    """
+    Categorias e pratos ativos num único JSON, pré-renderizado por versão.
+
+    Repetições com If-None-Match da versão atual recebem 304 sem tocar no cache.
+    """
+    versao = versao_atual()
+    etag = f'"cardapio-{versao}"'
+
+    # Comparação fraca (lista, W/, *), como o If-None-Match que volta de
+    # uma resposta comprimida com o ETag enfraquecido
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        cache = caches[settings.CARDAPIO_CACHE]
+        # As URLs das imagens são absolutas, então o host entra na chave
+        chave = f'cardapio:{versao}:{request.scheme}://{request.get_host()}'
+        conteudo = cache.get(chave)
+        if conteudo is None:
+            conteudo = _montar_snapshot(request, versao)
+            cache.set(chave, conteudo, settings.CARDAPIO_CACHE_TIMEOUT)
+        response = HttpResponse(conteudo, content_type='application/json')
+
+    response['ETag'] = etag
+    # O navegador guarda a resposta mas sempre revalida com o ETag
+    response['Cache-Control'] = 'no-cache'
+    return response
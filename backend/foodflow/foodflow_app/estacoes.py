@@ -0,0 +1,222 @@
+import heapq
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+
+from . import estimativa
+from .cardapio import versao_atual
+from .models import EventoPedido, Pedido, PedidoItem, PedidoStatus
+
+# Status em que os itens ainda ocupam a cozinha
+STATUS_FILA = [PedidoStatus.PENDENTE, PedidoStatus.EM_PREPARO]
+
+# Folga na leitura incremental, como no delta da cozinha (views.MARGEM_SINCRONIA):
+# um pedido gravado numa transação mais lenta não escapa da próxima leitura
+MARGEM_SINCRONIA = timedelta(seconds=5)
+
+# ----------------------------
+# PRIORIDADE
+# ----------------------------
+
+# A prioridade é um instante fixo ("quando este item devia entrar no fogo"),
+# não uma idade: todos os itens envelhecem no mesmo ritmo, então a ordem entre
+# eles não muda com o tempo e o heap nunca precisa ser reordenado.
+#
+#   pedido mais antigo        -> instante menor
+#   mesa esperando há mais    -> desconto de COZINHA_PESO_ESPERA_MESA x a espera
+#   prato mais demorado       -> começa antes, para sair junto com o resto
+
+def preparo_segundos(prato_id):
+    medias = estimativa.estimador.medias
+    return medias[prato_id][1] if prato_id in medias else estimativa.estimador.media_geral()
+
+
+def prioridade(linha):
+    criado_em = linha['pedido__criado_em']
+    espera_mesa = (criado_em - linha['mesa_desde']).total_seconds()
+    instante = (
+        criado_em.timestamp()
+        - settings.COZINHA_PESO_ESPERA_MESA * max(0, espera_mesa)
+        - preparo_segundos(linha['prato_id'])
+    )
+    # O que já está em preparo fica no topo da praça
+    return (0 if linha['pedido__status'] == PedidoStatus.EM_PREPARO else 1, instante, linha['id'])
+
+# ----------------------------
+# ESCALONADOR EM MEMÓRIA
+# ----------------------------
+
+class Escalonador:
+    """
+    Fila de itens por praça (heap), mantida em memória em cada worker.
+
+    Montada do banco na primeira leitura e depois atualizada no máximo a
+    cada COZINHA_ATUALIZACAO segundos só com os pedidos alterados desde a
+    última vez (atualizado_em + eventos de remoção). Se o cardápio mudar
+    (praça de alguma categoria, por exemplo) a fila é remontada inteira.
+
+    Itens que saem da fila não são tirados do heap na hora: a entrada fica
+    órfã em `itens` e é pulada na leitura; o heap é compactado quando as
+    órfãs passam da metade.
+    """
+
+    def __init__(self):
+        self.filas = defaultdict(list)       # estacao -> heap de (prioridade, item_id)
+        self.itens = {}                      # item_id -> (entrada no heap, estacao, dados)
+        self.por_pedido = defaultdict(set)   # pedido_id -> item_ids na fila
+        self._versao = None
+        self._visto_ate = None
+        self._atualizado = None
+        self._trava = threading.Lock()
+
+    def _linhas(self, pedido_ids=None):
+        itens = PedidoItem.objects.filter(pedido__status__in=STATUS_FILA)
+        if pedido_ids is not None:
+            itens = itens.filter(pedido_id__in=pedido_ids)
+        return itens.annotate(
+            estacao=F('prato__categoria__estacao'),
+            mesa_desde=Coalesce('pedido__comanda_pai__criado_em', 'pedido__criado_em'),
+        ).values(
+            'id', 'pedido_id', 'prato_id', 'prato__nome', 'quantidade', 'observacao', 'estacao', 'mesa_desde',
+            'pedido__status', 'pedido__criado_em', 'pedido__mesa__numero', 'pedido__nome_cliente',
+        )
+
+    def _incluir(self, linha):
+        entrada = prioridade(linha)
+        self.itens[linha['id']] = (entrada, linha['estacao'], linha)
+        self.por_pedido[linha['pedido_id']].add(linha['id'])
+        heapq.heappush(self.filas[linha['estacao']], entrada)
+
+    def _tirar_pedidos(self, pedido_ids):
+        for pedido_id in pedido_ids:
+            for item_id in self.por_pedido.pop(pedido_id, ()):
+                self.itens.pop(item_id, None)
+
+    def reconstruir(self):
+        inicio = timezone.now()
+        self.filas.clear()
+        self.itens.clear()
+        self.por_pedido.clear()
+        for linha in self._linhas():
+            self._incluir(linha)
+        self._visto_ate = inicio - MARGEM_SINCRONIA
+
+    def atualizar(self):
+        versao = versao_atual()
+        if versao != self._versao or self._visto_ate is None:
+            self._versao = versao
+            self.reconstruir()
+        else:
+            inicio = timezone.now()
+            alterados = list(Pedido.objects.filter(atualizado_em__gt=self._visto_ate).values_list('id', flat=True))
+            removidos = EventoPedido.objects.filter(
+                tipo='removido', criado_em__gt=self._visto_ate,
+            ).values_list('pedido_id', flat=True)
+            # Tira tudo dos pedidos alterados e põe de volta o que ainda está na fila
+            self._tirar_pedidos(alterados)
+            self._tirar_pedidos(removidos)
+            if alterados:
+                for linha in self._linhas(alterados):
+                    self._incluir(linha)
+            self._visto_ate = inicio - MARGEM_SINCRONIA
+        self._compactar()
+        self._atualizado = time.monotonic()
+
+    def _atualizar_se_preciso(self):
+        if self._atualizado is None or time.monotonic() - self._atualizado >= settings.COZINHA_ATUALIZACAO:
+            self.atualizar()
+
+    def _vivo(self, entrada):
+        # Por identidade: o item reincluído com a mesma prioridade gera outra entrada
+        item = self.itens.get(entrada[-1])
+        return item is not None and item[0] is entrada
+
+    def _compactar(self):
+        vivos = Counter(estacao for _, estacao, _ in self.itens.values())
+        for estacao, heap in list(self.filas.items()):
+            if not vivos[estacao]:
+                del self.filas[estacao]
+            elif len(heap) > 2 * vivos[estacao]:
+                self.filas[estacao] = [entrada for entrada in heap if self._vivo(entrada)]
+                heapq.heapify(self.filas[estacao])
+
+    def _primeiros(self, heap, limite):
+        # Percorre o heap em ordem pelos nós (O(k log k)), sem ordenar a praça inteira
+        fronteira = [(heap[0], 0)] if heap else []
+        while fronteira and limite:
+            entrada, i = heapq.heappop(fronteira)
+            if self._vivo(entrada):
+                yield self.itens[entrada[-1]][2]
+                limite -= 1
+            for filho in (2 * i + 1, 2 * i + 2):
+                if filho < len(heap):
+                    heapq.heappush(fronteira, (heap[filho], filho))
+
+    def fila(self, estacao, limite):
+        """Os `limite` próximos itens da praça, do mais urgente para o menos."""
+        with self._trava:
+            self._atualizar_se_preciso()
+            return list(self._primeiros(self.filas.get(estacao, []), limite))
+
+    def resumo(self):
+        """Itens na fila por praça."""
+        with self._trava:
+            self._atualizar_se_preciso()
+            return Counter(estacao for _, estacao, _ in self.itens.values())
+
+
+escalonador = Escalonador()
+
+# ----------------------------
+# API DA COZINHA
+# ----------------------------
+
+def _item_da_fila(linha, posicao):
+    return {
+        'posicao': posicao,
+        'item_id': linha['id'],
+        'pedido_id': linha['pedido_id'],
+        'mesa': linha['pedido__mesa__numero'],
+        'nome_cliente': linha['pedido__nome_cliente'],
+        'prato_id': linha['prato_id'],
+        'prato': linha['prato__nome'],
+        'quantidade': linha['quantidade'],
+        'observacao': linha['observacao'],
+        'status': linha['pedido__status'],
+        'criado_em': linha['pedido__criado_em'],
+    }
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def estacoes_cozinha(request):
+    """Praças com itens na fila e quantos itens cada uma tem."""
+    resumo = escalonador.resumo()
+    return Response([{'estacao': estacao, 'itens': total} for estacao, total in sorted(resumo.items())])
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def fila_estacao(request, estacao):
+    """Fila priorizada de uma praça (?limite=, padrão COZINHA_FILA_LIMITE)."""
+    try:
+        limite = min(int(request.GET.get('limite', settings.COZINHA_FILA_LIMITE)), settings.COZINHA_FILA_LIMITE_MAX)
+    except ValueError:
+        return Response({'erro': 'limite inválido.'}, status=400)
+    if limite <= 0:
+        return Response({'erro': 'limite inválido.'}, status=400)
+
+    itens = escalonador.fila(estacao, limite)
+    return Response({
+        'estacao': estacao,
+        'itens': [_item_da_fila(linha, posicao) for posicao, linha in enumerate(itens, start=1)],
+    })
@@ -0,0 +1,89 @@
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Pedido, PedidoItem, PedidoStatus
+
+# Peso mínimo de cada preparo novo na média: depois de ~20 amostras a média
+# vira móvel exponencial e acompanha mudanças de cozinha/cardápio
+ALFA_MINIMO = 0.05
+
+# ----------------------------
+# ESTIMADOR EM MEMÓRIA
+# ----------------------------
+
+class EstimadorPreparo:
+    """
+    Tempo de preparo por prato aprendido de inicio_preparo -> pronto_em.
+
+    Guarda só {prato_id: [amostras, média em segundos]} e o tamanho da fila
+    da cozinha. Tudo é relido do banco no máximo uma vez a cada
+    ESTIMATIVA_ATUALIZACAO segundos por worker, e só o que ficou pronto
+    desde a última leitura; no resto das requisições estimar() não consulta nada.
+    """
+
+    def __init__(self):
+        self.medias = {}
+        self.fila = 0
+        self._visto_ate = None
+        self._atualizado = None
+        self._trava = threading.Lock()
+
+    def _aprender(self, prato_id, segundos):
+        amostras, media = self.medias.get(prato_id, (0, 0.0))
+        amostras += 1
+        alfa = max(1 / amostras, ALFA_MINIMO)
+        self.medias[prato_id] = [amostras, media + alfa * (segundos - media)]
+
+    def atualizar(self):
+        if self._visto_ate is None:
+            self._visto_ate = timezone.now() - timedelta(days=settings.ESTIMATIVA_JANELA_DIAS)
+
+        # Um preparo vale para cada prato distinto do pedido
+        linhas = PedidoItem.objects.filter(
+            pedido__pronto_em__gt=self._visto_ate, pedido__inicio_preparo__isnull=False,
+        ).values_list('pedido_id', 'prato_id', 'pedido__inicio_preparo', 'pedido__pronto_em').distinct()
+        for _, prato_id, inicio, pronto_em in sorted(linhas, key=lambda linha: linha[3]):
+            segundos = (pronto_em - inicio).total_seconds()
+            if segundos > 0:
+                self._aprender(prato_id, segundos)
+            self._visto_ate = max(self._visto_ate, pronto_em)
+
+        self.fila = Pedido.objects.filter(status__in=[PedidoStatus.PENDENTE, PedidoStatus.EM_PREPARO]).count()
+        self._atualizado = time.monotonic()
+
+    def _atualizar_se_preciso(self):
+        if self._atualizado is not None and time.monotonic() - self._atualizado < settings.ESTIMATIVA_ATUALIZACAO:
+            return
+        with self._trava:
+            if self._atualizado is None or time.monotonic() - self._atualizado >= settings.ESTIMATIVA_ATUALIZACAO:
+                self.atualizar()
+
+    def media_geral(self):
+        medias = [media for _, media in self.medias.values()]
+        return sum(medias) / len(medias) if medias else settings.ESTIMATIVA_PADRAO_MINUTOS * 60
+
+    def estimar(self, prato_ids):
+        """
+        Minutos até o pedido ficar pronto.
+
+        Os pratos saem em paralelo, então vale o mais demorado; a fila à
+        frente entra dividida pelos pedidos que a cozinha toca ao mesmo tempo.
+        """
+        self._atualizar_se_preciso()
+        padrao = self.media_geral()
+        preparo = max((self.medias[p][1] if p in self.medias else padrao for p in prato_ids), default=padrao)
+        espera = self.fila / settings.ESTIMATIVA_PEDIDOS_SIMULTANEOS * padrao
+        return max(1, math.ceil((preparo + espera) / 60))
+
+
+estimador = EstimadorPreparo()
+
+
+def estimar_tempo(prato_ids):
+    """tempo_estimado (minutos) para um pedido novo com estes pratos."""
+    return estimador.estimar([int(prato_id) for prato_id in prato_ids])
@@ -0,0 +1,165 @@
+import math
+from collections import defaultdict
+
+from django.db.models import F
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from .cardapio import invalidar_cardapio, versao_atual
+from .models import Ingrediente, Prato, PratoIngrediente
+
+# ----------------------------
+# FICHA TÉCNICA EM MEMÓRIA
+# ----------------------------
+
+# {'versao': int, 'receitas': {prato_id: [(ingrediente_id, quantidade_utilizada), ...]}}
+# Mudanças em PratoIngrediente incrementam a versão do cardápio (signals.py),
+# então cada worker recarrega o mapa na primeira baixa depois da mudança.
+_fichas = {'versao': None, 'receitas': {}}
+
+
+def receitas():
+    versao = versao_atual()
+    if _fichas['versao'] != versao:
+        mapa = defaultdict(list)
+        for prato_id, ingrediente_id, quantidade in PratoIngrediente.objects.values_list(
+            'prato_id', 'ingrediente_id', 'quantidade_utilizada'
+        ):
+            mapa[prato_id].append((ingrediente_id, quantidade))
+        # Troca o dicionário inteiro de uma vez: outras threads nunca veem um mapa pela metade
+        _fichas.update(versao=versao, receitas=dict(mapa))
+    return _fichas['receitas']
+
+# ----------------------------
+# BAIXA DE ESTOQUE
+# ----------------------------
+
+class EstoqueInsuficiente(Exception):
+    """O estoque não cobre a baixa (por exemplo, outro pedido levou a última porção)."""
+
+
+def baixar_estoque(porcoes):
+    """
+    Desconta do estoque o consumo de `porcoes` ({prato_id: quantidade}).
+
+    Quantidades negativas devolvem ao estoque (item removido ou reduzido).
+    O consumo é somado por ingrediente antes, então o pedido inteiro gera
+    um UPDATE com F() por ingrediente, não por item. O UPDATE só desconta
+    se ainda houver estoque; se algum não couber, levanta
+    EstoqueInsuficiente. Deve rodar dentro da transação que grava os itens,
+    para que a baixa parcial volte junto.
+    """
+    fichas = receitas()
+    consumo = defaultdict(int)
+    for prato_id, quantidade in porcoes.items():
+        for ingrediente_id, utilizada in fichas.get(prato_id, ()):
+            consumo[ingrediente_id] += utilizada * quantidade
+
+    # Sempre na ordem de id: dois pedidos com ingredientes em comum travam as
+    # linhas na mesma sequência e não entram em deadlock
+    alterados = sorted(ingrediente_id for ingrediente_id, total in consumo.items() if total)
+    faltando = set()
+    for ingrediente_id in alterados:
+        ingrediente = Ingrediente.objects.filter(pk=ingrediente_id)
+        if consumo[ingrediente_id] > 0:
+            # Condição no próprio UPDATE: dois pedidos pela última porção
+            # passam pela validação, mas só um consegue descontar
+            ingrediente = ingrediente.filter(quantidade_estoque__gte=consumo[ingrediente_id])
+            if not ingrediente.update(quantidade_estoque=F('quantidade_estoque') - consumo[ingrediente_id]):
+                faltando.add(ingrediente_id)
+        else:
+            ingrediente.update(quantidade_estoque=F('quantidade_estoque') - consumo[ingrediente_id])
+    if faltando:
+        pratos = [
+            prato_id for prato_id in porcoes
+            if any(ingrediente_id in faltando for ingrediente_id, _ in fichas.get(prato_id, ()))
+        ]
+        nomes = Prato.objects.filter(pk__in=pratos).order_by('nome').values_list('nome', flat=True)
+        raise EstoqueInsuficiente(f"Sem estoque para: {', '.join(nomes)}.")
+    if alterados:
+        atualizar_disponibilidade(ingrediente_ids=alterados)
+    return consumo
+
+
+def porcoes_dos_itens(itens):
+    porcoes = defaultdict(int)
+    for item in itens:
+        porcoes[item.prato_id] += item.quantidade
+    return porcoes
+
+# ----------------------------
+# ÍNDICE DE DISPONIBILIDADE
+# ----------------------------
+
+# Prato.porcoes_disponiveis guarda quantas porções o estoque atual rende
+# (None = prato sem ficha técnica, sem limite). É recalculado só para os
+# pratos afetados a cada escrita de estoque/ficha, então quem lê (cardápio,
+# validação de pedido) só consulta a coluna, sem juntar PratoIngrediente.
+
+def calcular_porcoes(prato_ids):
+    porcoes = {prato_id: None for prato_id in prato_ids}
+    linhas = PratoIngrediente.objects.filter(prato_id__in=prato_ids).values_list(
+        'prato_id', 'quantidade_utilizada', 'ingrediente__quantidade_estoque'
+    )
+    for prato_id, utilizada, estoque in linhas:
+        if utilizada <= 0:
+            continue
+        rende = max(0, math.floor(estoque / utilizada))
+        porcoes[prato_id] = rende if porcoes[prato_id] is None else min(porcoes[prato_id], rende)
+    return porcoes
+
+
+def atualizar_disponibilidade(prato_ids=None, ingrediente_ids=None):
+    """
+    Recalcula o índice dos pratos informados e/ou dos que usam os ingredientes.
+
+    Grava só o que mudou, num bulk_update (sem sinais, sem mexer em
+    atualizado_em). Se algum prato esgotou ou voltou, o snapshot do
+    cardápio é invalidado; uma simples baixa não invalida nada.
+    """
+    prato_ids = set(prato_ids or ())
+    if ingrediente_ids:
+        prato_ids.update(
+            PratoIngrediente.objects.filter(ingrediente_id__in=ingrediente_ids).values_list('prato_id', flat=True)
+        )
+    if not prato_ids:
+        return
+
+    atuais = dict(Prato.objects.filter(pk__in=prato_ids).values_list('id', 'porcoes_disponiveis'))
+    novas = calcular_porcoes(atuais.keys())
+    mudaram = [Prato(pk=prato_id, porcoes_disponiveis=porcoes) for prato_id, porcoes in novas.items() if porcoes != atuais[prato_id]]
+    if not mudaram:
+        return
+    Prato.objects.bulk_update(mudaram, ['porcoes_disponiveis'])
+    if any((atuais[p.pk] == 0) != (p.porcoes_disponiveis == 0) for p in mudaram):
+        invalidar_cardapio()
+
+
+def indisponiveis(pratos, porcoes, ja_reservadas=None):
+    """
+    Nomes dos pratos cujo pedido passa do que o estoque rende.
+
+    `pratos` é o dict de carregar_pratos, `porcoes` o pedido por prato e
+    `ja_reservadas` o que este mesmo pedido já tinha descontado (edição).
+    """
+    ja_reservadas = ja_reservadas or {}
+    return [
+        pratos[prato_id].nome
+        for prato_id, quantidade in porcoes.items()
+        if pratos[prato_id].porcoes_disponiveis is not None
+        and quantidade > pratos[prato_id].porcoes_disponiveis + ja_reservadas.get(prato_id, 0)
+    ]
+
+# ----------------------------
+# ESTOQUE BAIXO
+# ----------------------------
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def estoque_baixo(request):
+    """Ingredientes ativos no mínimo ou abaixo dele, do mais crítico para o menos."""
+    ingredientes = Ingrediente.objects.abaixo_do_minimo().order_by(
+        F('quantidade_estoque') - F('estoque_minimo'), 'nome'
+    ).values('id', 'nome', 'quantidade_estoque', 'estoque_minimo', 'unidade_medida')
+    return Response(list(ingredientes))
@@ -0,0 +1,227 @@
+import asyncio
+import json
+import time
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.http import require_GET
+
+from .models import EventoPedido, Pedido
+from .pedidos import invalidar_resumo_status
+
+# ----------------------------
+# PUBLICAÇÃO
+# ----------------------------
+
+# Quantos eventos entre cada limpeza dos antigos
+INTERVALO_LIMPEZA = 1000
+# Máximo de eventos enviados por consulta ao banco
+LOTE_EVENTOS = 200
+
+
+def publicar_evento_pedido(pedido, tipo='atualizado'):
+    """
+    Agenda a gravação de um evento para o pedido depois do commit.
+
+    O snapshot é montado só depois do commit, então já inclui os itens
+    criados na mesma transação e nada é publicado se houver rollback.
+    """
+    transaction.on_commit(partial(_gravar_evento, pedido.pk, pedido.codigo_acesso, tipo))
+
+
+def _gravar_evento(pedido_id, codigo_acesso, tipo):
+    # Import local para evitar import circular (serializers -> models)
+    from .serializers import PedidoReadSerializer
+
+    dados = {'id': pedido_id}
+    if tipo != 'removido':
+        pedido = Pedido.objects.filter(pk=pedido_id).first()
+        if pedido is None:
+            tipo = 'removido'
+        else:
+            codigo_acesso = pedido.codigo_acesso
+            # Ida e volta pelo encoder para guardar datas/decimais como no JSON da API
+            dados = json.loads(json.dumps(PedidoReadSerializer(pedido).data, cls=DjangoJSONEncoder))
+
+    invalidar_resumo_status(codigo_acesso)
+    evento = EventoPedido.objects.create(
+        pedido_id=pedido_id,
+        codigo_acesso=codigo_acesso or '',
+        tipo=tipo,
+        dados=dados,
+    )
+
+    _limpar_eventos_antigos([evento.id])
+
+
+def publicar_eventos_pedidos(pedido_ids, tipo='atualizado'):
+    """Como publicar_evento_pedido, mas para muitos pedidos com um INSERT só."""
+    pedido_ids = list(pedido_ids)
+    if pedido_ids:
+        transaction.on_commit(partial(_gravar_eventos, pedido_ids, tipo))
+
+
+def _gravar_eventos(pedido_ids, tipo):
+    from .serializers import PedidoReadSerializer
+
+    pedidos = Pedido.objects.filter(pk__in=pedido_ids).com_relacionados().order_by('id')
+    dados = json.loads(json.dumps(PedidoReadSerializer(pedidos, many=True).data, cls=DjangoJSONEncoder))
+    eventos = EventoPedido.objects.bulk_create([
+        EventoPedido(pedido_id=pedido['id'], codigo_acesso=pedido['codigo_acesso'] or '', tipo=tipo, dados=pedido)
+        for pedido in dados
+    ])
+    for codigo in {pedido['codigo_acesso'] for pedido in dados}:
+        invalidar_resumo_status(codigo)
+    _limpar_eventos_antigos([evento.id for evento in eventos])
+
+
+def _limpar_eventos_antigos(ids_novos):
+    if any(evento_id and evento_id % INTERVALO_LIMPEZA == 0 for evento_id in ids_novos):
+        limite = timezone.now() - timedelta(hours=settings.EVENTOS_RETENCAO_HORAS)
+        EventoPedido.objects.filter(criado_em__lt=limite).delete()
+
+
+# ----------------------------
+# LEITURA (cursor)
+# ----------------------------
+
+def _eventos_desde(cursor, codigo=None):
+    eventos = EventoPedido.objects.filter(id__gt=cursor).order_by('id')
+    if codigo:
+        eventos = eventos.filter(codigo_acesso=codigo)
+    return eventos.values('id', 'pedido_id', 'tipo', 'dados')[:LOTE_EVENTOS]
+
+
+def _cursor_expirado(cursor):
+    # Se os eventos após o cursor já foram limpos, o cliente precisa recarregar tudo
+    primeiro = EventoPedido.objects.order_by('id').values_list('id', flat=True).first()
+    return primeiro is not None and cursor < primeiro - 1
+
+
+def _cursor_atual():
+    return EventoPedido.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def _ler_cursor(request):
+    valor = request.META.get('HTTP_LAST_EVENT_ID') or request.GET.get('cursor')
+    try:
+        return int(valor) if valor not in (None, '') else None
+    except ValueError:
+        return None
+
+
+def _formatar_sse(evento):
+    dados = json.dumps(
+        {'pedido_id': evento['pedido_id'], 'tipo': evento['tipo'], 'dados': evento['dados']},
+        cls=DjangoJSONEncoder,
+    )
+    return f"id: {evento['id']}\nevent: pedido\ndata: {dados}\n\n"
+
+
+def _formatar_inicio(cursor):
+    # Um "id:" sem dados já atualiza o Last-Event-ID do EventSource, então a
+    # reconexão retoma deste ponto mesmo que nenhum evento chegue
+    return f"retry: {settings.EVENTOS_SSE_RETRY_MS}\nid: {cursor}\n\n"
+
+
+def _formatar_reset(cursor):
+    return f"id: {cursor}\nevent: reset\ndata: {{}}\n\n"
+
+
+# ----------------------------
+# STREAM (SSE)
+# ----------------------------
+
+def _stream_sync(cursor, codigo):
+    yield _formatar_inicio(cursor)
+    fim = time.monotonic() + settings.EVENTOS_SSE_DURACAO
+    ultimo_envio = time.monotonic()
+    while time.monotonic() < fim:
+        eventos = list(_eventos_desde(cursor, codigo))
+        for evento in eventos:
+            cursor = evento['id']
+            yield _formatar_sse(evento)
+        if eventos:
+            ultimo_envio = time.monotonic()
+        elif time.monotonic() - ultimo_envio >= settings.EVENTOS_SSE_HEARTBEAT:
+            # Comentário SSE mantém a conexão viva em proxies
+            ultimo_envio = time.monotonic()
+            yield ": ping\n\n"
+        if len(eventos) < LOTE_EVENTOS:
+            time.sleep(settings.EVENTOS_SSE_INTERVALO)
+
+
+async def _stream_async(cursor, codigo):
+    yield _formatar_inicio(cursor)
+    fim = time.monotonic() + settings.EVENTOS_SSE_DURACAO
+    ultimo_envio = time.monotonic()
+    while time.monotonic() < fim:
+        eventos = [evento async for evento in _eventos_desde(cursor, codigo)]
+        for evento in eventos:
+            cursor = evento['id']
+            yield _formatar_sse(evento)
+        if eventos:
+            ultimo_envio = time.monotonic()
+        elif time.monotonic() - ultimo_envio >= settings.EVENTOS_SSE_HEARTBEAT:
+            ultimo_envio = time.monotonic()
+            yield ": ping\n\n"
+        if len(eventos) < LOTE_EVENTOS:
+            await asyncio.sleep(settings.EVENTOS_SSE_INTERVALO)
+
+
+@require_GET
+def eventos_pedidos(request):
+    """
+    Feed de mudanças de pedidos a partir de um cursor.
+
+    Com `Accept: text/event-stream` abre um stream SSE (o EventSource reenvia
+    o Last-Event-ID ao reconectar); senão devolve em JSON os eventos após
+    `?cursor=`. Sem cursor, começa do evento mais recente. `?codigo=` limita
+    aos pedidos de uma comanda.
+    """
+    codigo = request.GET.get('codigo')
+    cursor = _ler_cursor(request)
+    sse = 'text/event-stream' in request.META.get('HTTP_ACCEPT', '')
+
+    if cursor is None:
+        cursor = _cursor_atual()
+        expirado = False
+    else:
+        expirado = _cursor_expirado(cursor)
+
+    if not sse:
+        if expirado:
+            return JsonResponse({'reset': True, 'cursor': _cursor_atual(), 'eventos': []})
+        eventos = list(_eventos_desde(cursor, codigo))
+        if eventos:
+            cursor = eventos[-1]['id']
+        return JsonResponse({'reset': False, 'cursor': cursor, 'eventos': eventos})
+
+    if expirado:
+        cursor = _cursor_atual()
+        inicio = [_formatar_reset(cursor)]
+    else:
+        inicio = []
+
+    if isinstance(request, ASGIRequest):
+        async def conteudo():
+            for linha in inicio:
+                yield linha
+            async for linha in _stream_async(cursor, codigo):
+                yield linha
+    else:
+        def conteudo():
+            yield from inicio
+            yield from _stream_sync(cursor, codigo)
+
+    response = StreamingHttpResponse(conteudo(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Evita que o nginx segure os eventos em buffer
+    response['X-Accel-Buffering'] = 'no'
+    return response
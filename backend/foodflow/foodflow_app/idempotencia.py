@@ -0,0 +1,91 @@
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .models import RespostaIdempotente
+
+# Cabeçalho mandado pelo cliente; a mesma chave nas repetições do mesmo pedido
+CABECALHO = 'Idempotency-Key'
+TAMANHO_MAXIMO_CHAVE = 255
+# Quantas respostas guardadas entre cada limpeza das vencidas
+INTERVALO_LIMPEZA = 1000
+
+
+def _hash(texto):
+    return hashlib.sha256(texto.encode()).hexdigest()
+
+
+def _corpo(response):
+    # Response do DRF ainda não foi renderizada quando volta da view
+    if isinstance(response, Response):
+        return JSONRenderer().render(response.data)
+    return response.content
+
+
+def _repetir(registro):
+    response = HttpResponse(bytes(registro.corpo), status=registro.status, content_type='application/json')
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _limpar_antigas(registro_id, limite):
+    if registro_id % INTERVALO_LIMPEZA == 0:
+        RespostaIdempotente.objects.filter(criado_em__lt=limite).delete()
+
+
+def idempotente(view):
+    """
+    POST com Idempotency-Key executa uma vez só; as repetições recebem a
+    primeira resposta guardada, sem rodar a view de novo.
+
+    A chave é gravada na mesma transação do pedido: uma repetição que chega
+    enquanto a primeira ainda roda espera no índice único e depois recebe a
+    resposta dela. Só respostas 2xx ficam guardadas (por
+    IDEMPOTENCIA_RETENCAO_HORAS); num erro a transação inteira volta e a
+    próxima tentativa executa de novo. A mesma chave com outro corpo é
+    recusada com 422. Sem o cabeçalho, nada muda.
+    """
+    @wraps(view)
+    def envolvida(request, *args, **kwargs):
+        chave_cliente = request.headers.get(CABECALHO)
+        if request.method != 'POST' or not chave_cliente:
+            return view(request, *args, **kwargs)
+        if len(chave_cliente) > TAMANHO_MAXIMO_CHAVE:
+            return Response({'erro': f'{CABECALHO} muito longa.'}, status=400)
+
+        chave = _hash(f'{request.path}\n{chave_cliente}')
+        requisicao = _hash(json.dumps(request.data, sort_keys=True, default=str))
+        limite = timezone.now() - timedelta(hours=settings.IDEMPOTENCIA_RETENCAO_HORAS)
+
+        with transaction.atomic():
+            RespostaIdempotente.objects.filter(chave=chave, criado_em__lt=limite).delete()
+            try:
+                with transaction.atomic():
+                    registro = RespostaIdempotente.objects.create(chave=chave, requisicao=requisicao, status=0, corpo=b'')
+            except IntegrityError:
+                registro = RespostaIdempotente.objects.get(chave=chave)
+                if registro.requisicao != requisicao:
+                    return Response({'erro': f'{CABECALHO} já usada com outro pedido.'}, status=422)
+                return _repetir(registro)
+
+            response = view(request, *args, **kwargs)
+            if not 200 <= response.status_code < 300:
+                # As duas views só escrevem quando dão certo; voltar tudo libera a chave
+                transaction.set_rollback(True)
+                return response
+            registro.status = response.status_code
+            registro.corpo = _corpo(response)
+            registro.save(update_fields=['status', 'corpo'])
+
+        _limpar_antigas(registro.id, limite)
+        return response
+
+    return envolvida
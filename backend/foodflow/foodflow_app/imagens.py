@@ -0,0 +1,157 @@
+import base64
+import binascii
+import hashlib
+import io
+import re
+
+from django.db import IntegrityError, transaction
+from django.http import Http404, HttpResponse, HttpResponseNotModified
+from django.urls import reverse
+from django.views.decorators.http import require_GET
+
+from .models import ImagemPrato
+
+try:
+    from PIL import Image
+except ImportError:  # Sem Pillow guardamos só o original, sem variantes
+    Image = None
+
+# ----------------------------
+# CONFIGURAÇÃO
+# ----------------------------
+
+# Lado maior (px) de cada variante gerada em WebP
+VARIANTES = {
+    'media': 800,
+    'miniatura': 320,
+}
+QUALIDADE_WEBP = 80
+TAMANHO_MAXIMO = 8 * 1024 * 1024
+TIPOS_ACEITOS = {'image/jpeg', 'image/png', 'image/webp', 'image/gif'}
+CACHE_IMUTAVEL = 'public, max-age=31536000, immutable'
+
+_RE_DATA_URL = re.compile(r'^data:(?P<tipo>[\w/+.-]+);base64,(?P<dados>.*)$', re.DOTALL)
+_RE_CAMINHO = re.compile(r'/api/imagens/(?P<hash>[0-9a-f]{64})/(?P<variante>[\w-]+)/')
+
+
+class ImagemInvalida(ValueError):
+    pass
+
+# ----------------------------
+# GRAVAÇÃO
+# ----------------------------
+
+def decodificar_data_url(valor):
+    match = _RE_DATA_URL.match(valor)
+    if not match:
+        raise ImagemInvalida("Formato de imagem inválido.")
+    tipo = match.group('tipo').lower()
+    if tipo not in TIPOS_ACEITOS:
+        raise ImagemInvalida(f"Tipo de imagem não suportado: {tipo}.")
+    try:
+        conteudo = base64.b64decode(match.group('dados'), validate=True)
+    except (binascii.Error, ValueError):
+        raise ImagemInvalida("Imagem com base64 inválido.")
+    if len(conteudo) > TAMANHO_MAXIMO:
+        raise ImagemInvalida("Imagem maior que o limite de 8 MB.")
+    return tipo, conteudo
+
+
+def _gerar_variantes(conteudo):
+    if Image is None:
+        return {}
+    try:
+        original = Image.open(io.BytesIO(conteudo))
+        original.load()
+    except Exception:
+        raise ImagemInvalida("Não foi possível ler a imagem enviada.")
+
+    modo = 'RGBA' if original.mode in ('RGBA', 'LA', 'P') else 'RGB'
+    original = original.convert(modo)
+    variantes = {}
+    for nome, lado in VARIANTES.items():
+        imagem = original.copy()
+        imagem.thumbnail((lado, lado))
+        saida = io.BytesIO()
+        imagem.save(saida, format='WEBP', quality=QUALIDADE_WEBP)
+        variantes[nome] = ('image/webp', saida.getvalue())
+    return variantes
+
+
+def salvar_imagem(data_url):
+    """
+    Decodifica um data URL, grava original e variantes endereçados pelo hash
+    do conteúdo e devolve o caminho da variante exibida no cardápio.
+    """
+    tipo, conteudo = decodificar_data_url(data_url)
+    hash_conteudo = hashlib.sha256(conteudo).hexdigest()
+
+    if not ImagemPrato.objects.filter(hash=hash_conteudo).exists():
+        arquivos = {'original': (tipo, conteudo), **_gerar_variantes(conteudo)}
+        try:
+            with transaction.atomic():
+                ImagemPrato.objects.bulk_create([
+                    ImagemPrato(hash=hash_conteudo, variante=nome, content_type=ct, conteudo=dados)
+                    for nome, (ct, dados) in arquivos.items()
+                ])
+        except IntegrityError:
+            pass  # Outra requisição gravou a mesma imagem ao mesmo tempo
+
+    variante = 'media' if Image is not None else 'original'
+    return caminho_imagem(hash_conteudo, variante)
+
+
+def caminho_imagem(hash_conteudo, variante):
+    return reverse('imagem-prato', args=[hash_conteudo, variante])
+
+
+def normalizar_imagem(valor):
+    """
+    Converte o valor recebido no campo `imagem` para o que guardamos no banco:
+    data URLs viram arquivos e URLs absolutas das nossas imagens voltam a ser caminho.
+    """
+    if not valor:
+        return valor
+    if valor.startswith('data:'):
+        return salvar_imagem(valor)
+    match = _RE_CAMINHO.search(valor)
+    if match:
+        return caminho_imagem(match.group('hash'), match.group('variante'))
+    return valor
+
+
+def url_imagem(request, valor, variante=None):
+    """Monta a URL pública da imagem (opcionalmente de outra variante)."""
+    if not valor:
+        return valor
+    match = _RE_CAMINHO.search(valor)
+    if not match:
+        return valor
+    caminho = caminho_imagem(match.group('hash'), variante or match.group('variante'))
+    return request.build_absolute_uri(caminho) if request else caminho
+
+# ----------------------------
+# ENTREGA
+# ----------------------------
+
+@require_GET
+def imagem_prato(request, hash_conteudo, variante):
+    etag = f'"{hash_conteudo}-{variante}"'
+    if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+        response = HttpResponseNotModified()
+    else:
+        # Sem a variante (ex.: gravada sem Pillow) cai no original
+        imagens = {
+            imagem['variante']: imagem
+            for imagem in ImagemPrato.objects.filter(
+                hash=hash_conteudo, variante__in=[variante, 'original']
+            ).values('variante', 'content_type', 'conteudo')
+        }
+        imagem = imagens.get(variante) or imagens.get('original')
+        if imagem is None:
+            raise Http404("Imagem não encontrada.")
+        response = HttpResponse(bytes(imagem['conteudo']), content_type=imagem['content_type'])
+
+    response['ETag'] = etag
+    response['Cache-Control'] = CACHE_IMUTAVEL
+    return response
@@ -0,0 +1,189 @@
+import json
+from collections import defaultdict
+from decimal import Decimal
+
+from django.http import HttpResponse
+from django.utils import timezone
+
+from .models import Pedido, PedidoItem
+
+try:
+    import orjson
+except ImportError:  # está no requirements.txt; sem ele (dev) cai no json da biblioteca padrão
+    orjson = None
+
+# Caminho rápido de leitura para os endpoints de polling (cozinha, mesas,
+# acompanhamento do cliente): monta as respostas direto de .values(), sem a
+# introspecção de campos dos ModelSerializers, e já entrega dicts só com
+# str/int/float/None, no mesmo formato que PedidoReadSerializer e
+# MesaSerializer produzem. tests.py compara os dois formatos.
+
+# ----------------------------
+# CONVERSÕES (formato do DRF)
+# ----------------------------
+
+def data_hora(valor):
+    # Como serializers.DateTimeField: fuso atual, microssegundos, 'Z' para UTC
+    if valor is None:
+        return None
+    texto = timezone.localtime(valor).isoformat()
+    return texto[:-6] + 'Z' if texto.endswith('+00:00') else texto
+
+
+def instante(valor):
+    # Como o JSONEncoder do DRF para datetimes soltos no dict: milissegundos
+    texto = valor.isoformat()
+    if valor.microsecond:
+        texto = texto[:23] + texto[26:]
+    return texto[:-6] + 'Z' if texto.endswith('+00:00') else texto
+
+
+def decimal_texto(valor):
+    # serializers.DecimalField(decimal_places=2)
+    return None if valor is None else f'{valor:.2f}'
+
+
+def decimal_numero(valor):
+    # Decimal solto (SerializerMethodField): o JSONEncoder do DRF manda float
+    return float(valor) if isinstance(valor, Decimal) else valor
+
+# ----------------------------
+# PEDIDOS / MESAS
+# ----------------------------
+
+CAMPOS_PEDIDO = (
+    'id', 'codigo_acesso', 'mesa__numero', 'comanda_pai_id', 'status', 'nome_cliente',
+    'criado_por__username', 'criado_em', 'tempo_estimado', 'inicio_preparo',
+)
+CAMPOS_ITEM = ('id', 'pedido_id', 'prato_id', 'prato__nome', 'quantidade', 'preco_unitario', 'observacao', 'usuario__username')
+
+# Campos com source='fk.campo' (usuario_nome, criado_por_nome) somem da
+# resposta do DRF quando a FK é nula, em vez de virem null; aqui também.
+
+def _consulta_itens(pedido_ids):
+    return PedidoItem.objects.filter(pedido_id__in=pedido_ids).order_by('id').values_list(*CAMPOS_ITEM)
+
+
+def _agrupar_itens(linhas):
+    itens = defaultdict(list)
+    for linha in linhas:
+        item_id, pedido_id, prato_id, prato_nome, quantidade, preco, observacao, usuario = linha
+        item = {
+            'id': item_id,
+            'prato': prato_id,
+            'prato_nome': prato_nome,
+            'quantidade': quantidade,
+            'preco_unitario': decimal_texto(preco),
+            'observacao': observacao,
+        }
+        if usuario is not None:
+            item['usuario_nome'] = usuario
+        itens[pedido_id].append(item)
+    return itens
+
+
+def itens_por_pedido(pedido_ids):
+    return _agrupar_itens(_consulta_itens(pedido_ids))
+
+
+def pedido_em_dict(linha, itens):
+    pedido = {
+        'id': linha['id'],
+        'codigo_acesso': linha['codigo_acesso'],
+        'itens': itens.get(linha['id'], []),
+        'mesa_numero': linha['mesa__numero'],
+        'comanda_pai_id': linha['comanda_pai_id'],
+        'eh_principal': linha['comanda_pai_id'] is None,
+        'status': linha['status'],
+        'nome_cliente': linha['nome_cliente'],
+        'criado_por_nome': linha['criado_por__username'],
+        'criado_em': data_hora(linha['criado_em']),
+        'tempo_estimado': linha['tempo_estimado'],
+        'inicio_preparo': data_hora(linha['inicio_preparo']),
+    }
+    if pedido['criado_por_nome'] is None:
+        del pedido['criado_por_nome']
+    return pedido
+
+
+def linhas_pedidos(pedidos):
+    """Queryset de Pedido -> linhas de .values() com o que pedidos_em_dicts precisa."""
+    return pedidos.values(*CAMPOS_PEDIDO)
+
+
+def pedidos_em_dicts(linhas):
+    """Mesmo formato de PedidoReadSerializer(many=True), em 2 queries no total."""
+    linhas = list(linhas)
+    itens = itens_por_pedido([linha['id'] for linha in linhas])
+    return [pedido_em_dict(linha, itens) for linha in linhas]
+
+
+CAMPOS_MESA = ('id', 'numero', 'status', 'capacidade', 'valor_total', 'solicitou_atencao')
+
+
+def _consulta_pedidos_mesas(mesas):
+    return Pedido.objects.filter(mesa_id__in=[mesa['id'] for mesa in mesas]).ativos().values('mesa_id', *CAMPOS_PEDIDO)
+
+
+def _montar_mesas(mesas, linhas, itens):
+    por_mesa = defaultdict(list)
+    for linha in linhas:
+        por_mesa[linha['mesa_id']].append(pedido_em_dict(linha, itens))
+    return [
+        {
+            'id': mesa['id'],
+            'numero': mesa['numero'],
+            'status': mesa['status'],
+            'capacidade': mesa['capacidade'],
+            'valor_total_mesa': decimal_numero(mesa['valor_total']),
+            'pedidos': por_mesa.get(mesa['id'], []),
+            'solicitou_atencao': mesa['solicitou_atencao'],
+        }
+        for mesa in mesas
+    ]
+
+
+def mesas_em_dicts(mesas):
+    """Mesmo formato de MesaSerializer(many=True) para Mesa.objects.com_valor_total()."""
+    mesas = list(mesas.values(*CAMPOS_MESA))
+    linhas = list(_consulta_pedidos_mesas(mesas))
+    return _montar_mesas(mesas, linhas, itens_por_pedido([linha['id'] for linha in linhas]))
+
+# ----------------------------
+# VERSÕES ASSÍNCRONAS (ORM async, views de assincrono.py)
+# ----------------------------
+
+# Mesmas consultas e mesmo formato; só a leitura do banco muda
+
+async def aitens_por_pedido(pedido_ids):
+    return _agrupar_itens([linha async for linha in _consulta_itens(pedido_ids)])
+
+
+async def apedidos_em_dicts(linhas):
+    if hasattr(linhas, '__aiter__'):
+        linhas = [linha async for linha in linhas]
+    itens = await aitens_por_pedido([linha['id'] for linha in linhas])
+    return [pedido_em_dict(linha, itens) for linha in linhas]
+
+
+async def amesas_em_dicts(mesas):
+    mesas = [mesa async for mesa in mesas.values(*CAMPOS_MESA)]
+    linhas = [linha async for linha in _consulta_pedidos_mesas(mesas)]
+    return _montar_mesas(mesas, linhas, await aitens_por_pedido([linha['id'] for linha in linhas]))
+
+# ----------------------------
+# RESPOSTA
+# ----------------------------
+
+def renderizar(dados):
+    if orjson is not None:
+        return orjson.dumps(dados)
+    return json.dumps(dados, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+class RespostaJSON(HttpResponse):
+    """HttpResponse com dados já convertidos; passa direto pelo DRF, sem renderer."""
+
+    def __init__(self, dados, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(renderizar(dados), **kwargs)
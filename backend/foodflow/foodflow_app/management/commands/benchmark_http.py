@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from foodflow_app.benchmarks import carga_http
+from foodflow_app.models import Pedido
+
+
+class Command(BaseCommand):
+    help = (
+        "Carga HTTP de polling (mesas, cozinha, pedido por código) contra um "
+        "servidor rodando, com conexões SSE abertas ao mesmo tempo. Compare "
+        "o deploy WSGI (gunicorn foodflow.wsgi:application --workers 3) com o "
+        "ASGI (VIEWS_ASSINCRONAS=True daphne foodflow.asgi:application) "
+        "usando os mesmos parâmetros e o mesmo banco."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000')
+        parser.add_argument('--conexoes', type=int, default=50, help="Clientes fazendo polling sem pausa.")
+        parser.add_argument('--sse', type=int, default=6, help="Conexões abertas em /api/eventos/pedidos/.")
+        parser.add_argument('--duracao', type=int, default=20, help="Segundos de carga.")
+        parser.add_argument('--timeout', type=float, default=10.0, help="Segundos até a requisição contar como erro.")
+        parser.add_argument('--codigo', help="Código de comanda aberta (padrão: uma do banco configurado).")
+
+    def handle(self, *args, **options):
+        codigo = options['codigo'] or (
+            Pedido.objects.filter(comanda_pai__isnull=True).ativos().values_list('codigo_acesso', flat=True).first()
+        )
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"== {options['url']}: {options['conexoes']} clientes, {options['sse']} SSE, {options['duracao']}s =="
+        ))
+        resultado = carga_http(
+            options['url'], options['conexoes'], options['sse'], options['duracao'], codigo, options['timeout'],
+        )
+        total = resultado.pop('_total')
+        for rota, medicao in resultado.items():
+            self.stdout.write(
+                f"{rota:<40} n={medicao['requisicoes']:<6} erros={medicao['erros']:<5} p50={medicao['p50']:8.2f}ms  "
+                f"p95={medicao['p95']:8.2f}ms  max={medicao['max']:8.2f}ms"
+            )
+        self.stdout.write(f"\nTotal: {total['requisicoes']} requisições, {total['por_segundo']:.1f}/s")
+        if total['erros']:
+            self.stdout.write(self.style.WARNING(f"Erros/timeouts: {total['erros']}"))
@@ -0,0 +1,79 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from foodflow_app.benchmarks import (
+    formatar_medicao, gerar_cardapio, gerar_historico, gerar_mesas, limpar_dados, medir,
+)
+from foodflow_app.models import Mesa, Pedido, PedidoStatus
+
+INDICES = ['pedido_mesa_status_idx', 'pedido_mesa_ativos_idx', 'pedido_status_criado_idx']
+
+
+class Command(BaseCommand):
+    help = (
+        "Popula um histórico grande de pedidos e compara planos e latência das "
+        "consultas quentes de Pedido sem e com os índices da migração 0007."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fechados', type=int, default=300000, help="Pedidos pagos/cancelados no histórico.")
+        parser.add_argument('--mesas', type=int, default=60)
+        parser.add_argument('--repeticoes', type=int, default=50)
+        parser.add_argument('--sem-popular', action='store_true', help="Reaproveita os dados de uma execução anterior.")
+        parser.add_argument('--limpar', action='store_true', help="Apaga os dados gerados e sai.")
+
+    def handle(self, *args, **options):
+        if options['limpar']:
+            limpar_dados()
+            self.stdout.write(self.style.SUCCESS("Dados de benchmark removidos."))
+            return
+
+        if not options['sem_popular']:
+            self.stdout.write(f"Gerando {options['fechados']} pedidos fechados em {options['mesas']} mesas...")
+            _, pratos = gerar_cardapio()
+            mesas = gerar_mesas(options['mesas'])
+            gerar_historico(mesas, pratos, options['fechados'])
+
+        mesas = list(Mesa.objects.filter(numero__gte=9000).values_list('id', flat=True))
+        if not mesas:
+            self.stderr.write("Nenhuma mesa de benchmark; rode sem --sem-popular.")
+            return
+
+        consultas = {
+            'pedidos ativos da mesa': lambda: list(
+                Pedido.objects.filter(mesa_id=random.choice(mesas)).ativos().values_list('id', flat=True)
+            ),
+            'fila da cozinha (pendentes)': lambda: list(
+                Pedido.objects.filter(status=PedidoStatus.PENDENTE).order_by('criado_em').values_list('id', flat=True)
+            ),
+            'mesas com total da conta': lambda: list(
+                Mesa.objects.filter(id__in=mesas).com_valor_total().values_list('id', 'valor_total')
+            ),
+        }
+
+        for fase, sem_indices in (('SEM índices', True), ('COM índices', False)):
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n== {fase} =="))
+            # A remoção dos índices roda dentro de uma transação desfeita no fim
+            with transaction.atomic():
+                if sem_indices:
+                    self._remover_indices()
+                for nome, consulta in consultas.items():
+                    self.stdout.write(formatar_medicao(nome, medir(consulta, options['repeticoes'])))
+                self.stdout.write("")
+                for nome, plano in self._planos(mesas).items():
+                    self.stdout.write(f"-- plano: {nome}\n{plano}")
+                transaction.set_rollback(True)
+
+    def _remover_indices(self):
+        # DROP INDEX direto: vale no SQLite e no PostgreSQL dentro da transação
+        with connection.cursor() as cursor:
+            for indice in INDICES:
+                cursor.execute(f'DROP INDEX {connection.ops.quote_name(indice)}')
+
+    def _planos(self, mesas):
+        return {
+            'pedidos ativos da mesa': Pedido.objects.filter(mesa_id=mesas[0]).ativos().explain(),
+            'fila da cozinha (pendentes)': Pedido.objects.filter(status=PedidoStatus.PENDENTE).order_by('criado_em').explain(),
+        }
@@ -0,0 +1,89 @@
+import contextlib
+import io
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from foodflow_app.benchmarks import (
+    MARCA, comparar_serializacao, formatar_medicao, gerar_cardapio, gerar_historico, gerar_mesas, limpar_dados,
+    medir_endpoints, pedidos_disponiveis, simular_jantar,
+)
+from foodflow_app.models import Prato
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede latência e queries dos endpoints quentes de pedidos e simula a "
+        "hora do jantar com cozinha, garçons e clientes fazendo polling. "
+        "Usa o banco configurado (SQLite ou DATABASE_URL=postgres://...)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fechados', type=int, default=50000, help="Pedidos pagos/cancelados no histórico.")
+        parser.add_argument('--mesas', type=int, default=40)
+        parser.add_argument('--repeticoes', type=int, default=50)
+        parser.add_argument('--serializacao', type=int, default=500, help="Pedidos na comparação de serialização.")
+        parser.add_argument('--cozinha', type=int, default=2, help="Telas da cozinha na simulação.")
+        parser.add_argument('--garcons', type=int, default=4)
+        parser.add_argument('--clientes', type=int, default=30)
+        parser.add_argument('--duracao', type=int, default=30, help="Segundos de simulação.")
+        parser.add_argument('--intervalo', type=float, default=1.0, help="Segundos entre ações de cada cliente.")
+        parser.add_argument('--semente', type=int, help="Semente do random, para repetir a mesma carga.")
+        parser.add_argument('--sem-popular', action='store_true', help="Reaproveita os dados de uma execução anterior.")
+        parser.add_argument('--sem-carga', action='store_true', help="Só os micro-benchmarks.")
+        parser.add_argument('--limpar', action='store_true', help="Apaga os dados gerados e sai.")
+
+    def handle(self, *args, **options):
+        if options['limpar']:
+            limpar_dados()
+            self.stdout.write(self.style.SUCCESS("Dados de benchmark removidos."))
+            return
+        if options['semente'] is not None:
+            random.seed(options['semente'])
+
+        self.stdout.write(f"Banco: {connection.vendor} ({connection.settings_dict['NAME']})")
+        if not options['sem_popular']:
+            self.stdout.write(f"Gerando {options['fechados']} pedidos fechados em {options['mesas']} mesas...")
+            _, pratos = gerar_cardapio()
+            gerar_historico(gerar_mesas(options['mesas']), pratos, options['fechados'])
+
+        pratos = list(Prato.objects.filter(nome__startswith=MARCA))
+        if not pratos:
+            self.stderr.write("Nenhum prato de benchmark; rode sem --sem-popular.")
+            return
+
+        # iniciar_comanda ainda imprime mensagens de debug; ficam fora do relatório
+        with contextlib.redirect_stdout(io.StringIO()):
+            micro = medir_endpoints(pratos, options['repeticoes'])
+        self.stdout.write(self.style.MIGRATE_HEADING("\n== Endpoints (por requisição) =="))
+        for nome, resultado in micro.items():
+            self.stdout.write(formatar_medicao(nome, resultado))
+
+        self.stdout.write(self.style.MIGRATE_HEADING("\n== Serialização (DRF x caminho rápido) =="))
+        disponiveis = pedidos_disponiveis(options['serializacao'])
+        if disponiveis < options['serializacao']:
+            self.stdout.write(self.style.WARNING(
+                f"Só {disponiveis} pedido(s) no banco; a comparação usa esses em vez de {options['serializacao']}."
+            ))
+        for nome, resultado in comparar_serializacao(options['serializacao']).items():
+            self.stdout.write(formatar_medicao(nome, resultado))
+
+        if options['sem_carga']:
+            return
+
+        clientes = {'cozinha': options['cozinha'], 'garcom': options['garcons'], 'cliente': options['clientes']}
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"\n== Hora do jantar: {clientes} por {options['duracao']}s =="
+        ))
+        with contextlib.redirect_stdout(io.StringIO()):
+            carga = simular_jantar(pratos, clientes, options['duracao'], options['intervalo'])
+        total = carga.pop('_total')
+        for acao, resultado in carga.items():
+            self.stdout.write(
+                f"{acao:<40} n={resultado['requisicoes']:<6} p50={resultado['p50']:8.2f}ms  "
+                f"p95={resultado['p95']:8.2f}ms  max={resultado['max']:8.2f}ms"
+            )
+        self.stdout.write(f"\nTotal: {total['requisicoes']} requisições, {total['por_segundo']:.1f}/s")
+        if total['erros']:
+            self.stdout.write(self.style.WARNING(f"Erros por papel: {total['erros']}"))
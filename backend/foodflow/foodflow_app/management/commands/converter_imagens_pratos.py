@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from foodflow_app.cardapio import invalidar_cardapio
+from foodflow_app.imagens import ImagemInvalida, salvar_imagem
+from foodflow_app.models import Prato
+
+
+class Command(BaseCommand):
+    help = "Converte as imagens base64 guardadas em Prato.imagem em arquivos servidos por URL."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=100, help="Pratos atualizados por bulk_update.")
+        parser.add_argument('--dry-run', action='store_true', help="Só conta, sem gravar.")
+
+    def handle(self, *args, **options):
+        lote = options['lote']
+        ids = list(Prato.objects.filter(imagem__startswith='data:').order_by('id').values_list('id', flat=True))
+        self.stdout.write(f"{len(ids)} prato(s) com imagem em base64.")
+        if options['dry_run']:
+            return
+
+        convertidos = falhas = 0
+        # Carrega e grava por lotes para não ter todas as imagens na memória
+        for inicio in range(0, len(ids), lote):
+            pratos = []
+            for prato in Prato.objects.filter(id__in=ids[inicio:inicio + lote]).only('id', 'imagem'):
+                try:
+                    prato.imagem = salvar_imagem(prato.imagem)
+                except ImagemInvalida as e:
+                    falhas += 1
+                    self.stderr.write(f"Prato #{prato.id}: {e}")
+                    continue
+                pratos.append(prato)
+            convertidos += Prato.objects.bulk_update(pratos, ['imagem'])
+
+        if convertidos:
+            # bulk_update não dispara signals
+            invalidar_cardapio()
+        self.stdout.write(self.style.SUCCESS(f"{convertidos} convertido(s), {falhas} falha(s)."))
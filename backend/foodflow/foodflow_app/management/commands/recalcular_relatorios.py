@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from foodflow_app.relatorios import reconstruir
+
+
+class Command(BaseCommand):
+    help = "Reconstrói os agregados de vendas/preparo (ResumoVendas) a partir do histórico de pedidos."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help="Data (AAAA-MM-DD) a partir da qual refazer; sem ela refaz tudo.")
+        parser.add_argument('--lote', type=int, default=2000, help="Pedidos lidos por consulta.")
+
+    def handle(self, *args, **options):
+        desde = None
+        if options['desde']:
+            desde = parse_date(options['desde'])
+            if desde is None:
+                raise CommandError("--desde deve estar no formato AAAA-MM-DD.")
+
+        linhas = reconstruir(desde, options['lote'])
+        self.stdout.write(self.style.SUCCESS(f"{linhas} linha(s) de agregado gravada(s)."))
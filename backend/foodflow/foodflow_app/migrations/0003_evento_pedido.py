@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodflow_app', '0002_pedido_inicio_preparo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoPedido',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('pedido_id', models.BigIntegerField()),
+                ('codigo_acesso', models.CharField(db_index=True, max_length=6)),
+                ('tipo', models.CharField(max_length=20)),
+                ('dados', models.JSONField(blank=True, null=True)),
+                ('criado_em', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodflow_app', '0003_evento_pedido'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImagemPrato',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hash', models.CharField(max_length=64)),
+                ('variante', models.CharField(max_length=20)),
+                ('content_type', models.CharField(max_length=50)),
+                ('conteudo', models.BinaryField()),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'unique_together': {('hash', 'variante')},
+            },
+        ),
+    ]
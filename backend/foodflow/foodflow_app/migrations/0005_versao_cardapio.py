@@ -0,0 +1,20 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodflow_app', '0004_imagem_prato'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersaoCardapio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('versao', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
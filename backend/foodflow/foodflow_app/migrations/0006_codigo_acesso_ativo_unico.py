@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodflow_app', '0005_versao_cardapio'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='pedido',
+            constraint=models.UniqueConstraint(condition=models.Q(('comanda_pai__isnull', True), models.Q(('status__in', ['pago', 'cancelado']), _negated=True)), fields=('codigo_acesso',), name='pedido_codigo_acesso_ativo_unico'),
+        ),
+    ]
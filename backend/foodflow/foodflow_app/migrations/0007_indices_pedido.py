@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodflow_app', '0006_codigo_acesso_ativo_unico'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['mesa', 'status'], name='pedido_mesa_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(condition=models.Q(('status__in', ['pago', 'cancelado']), _negated=True), fields=['mesa'], name='pedido_mesa_ativos_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['status', 'criado_em'], name='pedido_status_criado_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:19
+
+import math
+
+from django.db import migrations, models
+
+
+def preencher_porcoes(apps, schema_editor):
+    Prato = apps.get_model('foodflow_app', 'Prato')
+    PratoIngrediente = apps.get_model('foodflow_app', 'PratoIngrediente')
+
+    porcoes = {}
+    for prato_id, utilizada, estoque in PratoIngrediente.objects.values_list(
+        'prato_id', 'quantidade_utilizada', 'ingrediente__quantidade_estoque'
+    ):
+        if utilizada > 0:
+            rende = max(0, math.floor(estoque / utilizada))
+            porcoes[prato_id] = min(porcoes.get(prato_id, rende), rende)
+
+    Prato.objects.bulk_update(
+        [Prato(pk=prato_id, porcoes_disponiveis=rende) for prato_id, rende in porcoes.items()],
+        ['porcoes_disponiveis'],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodflow_app', '0007_indices_pedido'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prato',
+            name='porcoes_disponiveis',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(preencher_porcoes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodflow_app', '0008_prato_porcoes_disponiveis'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pedido',
+            name='pronto_em',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='ResumoVendas',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimensao', models.CharField(max_length=10)),
+                ('chave_id', models.BigIntegerField()),
+                ('rotulo', models.CharField(max_length=100)),
+                ('granularidade', models.CharField(max_length=4)),
+                ('inicio', models.DateTimeField()),
+                ('receita', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('itens', models.IntegerField(default=0)),
+                ('pedidos', models.IntegerField(default=0)),
+                ('preparo_segundos', models.BigIntegerField(default=0)),
+                ('preparo_pedidos', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('dimensao', 'granularidade', 'inicio', 'chave_id'), name='resumo_vendas_unico')],
+            },
+        ),
+    ]
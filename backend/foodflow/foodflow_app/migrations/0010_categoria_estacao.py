@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodflow_app', '0009_relatorios'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categoria',
+            name='estacao',
+            field=models.CharField(default='geral', max_length=30),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodflow_app', '0010_categoria_estacao'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['atualizado_em'], name='pedido_atualizado_idx'),
+        ),
+    ]
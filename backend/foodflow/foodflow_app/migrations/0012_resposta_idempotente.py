@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodflow_app', '0011_indice_pedido_atualizado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RespostaIdempotente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chave', models.CharField(max_length=64, unique=True)),
+                ('requisicao', models.CharField(max_length=64)),
+                ('status', models.PositiveSmallIntegerField()),
+                ('corpo', models.BinaryField()),
+                ('criado_em', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:58
+
+from django.db import migrations, models
+
+
+def marcar_contabilizados(apps, schema_editor):
+    # Os mesmos pedidos que o recalcular_relatorios soma: pagos e preparos completos
+    Pedido = apps.get_model('foodflow_app', 'Pedido')
+    Pedido.objects.filter(status='pago').update(vendas_contabilizadas=True)
+    Pedido.objects.filter(inicio_preparo__isnull=False, pronto_em__isnull=False).update(preparo_contabilizado=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodflow_app', '0012_resposta_idempotente'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pedido',
+            name='preparo_contabilizado',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='pedido',
+            name='vendas_contabilizadas',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(marcar_contabilizados, migrations.RunPython.noop),
+    ]
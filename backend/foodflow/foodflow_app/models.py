@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import DecimalField, F, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import AbstractUser, Group, Permission
 from django.utils import timezone
 from django.utils.crypto import get_random_string
@@ -31,12 +33,13 @@ class MetodoPagamento(models.TextChoices):
 # Função para gerar código único
 # ----------------------------
 
-def gerar_codigo_acesso_unico():
-    caracteres = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
-    while True:
-        codigo = get_random_string(6, allowed_chars=caracteres)
-        if not Pedido.objects.filter(codigo_acesso=codigo).exists():
-            return codigo
+# 32^6 (~1 bilhão) combinações; a unicidade entre comandas ativas é garantida
+# pela constraint `pedido_codigo_acesso_ativo_unico`, sem consultar antes
+CARACTERES_CODIGO = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
+TENTATIVAS_CODIGO = 10
+
+def gerar_codigo_acesso():
+    return get_random_string(6, allowed_chars=CARACTERES_CODIGO)
 
 
 # ----------------------------
@@ -72,11 +75,84 @@ class Usuario(AbstractUser):
         verbose_name='user permissions',
     )
 
+# ----------------------------
+# QUERYSETS
+# ----------------------------
+
+# Status em que o pedido já saiu da conta aberta da mesa
+STATUS_ENCERRADOS = [PedidoStatus.PAGO, PedidoStatus.CANCELADO]
+STATUS_ATIVOS = [s for s in PedidoStatus if s not in STATUS_ENCERRADOS]
+
+def soma_itens(prefixo='', filtro=None):
+    # SUM(quantidade * preco_unitario) dos itens alcançados por `prefixo`
+    return Sum(
+        F(f'{prefixo}quantidade') * F(f'{prefixo}preco_unitario'),
+        filter=filtro,
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+class PedidoQuerySet(models.QuerySet):
+    def ativos(self):
+        return self.exclude(status__in=STATUS_ENCERRADOS)
+
+    def da_comanda(self, codigo):
+        # Códigos são reaproveitados depois que a comanda fecha: pega só o grupo
+        # (pai + filhas) da comanda principal mais recente com esse código
+        principal = self.model.objects.filter(
+            codigo_acesso=codigo, comanda_pai__isnull=True
+        ).order_by('-id').values('id')[:1]
+        return self.filter(codigo_acesso=codigo).filter(
+            Q(id=Subquery(principal)) | Q(comanda_pai_id=Subquery(principal))
+        )
+
+    def com_total(self):
+        return self.annotate(
+            total=Coalesce(
+                soma_itens('itens__'), Value(0), output_field=DecimalField(max_digits=12, decimal_places=2),
+            )
+        )
+
+    def com_relacionados(self):
+        # Tudo que o PedidoReadSerializer lê, em 2 queries no total
+        return self.select_related('mesa', 'criado_por').prefetch_related(
+            models.Prefetch('itens', queryset=PedidoItem.objects.select_related('prato', 'usuario'))
+        )
+
+class AuditadoMixin:
+    # Guarda os valores como vieram do banco, para o log de auditoria
+    # (auditoria.py) ter o "antes" de um save sem precisar de outro SELECT
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._auditoria_antes = dict(zip(field_names, values))
+        return instance
+
+class MesaQuerySet(models.QuerySet):
+    def com_valor_total(self):
+        # Total da conta aberta calculado pelo banco, numa query para todas as mesas
+        return self.annotate(
+            valor_total=Coalesce(
+                soma_itens('pedido__itens__', filtro=Q(pedido__status__in=STATUS_ATIVOS)),
+                Value(0),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            )
+        )
+
+    def com_pedidos_ativos(self):
+        # Preenche mesa.pedidos_ativos (lido pelo MesaSerializer) sem N+1
+        return self.prefetch_related(
+            models.Prefetch(
+                'pedido_set',
+                queryset=Pedido.objects.ativos().com_relacionados(),
+                to_attr='pedidos_ativos',
+            )
+        )
+
 # ----------------------------
 # MESA
 # ----------------------------
 
-class Mesa(models.Model):
+class Mesa(AuditadoMixin, models.Model):
     numero = models.IntegerField(unique=True)
     capacidade = models.IntegerField()
     status = models.CharField(max_length=20, choices=[('disponivel', 'Disponível'), ('ocupada', 'Ocupada'), ('reservada', 'Reservada')])
@@ -87,19 +163,23 @@ class Mesa(models.Model):
     criado_em = models.DateTimeField(auto_now_add=True)
     atualizado_em = models.DateTimeField(auto_now=True)
 
+    objects = MesaQuerySet.as_manager()
+
 # ----------------------------
 # CATEGORIA / PRATO
 # ----------------------------
 
-class Categoria(models.Model):
+class Categoria(AuditadoMixin, models.Model):
     nome = models.CharField(max_length=100, unique=True)
     icone = models.CharField(max_length=10, blank=True)
+    # Praça da cozinha que prepara os pratos desta categoria (ver estacoes.py)
+    estacao = models.CharField(max_length=30, default='geral')
     criado_por = models.ForeignKey(Usuario, on_delete=models.PROTECT)
     ativo = models.BooleanField(default=True)
     criado_em = models.DateTimeField(auto_now_add=True)
     atualizado_em = models.DateTimeField(auto_now=True)
 
-class Prato(models.Model):
+class Prato(AuditadoMixin, models.Model):
     nome = models.CharField(max_length=100)
     descricao = models.TextField(blank=True)
     preco = models.DecimalField(max_digits=10, decimal_places=2)
@@ -107,13 +187,36 @@ class Prato(models.Model):
     categoria = models.ForeignKey(Categoria, on_delete=models.PROTECT)
     criado_por = models.ForeignKey(Usuario, on_delete=models.PROTECT)
     ativo = models.BooleanField(default=True)
+    # Índice de disponibilidade mantido por estoque.atualizar_disponibilidade;
+    # None = sem ficha técnica (não depende de estoque)
+    porcoes_disponiveis = models.IntegerField(null=True, blank=True, editable=False)
     criado_em = models.DateTimeField(auto_now_add=True)
     atualizado_em = models.DateTimeField(auto_now=True)
 
+class VersaoCardapio(models.Model):
+    # Linha única; incrementada a cada escrita em Prato/Categoria (ver signals.py)
+    versao = models.BigIntegerField(default=0)
+
+class ImagemPrato(models.Model):
+    # Endereçada pelo conteúdo: mesmo hash => mesmos bytes, por isso pode ser
+    # servida com cache imutável. Fica no banco para ser vista por todas as réplicas.
+    hash = models.CharField(max_length=64)
+    variante = models.CharField(max_length=20)  # original/media/miniatura
+    content_type = models.CharField(max_length=50)
+    conteudo = models.BinaryField()
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('hash', 'variante')
+
 # ----------------------------
 # INGREDIENTES / ESTOQUE
 # ----------------------------
 
+class IngredienteQuerySet(models.QuerySet):
+    def abaixo_do_minimo(self):
+        return self.filter(ativo=True, quantidade_estoque__lte=F('estoque_minimo'))
+
 class Ingrediente(models.Model):
     nome = models.CharField(max_length=100)
     quantidade_estoque = models.DecimalField(max_digits=10, decimal_places=2)
@@ -123,6 +226,8 @@ class Ingrediente(models.Model):
     criado_em = models.DateTimeField(auto_now_add=True)
     atualizado_em = models.DateTimeField(auto_now=True)
 
+    objects = IngredienteQuerySet.as_manager()
+
 class PratoIngrediente(models.Model):
     prato = models.ForeignKey(Prato, on_delete=models.CASCADE)
     ingrediente = models.ForeignKey(Ingrediente, on_delete=models.CASCADE)
@@ -132,7 +237,7 @@ class PratoIngrediente(models.Model):
 # PEDIDOS / ITENS
 # ----------------------------
 
-class Pedido(models.Model):
+class Pedido(AuditadoMixin, models.Model):
     id = models.BigAutoField(primary_key=True)
 
     # Código de acesso compartilhado entre comanda pai e filhas
@@ -151,11 +256,16 @@ class Pedido(models.Model):
     )
     tempo_estimado = models.IntegerField(null=True, blank=True)
     inicio_preparo = models.DateTimeField(null=True, blank=True)
+    pronto_em = models.DateTimeField(null=True, blank=True)
     criado_por = models.ForeignKey('Usuario', on_delete=models.PROTECT, null=True, blank=True)
     ativo = models.BooleanField(default=True)
     criado_em = models.DateTimeField(auto_now_add=True)
     atualizado_em = models.DateTimeField(auto_now=True)
     data = models.DateTimeField(default=timezone.now)
+    # Já somado nos agregados de relatorios.py (vendas ao pagar, preparo ao
+    # ficar pronto): uma transição repetida não conta o pedido de novo
+    vendas_contabilizadas = models.BooleanField(default=False, editable=False)
+    preparo_contabilizado = models.BooleanField(default=False, editable=False)
 
     # Comanda pai (somente um nível permitido)
     comanda_pai = models.ForeignKey(
@@ -166,37 +276,147 @@ class Pedido(models.Model):
         related_name='comandas_filhas'
     )
 
+    objects = PedidoQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # Só uma comanda principal ativa por código (filhas herdam o do pai)
+            models.UniqueConstraint(
+                fields=['codigo_acesso'],
+                condition=Q(comanda_pai__isnull=True) & ~Q(status__in=STATUS_ENCERRADOS),
+                name='pedido_codigo_acesso_ativo_unico',
+            ),
+        ]
+        indexes = [
+            # Conta aberta da mesa (adicionar_item, liberar, iniciar_comanda, MesaSerializer)
+            models.Index(fields=['mesa', 'status'], name='pedido_mesa_status_idx'),
+            # Só os pedidos ativos: fica pequeno mesmo com anos de histórico fechado
+            models.Index(
+                fields=['mesa'],
+                condition=~Q(status__in=STATUS_ENCERRADOS),
+                name='pedido_mesa_ativos_idx',
+            ),
+            # Fila da cozinha filtrada por status em ordem de chegada
+            models.Index(fields=['status', 'criado_em'], name='pedido_status_criado_idx'),
+            # Delta da cozinha (?updated_since) e ETags das listagens (MAX(atualizado_em))
+            models.Index(fields=['atualizado_em'], name='pedido_atualizado_idx'),
+        ]
+
+    # FKs ficam fora do full_clean: cada uma custaria um SELECT de existência
+    # e o banco já garante a integridade
+    CAMPOS_FK = ['mesa', 'criado_por', 'comanda_pai']
+    # Nunca regravados pelo save: o código não muda depois de criado e as
+    # marcas dos relatórios só mudam por UPDATE condicional (relatorios.py),
+    # que uma instância antiga em memória desfaria
+    CAMPOS_FORA_DO_SAVE = {'codigo_acesso', 'vendas_contabilizadas', 'preparo_contabilizado'}
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._comanda_pai_id_original = instance.__dict__.get('comanda_pai_id')
+        instance._status_original = instance.__dict__.get('status')
+        return instance
+
     @property
     def is_principal(self):
-        return self.comanda_pai is None
+        return self.comanda_pai_id is None
 
     def clean(self):
-        if self.comanda_pai and self.comanda_pai.comanda_pai:
+        # Só revalida a hierarquia quando a comanda pai muda (ou na criação)
+        pai_mudou = self.comanda_pai_id != getattr(self, '_comanda_pai_id_original', None)
+        if self.comanda_pai_id and pai_mudou and self.comanda_pai.comanda_pai_id:
             raise ValidationError("Uma comanda filha não pode ser pai de outra comanda.")
-
-        if not self.comanda_pai:
-        # Se for comanda principal, o código precisa ser único
-            if Pedido.objects.filter(codigo_acesso=self.codigo_acesso).exclude(pk=self.pk).exists():
-             raise ValidationError("Já existe uma comanda principal com esse código.")
+        # A unicidade do código da comanda principal fica com a constraint do banco
 
 
     def save(self, *args, **kwargs):
-        self.full_clean()
-
-        if self.pk:
-        # Se já existe, não altera o código
-         original = Pedido.objects.get(pk=self.pk)
-         self.codigo_acesso = original.codigo_acesso
-        else:
-            if self.comanda_pai:
-                self.codigo_acesso = self.comanda_pai.codigo_acesso
+        # Sem validate_constraints: a constraint condicional custaria uma query
+        self.full_clean(exclude=self.CAMPOS_FK, validate_constraints=False)
+
+        if self.status == PedidoStatus.EM_PREPARO and self.inicio_preparo is None:
+            self.inicio_preparo = timezone.now()
+        if self.status == PedidoStatus.PRONTO and self.pronto_em is None:
+            self.pronto_em = timezone.now()
+
+        if not self._state.adding:
+            # O código nunca muda depois de criado: fica fora do UPDATE
+            # em vez de reler a linha para restaurá-lo
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                update_fields = [
+                    f.name for f in self._meta.concrete_fields
+                    if not f.primary_key and f.name not in self.CAMPOS_FORA_DO_SAVE
+                ]
             else:
-             self.codigo_acesso = gerar_codigo_acesso_unico()
+                update_fields = set(update_fields) - self.CAMPOS_FORA_DO_SAVE | {'atualizado_em', 'inicio_preparo', 'pronto_em'}
+            kwargs['update_fields'] = update_fields
+        elif self.comanda_pai_id:
+            self.codigo_acesso = self.comanda_pai.codigo_acesso
+        else:
+            return self._salvar_com_codigo_novo(*args, **kwargs)
 
         super().save(*args, **kwargs)
+        self._comanda_pai_id_original = self.comanda_pai_id
+        self._transicao_salva()
+
+    def _transicao_salva(self):
+        # Import local para evitar import circular (relatorios -> models)
+        from .relatorios import registrar_transicao
+
+        anterior = getattr(self, '_status_original', None)
+        if self.status != anterior:
+            registrar_transicao(self, anterior, self.status)
+        self._status_original = self.status
+
+    def mudar_status(self, status, **campos):
+        """
+        Grava uma transição de status num único UPDATE, sem full_clean nem SELECT.
+
+        Não aceita mudar a comanda pai, então a hierarquia de um nível continua valendo.
+        """
+        if status not in PedidoStatus.values:
+            raise ValidationError(f"Status inválido: {status}.")
+        if 'comanda_pai' in campos or 'comanda_pai_id' in campos or 'codigo_acesso' in campos:
+            raise ValidationError("Transição de status não altera comanda pai nem código.")
+
+        campos['status'] = status
+        if status == PedidoStatus.EM_PREPARO and self.inicio_preparo is None:
+            campos.setdefault('inicio_preparo', timezone.now())
+        if status == PedidoStatus.PRONTO and self.pronto_em is None:
+            campos.setdefault('pronto_em', timezone.now())
+        campos['atualizado_em'] = timezone.now()
+
+        # Import local para evitar import circular (auditoria -> models)
+        from .auditoria import registrar_alteracao
+
+        Pedido.objects.filter(pk=self.pk).update(**campos)
+        antes = {campo: getattr(self, campo) for campo in campos}
+        for campo, valor in campos.items():
+            setattr(self, campo, valor)
+        registrar_alteracao(self, 'update', antes, campos)
+        self._transicao_salva()
+
+    def _salvar_com_codigo_novo(self, *args, **kwargs):
+        # Sorteia e tenta gravar; só em caso de colisão com comanda ativa sorteia de novo
+        for tentativa in range(TENTATIVAS_CODIGO):
+            self.codigo_acesso = gerar_codigo_acesso()
+            try:
+                with transaction.atomic():
+                    super().save(*args, **kwargs)
+                    self._comanda_pai_id_original = self.comanda_pai_id
+                    self._transicao_salva()
+                    return
+            except IntegrityError as e:
+                if not _violou_codigo_unico(e) or tentativa == TENTATIVAS_CODIGO - 1:
+                    raise
 
     def __str__(self):
         return f"Pedido #{self.id} - Código: {self.codigo_acesso}"
+
+def _violou_codigo_unico(erro):
+    # PostgreSQL cita o nome da constraint; o SQLite, a coluna
+    mensagem = str(erro)
+    return 'pedido_codigo_acesso_ativo_unico' in mensagem or 'pedido.codigo_acesso' in mensagem
     
 class PedidoUsuario(models.Model):
     pedido = models.ForeignKey(Pedido, on_delete=models.CASCADE)
@@ -205,7 +425,7 @@ class PedidoUsuario(models.Model):
     class Meta:
         unique_together = ('pedido', 'usuario')
 
-class PedidoItem(models.Model):
+class PedidoItem(AuditadoMixin, models.Model):
     pedido = models.ForeignKey(Pedido, on_delete=models.CASCADE, related_name='itens')    
     prato = models.ForeignKey(Prato, on_delete=models.PROTECT)
     usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, null=True, blank=True)
@@ -214,6 +434,33 @@ class PedidoItem(models.Model):
     observacao = models.TextField(blank=True)
     criado_em = models.DateTimeField(auto_now_add=True)
 
+# ----------------------------
+# EVENTOS DE PEDIDO (push para cozinha/clientes)
+# ----------------------------
+
+class EventoPedido(models.Model):
+    # O id crescente serve de cursor de reconexão (Last-Event-ID)
+    id = models.BigAutoField(primary_key=True)
+    # Sem FK: o evento de remoção precisa sobreviver ao pedido apagado
+    pedido_id = models.BigIntegerField()
+    codigo_acesso = models.CharField(max_length=6, db_index=True)
+    tipo = models.CharField(max_length=20)  # criado/atualizado/removido
+    dados = models.JSONField(null=True, blank=True)
+    criado_em = models.DateTimeField(auto_now_add=True, db_index=True)
+
+# ----------------------------
+# IDEMPOTÊNCIA (repetições do "Confirmar")
+# ----------------------------
+
+class RespostaIdempotente(models.Model):
+    # sha256 de rota + Idempotency-Key: tamanho fixo, seja qual for a chave do cliente
+    chave = models.CharField(max_length=64, unique=True)
+    # sha256 do corpo, para recusar a mesma chave com outro pedido
+    requisicao = models.CharField(max_length=64)
+    status = models.PositiveSmallIntegerField()
+    corpo = models.BinaryField()
+    criado_em = models.DateTimeField(auto_now_add=True, db_index=True)
+
 # ----------------------------
 # PAGAMENTOS
 # ----------------------------
@@ -226,6 +473,34 @@ class Pagamento(models.Model):
     status = models.CharField(max_length=20, choices=PagamentoStatus.choices, default=PagamentoStatus.PENDENTE)
     pago_em = models.DateTimeField(default=timezone.now)
 
+# ----------------------------
+# RELATÓRIOS (agregados de leitura)
+# ----------------------------
+
+class ResumoVendas(models.Model):
+    # Totais por prato/categoria/mesa e por hora/dia, mantidos por relatorios.py
+    # a cada transição de status; os relatórios do gerente só leem daqui
+    dimensao = models.CharField(max_length=10)  # prato/categoria/mesa
+    chave_id = models.BigIntegerField()
+    rotulo = models.CharField(max_length=100)
+    granularidade = models.CharField(max_length=4)  # hora/dia
+    inicio = models.DateTimeField()
+    receita = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    itens = models.IntegerField(default=0)
+    pedidos = models.IntegerField(default=0)
+    # Preparo (inicio_preparo -> pronto_em) somado, para tirar a média na leitura
+    preparo_segundos = models.BigIntegerField(default=0)
+    preparo_pedidos = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Também é o índice das consultas por dimensão + período
+            models.UniqueConstraint(
+                fields=['dimensao', 'granularidade', 'inicio', 'chave_id'],
+                name='resumo_vendas_unico',
+            ),
+        ]
+
 # ----------------------------
 # AUDITORIA
 # ----------------------------
@@ -0,0 +1,224 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .auditoria import registrar_alteracao, registrar_lote
+from .estoque import baixar_estoque, porcoes_dos_itens
+from .models import Mesa, Pagamento, PagamentoStatus, Prato, Pedido, PedidoItem, PedidoStatus
+from .relatorios import contabilizar
+
+# ----------------------------
+# COMANDA ABERTA DA MESA
+# ----------------------------
+
+def comanda_aberta(mesa):
+    # Se já houver duplicadas de antes, fica sempre com a mais antiga
+    return Pedido.objects.filter(mesa=mesa, comanda_pai__isnull=True).ativos().order_by('id').first()
+
+
+def abrir_comanda(mesa, usuario=None, nome_cliente=None, tempo_estimado=None):
+    """
+    Devolve a comanda principal aberta da mesa ou cria uma, sem duplicar.
+
+    A linha da mesa fica travada (SELECT ... FOR UPDATE) até o fim da
+    transação, então dois celulares na mesma mesa (ou duas réplicas)
+    passam um de cada vez: o segundo já encontra a comanda do primeiro.
+    Retorna (pedido, criada).
+    """
+    with transaction.atomic():
+        mesa = Mesa.objects.select_for_update().get(pk=mesa.pk)
+        pedido = comanda_aberta(mesa)
+        if pedido:
+            return pedido, False
+
+        pedido = Pedido.objects.create(
+            mesa=mesa,
+            criado_por=usuario,
+            nome_cliente=nome_cliente or f"Mesa {mesa.numero}",
+            status=PedidoStatus.PENDENTE,
+            tempo_estimado=tempo_estimado,
+        )
+        mesa.status = 'ocupada'
+        mesa.save(update_fields=['status'])
+        return pedido, True
+
+def fechar_mesas(mesa_ids, usuario=None, metodo_pagamento=None):
+    """
+    Fecha a conta de uma ou várias mesas numa transação só.
+
+    Os totais saem da mesma consulta que escolhe os pedidos abertos; depois
+    é um UPDATE para os pedidos, um para as mesas e, se houver método de
+    pagamento, um bulk_create dos pagamentos (um por pedido com valor).
+    Devolve o resumo por mesa; quem chama publica os eventos dos pedidos.
+    """
+    with transaction.atomic():
+        # Trava em ordem de id para dois fechamentos em lote não se cruzarem
+        mesas = list(
+            Mesa.objects.select_for_update().filter(pk__in=mesa_ids).order_by('id').values_list('id', 'numero', 'status')
+        )
+        ids = [mesa_id for mesa_id, _, _ in mesas]
+        abertos = list(
+            Pedido.objects.filter(mesa_id__in=ids).ativos().com_total().order_by('id')
+            .values('id', 'mesa_id', 'status', 'total', 'vendas_contabilizadas')
+        )
+
+        agora = timezone.now()
+        Pedido.objects.filter(pk__in=[p['id'] for p in abertos]).update(
+            status=PedidoStatus.PAGO, vendas_contabilizadas=True, atualizado_em=agora,
+        )
+        Mesa.objects.filter(pk__in=ids).update(status='disponivel', solicitou_atencao=False, atualizado_em=agora)
+        for p in abertos:
+            registrar_alteracao(Pedido(pk=p['id']), 'update', {'status': p['status']}, {'status': PedidoStatus.PAGO})
+        for mesa_id, _, status in mesas:
+            registrar_alteracao(Mesa(pk=mesa_id), 'update', {'status': status}, {'status': 'disponivel'})
+        # Mesas travadas: nenhum outro fechamento marca esses pedidos no meio
+        contabilizar([p['id'] for p in abertos if not p['vendas_contabilizadas']])
+        if metodo_pagamento and usuario:
+            Pagamento.objects.bulk_create([
+                Pagamento(
+                    pedido_id=p['id'], usuario=usuario, valor=p['total'],
+                    metodo_pagamento=metodo_pagamento, status=PagamentoStatus.APROVADO, pago_em=agora,
+                )
+                for p in abertos if p['total']
+            ])
+
+    resumo = {
+        mesa_id: {'mesa_id': mesa_id, 'numero': numero, 'pedidos': [], 'total': Decimal('0.00')}
+        for mesa_id, numero, _ in mesas
+    }
+    for pedido in abertos:
+        resumo[pedido['mesa_id']]['pedidos'].append(pedido['id'])
+        resumo[pedido['mesa_id']]['total'] += pedido['total']
+    return list(resumo.values())
+
+# ----------------------------
+# ESCRITA DE ITENS EM LOTE
+# ----------------------------
+
+def carregar_pratos(prato_ids):
+    """
+    Busca de uma vez (in_bulk) todos os pratos referenciados por um pedido.
+
+    Levanta Prato.DoesNotExist listando os ids que não existem.
+    """
+    ids = {int(prato_id) for prato_id in prato_ids}
+    pratos = Prato.objects.in_bulk(ids)
+    faltando = ids - pratos.keys()
+    if faltando:
+        raise Prato.DoesNotExist(f"Pratos inexistentes: {sorted(faltando)}")
+    return pratos
+
+
+def tocar_pedido(pedido_id):
+    # Mudança só nos itens também conta para quem sincroniza por atualizado_em
+    Pedido.objects.filter(pk=pedido_id).update(atualizado_em=timezone.now())
+
+
+def porcoes_pedidas(itens):
+    # {prato_id: quantidade total} de uma lista de itens ainda não gravados
+    porcoes = defaultdict(int)
+    for item in itens:
+        porcoes[int(item['prato'])] += item['quantidade']
+    return porcoes
+
+
+def criar_itens(pedido, itens, pratos, usuario=None):
+    """
+    Insere todos os itens com um único bulk_create, congelando o preço atual
+    do prato, e dá baixa no estoque dos ingredientes.
+    """
+    criados = PedidoItem.objects.bulk_create([
+        PedidoItem(
+            pedido=pedido,
+            prato=pratos[int(item['prato'])],
+            usuario=usuario,
+            quantidade=item['quantidade'],
+            observacao=item.get('observacao') or '',
+            preco_unitario=pratos[int(item['prato'])].preco,
+        )
+        for item in itens
+    ])
+    baixar_estoque(porcoes_dos_itens(criados))
+    registrar_lote('insert', criados)
+    return criados
+
+
+def sincronizar_itens(pedido, itens, pratos, usuario=None):
+    """
+    Deixa os itens do pedido iguais à lista recebida, mexendo só no que mudou.
+
+    Itens são casados por (prato, observação): os que já existem só têm a
+    quantidade atualizada (e mantêm o preço da época), os novos entram num
+    bulk_create e os que sumiram saem num único DELETE.
+    """
+    existentes = defaultdict(list)
+    for item in pedido.itens.all():
+        existentes[(item.prato_id, item.observacao)].append(item)
+
+    novos, alterados = [], []
+    # Diferença de porções por prato, para acertar o estoque no fim
+    porcoes = defaultdict(int)
+    for item in itens:
+        chave = (int(item['prato']), item.get('observacao') or '')
+        if existentes[chave]:
+            atual = existentes[chave].pop(0)
+            if atual.quantidade != item['quantidade']:
+                porcoes[atual.prato_id] += item['quantidade'] - atual.quantidade
+                registrar_alteracao(atual, 'update', {'quantidade': atual.quantidade}, {'quantidade': item['quantidade']})
+                atual.quantidade = item['quantidade']
+                alterados.append(atual)
+        else:
+            novos.append(item)
+
+    removidos = [atual for restantes in existentes.values() for atual in restantes]
+    if removidos:
+        PedidoItem.objects.filter(id__in=[atual.id for atual in removidos]).delete()
+        for atual in removidos:
+            porcoes[atual.prato_id] -= atual.quantidade
+        registrar_lote('delete', removidos)
+    if alterados:
+        PedidoItem.objects.bulk_update(alterados, ['quantidade'])
+    if porcoes:
+        baixar_estoque(porcoes)
+    if novos:
+        criar_itens(pedido, novos, pratos, usuario)
+
+# ----------------------------
+# RESUMO DE STATUS (acompanhamento do cliente)
+# ----------------------------
+
+CAMPOS_RESUMO = ['id', 'codigo_acesso', 'comanda_pai_id', 'status', 'tempo_estimado', 'inicio_preparo']
+
+
+def _chave_resumo(codigo):
+    return f'status_resumo:{codigo}'
+
+
+def resumo_status(codigo):
+    """
+    Status da comanda (principal primeiro, depois as filhas) sem itens.
+
+    Vem do cache por código; no miss é uma única consulta em Pedido.
+    Devolve lista vazia se o código não existe (e não guarda o vazio).
+    """
+    cache = caches[settings.STATUS_RESUMO_CACHE]
+    resumo = cache.get(_chave_resumo(codigo))
+    if resumo is None:
+        resumo = list(
+            Pedido.objects.da_comanda(codigo)
+            .order_by(F('comanda_pai_id').asc(nulls_first=True), 'id')
+            .values(*CAMPOS_RESUMO)
+        )
+        if resumo:
+            cache.set(_chave_resumo(codigo), resumo, settings.STATUS_RESUMO_CACHE_TIMEOUT)
+    return resumo
+
+
+def invalidar_resumo_status(codigo):
+    if codigo:
+        caches[settings.STATUS_RESUMO_CACHE].delete(_chave_resumo(codigo))
@@ -0,0 +1,296 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from functools import partial
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from .models import Pedido, PedidoItem, PedidoStatus, ResumoVendas
+
+DIMENSOES = ['prato', 'categoria', 'mesa']
+GRANULARIDADES = ['hora', 'dia']
+
+# Campos de PedidoItem que identificam cada dimensão: (chave, rótulo)
+CAMPOS_DIMENSAO = {
+    'prato': ('prato_id', 'prato__nome'),
+    'categoria': ('prato__categoria_id', 'prato__categoria__nome'),
+    'mesa': ('pedido__mesa_id', 'pedido__mesa__numero'),
+}
+
+# ----------------------------
+# ACÚMULO
+# ----------------------------
+
+def _periodo(momento, granularidade):
+    # Períodos no fuso local, para "vendas de hoje" bater com o relógio do salão
+    local = timezone.localtime(momento)
+    if granularidade == 'dia':
+        return local.replace(hour=0, minute=0, second=0, microsecond=0)
+    return local.replace(minute=0, second=0, microsecond=0)
+
+
+def _novo_total():
+    return {'rotulo': '', 'receita': Decimal('0'), 'itens': 0, 'pedidos': set(), 'preparo_segundos': 0, 'preparo_pedidos': 0}
+
+
+def _linhas_dos_itens(pedido_ids):
+    campos = {'pedido_id', 'pedido__criado_em', 'quantidade', 'preco_unitario'}
+    for chave, rotulo in CAMPOS_DIMENSAO.values():
+        campos.update((chave, rotulo))
+    return PedidoItem.objects.filter(pedido_id__in=pedido_ids).values(*campos)
+
+
+def acumular_vendas(pedido_ids, totais):
+    """Soma receita, itens e pedidos dos pedidos pagos em `totais` (uma query)."""
+    for linha in _linhas_dos_itens(pedido_ids):
+        for granularidade in GRANULARIDADES:
+            inicio = _periodo(linha['pedido__criado_em'], granularidade)
+            for dimensao, (chave, rotulo) in CAMPOS_DIMENSAO.items():
+                total = totais[(dimensao, granularidade, inicio, linha[chave])]
+                total['rotulo'] = str(linha[rotulo])
+                total['receita'] += linha['quantidade'] * linha['preco_unitario']
+                total['itens'] += linha['quantidade']
+                total['pedidos'].add(linha['pedido_id'])
+
+
+def acumular_preparo(pedido_ids, totais):
+    """Soma o tempo de preparo de cada pedido em cada prato/categoria/mesa dele."""
+    duracoes = {
+        pedido_id: (pronto_em - inicio).total_seconds()
+        for pedido_id, inicio, pronto_em in Pedido.objects.filter(
+            pk__in=pedido_ids, inicio_preparo__isnull=False, pronto_em__isnull=False,
+        ).values_list('id', 'inicio_preparo', 'pronto_em')
+    }
+    if not duracoes:
+        return
+    vistos = set()
+    for linha in _linhas_dos_itens(duracoes.keys()):
+        for granularidade in GRANULARIDADES:
+            inicio = _periodo(linha['pedido__criado_em'], granularidade)
+            for dimensao, (chave, rotulo) in CAMPOS_DIMENSAO.items():
+                chave_total = (dimensao, granularidade, inicio, linha[chave])
+                # Um pedido conta uma vez por chave, não uma vez por item
+                if (chave_total, linha['pedido_id']) in vistos:
+                    continue
+                vistos.add((chave_total, linha['pedido_id']))
+                total = totais[chave_total]
+                total['rotulo'] = str(linha[rotulo])
+                total['preparo_segundos'] += round(max(0, duracoes[linha['pedido_id']]))
+                total['preparo_pedidos'] += 1
+
+# ----------------------------
+# ATUALIZAÇÃO INCREMENTAL
+# ----------------------------
+
+def registrar_transicao(pedido, anterior, novo):
+    """Chamado por Pedido.save/mudar_status quando o status muda."""
+    if novo == PedidoStatus.PAGO:
+        if _marcar(pedido, 'vendas_contabilizadas', True):
+            contabilizar([pedido.pk], vendas=True, preparo=False)
+    elif anterior == PedidoStatus.PAGO:
+        # Cancelado depois de pago, ou reaberto por PATCH: a venda sai dos agregados
+        if _marcar(pedido, 'vendas_contabilizadas', False):
+            descontar([pedido.pk])
+    if novo == PedidoStatus.PRONTO and _marcar(pedido, 'preparo_contabilizado', True):
+        contabilizar([pedido.pk], vendas=False, preparo=True)
+
+
+def _marcar(pedido, campo, valor):
+    """
+    Vira a marca `campo` do pedido para `valor`, se ela ainda não estiver assim.
+
+    UPDATE condicional: um pedido que volta a PRONTO, ou é fechado de novo,
+    já tem a marca e não entra duas vezes na soma, nem com duas requisições
+    ao mesmo tempo. Fica na transação do pedido: se ela voltar, a marca volta junto.
+    """
+    return Pedido.objects.filter(pk=pedido.pk).exclude(**{campo: valor}).update(**{campo: valor}) > 0
+
+
+def contabilizar(pedido_ids, vendas=True, preparo=False):
+    """
+    Agenda a soma dos pedidos nos agregados para depois do commit.
+
+    Fica fora da transação do pedido para os incrementos nas linhas mais
+    disputadas (a hora corrente) segurarem o lock só pelo tempo do UPDATE.
+    Quem chama já marcou os pedidos como contabilizados.
+    """
+    pedido_ids = list(pedido_ids)
+    if pedido_ids:
+        transaction.on_commit(partial(_contabilizar, pedido_ids, vendas, preparo))
+
+
+def descontar(pedido_ids):
+    """Agenda a subtração das vendas de pedidos que tinham sido somados."""
+    pedido_ids = list(pedido_ids)
+    if pedido_ids:
+        transaction.on_commit(partial(_contabilizar, pedido_ids, True, False, sinal=-1))
+
+
+def _contabilizar(pedido_ids, vendas, preparo, sinal=1):
+    totais = defaultdict(_novo_total)
+    if vendas:
+        acumular_vendas(pedido_ids, totais)
+    if preparo:
+        acumular_preparo(pedido_ids, totais)
+    _aplicar(totais, sinal)
+
+
+def _aplicar(totais, sinal=1):
+    # Em ordem fixa para dois fechamentos simultâneos não se travarem
+    with transaction.atomic():
+        for (dimensao, granularidade, inicio, chave_id), total in sorted(totais.items(), key=lambda t: t[0]):
+            filtro = {'dimensao': dimensao, 'granularidade': granularidade, 'inicio': inicio, 'chave_id': chave_id}
+            incrementos = {
+                'rotulo': total['rotulo'],
+                'receita': F('receita') + sinal * total['receita'],
+                'itens': F('itens') + sinal * total['itens'],
+                'pedidos': F('pedidos') + sinal * len(total['pedidos']),
+                'preparo_segundos': F('preparo_segundos') + sinal * total['preparo_segundos'],
+                'preparo_pedidos': F('preparo_pedidos') + sinal * total['preparo_pedidos'],
+            }
+            # Na subtração a linha já existe; se não existir (reconstruída
+            # no meio do caminho) não há o que descontar
+            if ResumoVendas.objects.filter(**filtro).update(**incrementos) or sinal < 0:
+                continue
+            try:
+                with transaction.atomic():
+                    ResumoVendas.objects.create(**filtro, **_valores(total))
+            except IntegrityError:
+                # Outro processo criou a linha entre o UPDATE e o INSERT
+                ResumoVendas.objects.filter(**filtro).update(**incrementos)
+
+
+def _valores(total):
+    return {
+        'rotulo': total['rotulo'],
+        'receita': total['receita'],
+        'itens': total['itens'],
+        'pedidos': len(total['pedidos']),
+        'preparo_segundos': total['preparo_segundos'],
+        'preparo_pedidos': total['preparo_pedidos'],
+    }
+
+# ----------------------------
+# RECONSTRUÇÃO (backfill)
+# ----------------------------
+
+def reconstruir(desde=None, lote=2000):
+    """
+    Refaz os agregados a partir do histórico (todos ou a partir de `desde`).
+
+    Apaga os períodos afetados e regrava tudo com bulk_create numa transação,
+    acertando junto as marcas de "já contabilizado" dos pedidos.
+    Devolve quantas linhas de agregado foram gravadas.
+    """
+    pedidos = Pedido.objects.all()
+    agregados = ResumoVendas.objects.all()
+    if desde:
+        inicio = timezone.make_aware(datetime.combine(desde, time.min))
+        pedidos = pedidos.filter(criado_em__gte=inicio)
+        agregados = agregados.filter(inicio__gte=inicio)
+
+    totais = defaultdict(_novo_total)
+    pagos = pedidos.filter(status=PedidoStatus.PAGO).values_list('id', flat=True)
+    prontos = pedidos.filter(inicio_preparo__isnull=False, pronto_em__isnull=False).values_list('id', flat=True)
+    for ids, acumular in ((pagos, acumular_vendas), (prontos, acumular_preparo)):
+        ids = list(ids.order_by('id'))
+        for i in range(0, len(ids), lote):
+            acumular(ids[i:i + lote], totais)
+
+    with transaction.atomic():
+        pedidos.update(
+            vendas_contabilizadas=Q(status=PedidoStatus.PAGO),
+            preparo_contabilizado=Q(inicio_preparo__isnull=False, pronto_em__isnull=False),
+        )
+        agregados.delete()
+        ResumoVendas.objects.bulk_create([
+            ResumoVendas(dimensao=dimensao, granularidade=granularidade, inicio=inicio, chave_id=chave_id, **_valores(total))
+            for (dimensao, granularidade, inicio, chave_id), total in totais.items()
+        ], batch_size=lote)
+    return len(totais)
+
+# ----------------------------
+# API DO GERENTE
+# ----------------------------
+
+def _filtro_periodo(request, granularidade):
+    hoje = timezone.localdate()
+    inicio = parse_date(request.GET.get('inicio', '')) or hoje - timedelta(days=30)
+    fim = parse_date(request.GET.get('fim', '')) or hoje
+    dimensao = request.GET.get('dimensao', 'prato')
+    if dimensao not in DIMENSOES or granularidade not in GRANULARIDADES:
+        return None
+    return ResumoVendas.objects.filter(
+        dimensao=dimensao,
+        granularidade=granularidade,
+        inicio__gte=timezone.make_aware(datetime.combine(inicio, time.min)),
+        inicio__lt=timezone.make_aware(datetime.combine(fim + timedelta(days=1), time.min)),
+    )
+
+
+def _preparo_medio(segundos, pedidos):
+    return round(segundos / pedidos) if pedidos else None
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def relatorio_vendas(request):
+    """Série por período: ?dimensao=prato|categoria|mesa&granularidade=hora|dia&inicio=&fim=&chave="""
+    agregados = _filtro_periodo(request, request.GET.get('granularidade', 'dia'))
+    if agregados is None:
+        return Response({'erro': 'Dimensão ou granularidade inválida.'}, status=400)
+    if request.GET.get('chave'):
+        try:
+            chave = int(request.GET['chave'])
+        except ValueError:
+            return Response({'erro': 'Chave inválida.'}, status=400)
+        agregados = agregados.filter(chave_id=chave)
+
+    return Response([
+        {
+            'chave_id': linha.chave_id,
+            'rotulo': linha.rotulo,
+            'inicio': linha.inicio,
+            'receita': linha.receita,
+            'itens': linha.itens,
+            'pedidos': linha.pedidos,
+            'preparo_medio_segundos': _preparo_medio(linha.preparo_segundos, linha.preparo_pedidos),
+        }
+        for linha in agregados.order_by('inicio', 'chave_id')
+    ])
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def relatorio_ranking(request):
+    """Totais do período por chave, da maior receita para a menor."""
+    agregados = _filtro_periodo(request, 'dia')
+    if agregados is None:
+        return Response({'erro': 'Dimensão inválida.'}, status=400)
+
+    linhas = agregados.values('chave_id').annotate(
+        total_receita=Sum('receita'),
+        total_itens=Sum('itens'),
+        total_pedidos=Sum('pedidos'),
+        total_preparo=Sum('preparo_segundos'),
+        total_preparados=Sum('preparo_pedidos'),
+    ).order_by('-total_receita', 'chave_id')
+    rotulos = dict(agregados.order_by('inicio').values_list('chave_id', 'rotulo'))
+
+    return Response([
+        {
+            'chave_id': linha['chave_id'],
+            'rotulo': rotulos.get(linha['chave_id'], ''),
+            'receita': linha['total_receita'],
+            'itens': linha['total_itens'],
+            'pedidos': linha['total_pedidos'],
+            'preparo_medio_segundos': _preparo_medio(linha['total_preparo'], linha['total_preparados']),
+        }
+        for linha in linhas
+    ])
@@ -0,0 +1,185 @@
+import gzip
+import hashlib
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db.models import Count, Max, Subquery
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+
+from .cardapio import versao_atual
+from .models import EventoPedido, Mesa, Pedido
+
+try:
+    import brotli
+except ImportError:  # está no requirements.txt; sem ele (dev) só gzip
+    brotli = None
+
+# ----------------------------
+# VALIDADORES (ETag sem serializar)
+# ----------------------------
+
+# Cada listagem de polling tem um validador barato: os máximos de
+# atualizado_em (índices) e o último evento de pedido, que também cobre
+# pedidos apagados. Se nada mudou, a resposta é 304 antes da view rodar.
+
+def _ultimo(queryset, campo):
+    # Max() em volta só para caber no aggregate(); a subquery não depende da linha
+    return Max(Subquery(queryset.order_by(f'-{campo}').values(campo)[:1]))
+
+
+def validador_mesas(request):
+    return Mesa.objects.aggregate(
+        mesas=Max('atualizado_em'),
+        total=Count('id'),
+        pedidos=_ultimo(Pedido.objects.all(), 'atualizado_em'),
+        evento=_ultimo(EventoPedido.objects.all(), 'id'),
+    )
+
+
+def validador_cozinha(request):
+    return Pedido.objects.aggregate(
+        pedidos=Max('atualizado_em'),
+        evento=_ultimo(EventoPedido.objects.all(), 'id'),
+    )
+
+
+def validador_pratos(request):
+    # As URLs das imagens são absolutas, então o host entra junto
+    return {'cardapio': versao_atual(), 'host': request.get_host()}
+
+
+# Nome da rota (urls.py / router) -> validador. Só GET/HEAD.
+VALIDADORES = {
+    'mesa-list': validador_mesas,
+    'prato-list': validador_pratos,
+    'pedido-cozinha': validador_cozinha,
+}
+
+
+def calcular_etag(request, validador):
+    partes = validador(request)
+    texto = '|'.join([request.path, request.META.get('QUERY_STRING', '')] + [f'{k}={v}' for k, v in sorted(partes.items())])
+    # Fraco: o mesmo conteúdo sai com ou sem compressão
+    return f'W/"{hashlib.md5(texto.encode()).hexdigest()}"'
+
+# ----------------------------
+# COMPRESSÃO
+# ----------------------------
+
+def _codificacao(request):
+    aceitas = {parte.split(';')[0].strip() for parte in request.META.get('HTTP_ACCEPT_ENCODING', '').split(',')}
+    if brotli is not None and 'br' in aceitas:
+        return 'br'
+    if 'gzip' in aceitas:
+        return 'gzip'
+    return None
+
+
+def _comprimir(conteudo, codificacao):
+    if codificacao == 'br':
+        return brotli.compress(conteudo, quality=settings.COMPRESSAO_BROTLI_QUALIDADE)
+    # mtime fixo: o mesmo JSON dá sempre os mesmos bytes
+    return gzip.compress(conteudo, compresslevel=settings.COMPRESSAO_GZIP_NIVEL, mtime=0)
+
+
+def _da_api(request, response):
+    return request.path_info.startswith('/api/') and not response.streaming
+
+
+def deve_comprimir(request, response):
+    return (
+        _da_api(request, response)
+        and response.status_code == 200
+        and not response.has_header('Content-Encoding')
+        and response.get('Content-Type', '').startswith('application/json')
+        and len(response.content) >= settings.COMPRESSAO_MINIMO
+    )
+
+# ----------------------------
+# MIDDLEWARE
+# ----------------------------
+
+class RespostasApiMiddleware:
+    """
+    GET condicional e compressão das respostas JSON da API.
+
+    Nas rotas de VALIDADORES o ETag é calculado antes da view: com
+    If-None-Match igual, volta 304 sem consultar as listas nem serializar.
+    Respostas JSON a partir de COMPRESSAO_MINIMO bytes saem em brotli (se
+    instalado e aceito) ou gzip.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            # Só as rotas com validador vão para thread (consulta do ETag)
+            self.process_view = self._process_view_async
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self._finalizar(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self._finalizar(request, await self.get_response(request))
+
+    def _finalizar(self, request, response):
+        etag = getattr(request, '_etag_api', None)
+        if etag and response.status_code == 200 and not response.has_header('ETag'):
+            response['ETag'] = etag
+            response.setdefault('Cache-Control', 'no-cache')
+
+        # Em toda resposta da API (as pequenas e os 304 também): um cache no
+        # caminho não pode entregar a versão comprimida a quem não a aceita.
+        # O SSE de eventos manda pedaço a pedaço e fica de fora
+        if _da_api(request, response):
+            patch_vary_headers(response, ('Accept-Encoding',))
+
+        if deve_comprimir(request, response):
+            codificacao = _codificacao(request)
+            if codificacao:
+                comprimido = _comprimir(response.content, codificacao)
+                if len(comprimido) < len(response.content):
+                    response.content = comprimido
+                    response['Content-Length'] = str(len(comprimido))
+                    response['Content-Encoding'] = codificacao
+                    # ETag forte da view (cardápio) vale para os bytes sem
+                    # compressão; comprimido vira fraco, como no GZipMiddleware
+                    if response.get('ETag', '').startswith('"'):
+                        response['ETag'] = f'W/{response["ETag"]}'
+        return response
+
+    def _validador(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        return VALIDADORES.get(getattr(request.resolver_match, 'url_name', None))
+
+    def _nao_modificado(self, request, etag):
+        request._etag_api = etag
+        enviados = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+        # Comparação fraca: ignora o W/ dos dois lados
+        if etag.removeprefix('W/') in {e.removeprefix('W/') for e in enviados} or '*' in enviados:
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            response['Cache-Control'] = 'no-cache'
+            return response
+        return None
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        validador = self._validador(request)
+        if validador is None:
+            return None
+        return self._nao_modificado(request, calcular_etag(request, validador))
+
+    async def _process_view_async(self, request, view_func, view_args, view_kwargs):
+        validador = self._validador(request)
+        if validador is None:
+            return None
+        return self._nao_modificado(request, await sync_to_async(calcular_etag)(request, validador))
@@ -1,7 +1,14 @@
 from rest_framework import serializers
 from django.db import transaction
 from django.contrib.auth.password_validation import validate_password
-from .models import Usuario, Mesa, Categoria, Prato, Pedido, PedidoItem, Pagamento, gerar_codigo_acesso_unico
+from .models import (
+    Usuario, Mesa, Categoria, Prato, Pedido, PedidoItem, Pagamento,
+    STATUS_ATIVOS, soma_itens
+)
+from .imagens import ImagemInvalida, normalizar_imagem, url_imagem
+from .estimativa import estimar_tempo
+from .estoque import EstoqueInsuficiente, indisponiveis, porcoes_dos_itens
+from .pedidos import carregar_pratos, criar_itens, porcoes_pedidas, sincronizar_itens
 
 # ----------------------------
 # SERIALIZERS BÁSICOS
@@ -95,17 +102,19 @@ class PedidoReadSerializer(serializers.ModelSerializer):
         read_only_fields = ['codigo_acesso']
 
     def get_itens(self, obj):
+        # Usa o prefetch de Pedido.objects.com_relacionados() quando houver
         itens_queryset = obj.itens.all()
         return PedidoItemSerializer(itens_queryset, many=True).data
 
     def get_mesa_numero(self, obj):
-        return obj.mesa.numero if obj.mesa else None
+        return obj.mesa.numero if obj.mesa_id else None
 
     def get_comanda_pai_id(self, obj):
-        return obj.comanda_pai.id if obj.comanda_pai else None
+        # Lê a coluna da FK direto, sem carregar a comanda pai
+        return obj.comanda_pai_id
 
     def get_eh_principal(self, obj):
-        return obj.comanda_pai is None
+        return obj.comanda_pai_id is None
 
 # ----------------------------
 # MESA (Atualizado para o Garçom)
@@ -120,18 +129,25 @@ class MesaSerializer(serializers.ModelSerializer):
         # ADICIONADO: 'solicitou_atencao'
         fields = ['id', 'numero', 'status', 'capacidade', 'valor_total_mesa', 'pedidos', 'solicitou_atencao']
 
+    def _pedidos_ativos(self, obj):
+        # Vem pronto de Mesa.objects.com_pedidos_ativos(); senão consulta
+        pedidos = getattr(obj, 'pedidos_ativos', None)
+        if pedidos is None:
+            pedidos = Pedido.objects.filter(mesa=obj).ativos().com_relacionados()
+        return pedidos
+
     def get_pedidos(self, obj):
         # Retorna lista de pedidos ativos desta mesa (exclui pagos/cancelados)
-        pedidos = Pedido.objects.filter(mesa=obj).exclude(status__in=['pago', 'cancelado'])
-        return PedidoReadSerializer(pedidos, many=True).data
+        return PedidoReadSerializer(self._pedidos_ativos(obj), many=True).data
 
     def get_valor_total_mesa(self, obj):
         # Soma todos os itens de todos os pedidos ativos da mesa
-        pedidos = Pedido.objects.filter(mesa=obj).exclude(status__in=['pago', 'cancelado'])
-        total = 0
-        for pedido in pedidos:
-            itens = pedido.itens.all()
-            total += sum(item.quantidade * item.preco_unitario for item in itens)
+        # (anotado por Mesa.objects.com_valor_total(); senão agrega só esta mesa)
+        total = getattr(obj, 'valor_total', None)
+        if total is None:
+            total = PedidoItem.objects.filter(
+                pedido__mesa=obj, pedido__status__in=STATUS_ATIVOS
+            ).aggregate(total=soma_itens())['total'] or 0
         return total
 
 # ----------------------------
@@ -148,14 +164,21 @@ class CategoriaGerenteSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Categoria
-        fields = ['id', 'nome', 'icone', 'ativo', 'criado_por', 'criado_em', 'atualizado_em']
+        fields = ['id', 'nome', 'icone', 'ativo', 'estacao', 'criado_por', 'criado_em', 'atualizado_em']
         read_only_fields = ['criado_por', 'criado_em', 'atualizado_em']
 
     def create(self, validated_data):
         validated_data['criado_por'] = self.context['request'].user
         return super().create(validated_data)
 
-class PratoGerenteSerializer(serializers.ModelSerializer):
+class ImagemUrlMixin:
+    # `imagem` guarda só o caminho; a resposta leva a URL absoluta
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data['imagem'] = url_imagem(self.context.get('request'), data.get('imagem'))
+        return data
+
+class PratoGerenteSerializer(ImagemUrlMixin, serializers.ModelSerializer):
     categoria_nome = serializers.CharField(source='categoria.nome', read_only=True)
     criado_por = serializers.ReadOnlyField(source='criado_por.username')
     
@@ -164,23 +187,43 @@ class PratoGerenteSerializer(serializers.ModelSerializer):
         fields = ['id', 'nome', 'descricao', 'preco', 'imagem', 'categoria', 'categoria_nome', 'ativo', 'criado_por', 'criado_em', 'atualizado_em']
         read_only_fields = ['criado_por', 'criado_em', 'atualizado_em']
 
+    def validate_imagem(self, value):
+        # Data URL enviado pelo painel vira arquivo; no banco fica só o caminho
+        try:
+            return normalizar_imagem(value)
+        except ImagemInvalida as e:
+            raise serializers.ValidationError(str(e))
+
     def create(self, validated_data):
         validated_data['criado_por'] = self.context['request'].user
         return super().create(validated_data)
 
-class PratoSerializer(serializers.ModelSerializer):
+class PratoSerializer(ImagemUrlMixin, serializers.ModelSerializer):
     categoria = CategoriaSerializer()
+    imagem_miniatura = serializers.SerializerMethodField()
 
     class Meta:
         model = Prato
-        fields = ['id', 'nome', 'descricao', 'preco', 'categoria', 'imagem']
+        fields = ['id', 'nome', 'descricao', 'preco', 'categoria', 'imagem', 'imagem_miniatura']
+
+    def get_imagem_miniatura(self, obj):
+        if not obj.imagem or obj.imagem.startswith('data:'):
+            return None
+        return url_imagem(self.context.get('request'), obj.imagem, variante='miniatura')
 
 
 # ----------------------------
 # PEDIDO (Escrita/Criação)
 # ----------------------------
 
+class PratoIdField(serializers.IntegerField):
+    # Só o id: os pratos do pedido inteiro são buscados juntos em PedidoWriteSerializer.validate
+    def to_representation(self, value):
+        return value.pk
+
 class PedidoItemWriteSerializer(serializers.ModelSerializer):
+    prato = PratoIdField()
+
     class Meta:
         model = PedidoItem
         fields = ['prato', 'quantidade', 'observacao']
@@ -211,7 +254,7 @@ class PedidoWriteSerializer(serializers.ModelSerializer):
         else:
             pedido_id = getattr(self.instance, "id", None)
             if codigo:
-                if Pedido.objects.filter(codigo_acesso=codigo, comanda_pai__isnull=True).exclude(id=pedido_id).exists():
+                if Pedido.objects.ativos().filter(codigo_acesso=codigo, comanda_pai__isnull=True).exclude(id=pedido_id).exists():
                     raise serializers.ValidationError("Já existe uma comanda principal com esse código.")
 
         itens = data.get('itens', [])
@@ -221,6 +264,17 @@ class PedidoWriteSerializer(serializers.ModelSerializer):
             if not isinstance(item['quantidade'], int) or item['quantidade'] <= 0:
                 raise serializers.ValidationError("Quantidade deve ser um número inteiro maior que zero.")
 
+        try:
+            self._pratos = carregar_pratos(item['prato'] for item in itens)
+        except Prato.DoesNotExist as e:
+            raise serializers.ValidationError(str(e))
+
+        # O que este pedido já descontou do estoque volta a contar na edição
+        reservadas = porcoes_dos_itens(self.instance.itens.all()) if self.instance and itens else None
+        esgotados = indisponiveis(self._pratos, porcoes_pedidas(itens), reservadas)
+        if esgotados:
+            raise serializers.ValidationError(f"Sem estoque para: {', '.join(esgotados)}.")
+
         return data
 
     def create(self, validated_data):
@@ -229,24 +283,17 @@ class PedidoWriteSerializer(serializers.ModelSerializer):
         usuario = request_user if request_user and request_user.is_authenticated else None
         validated_data['criado_por'] = usuario
 
-        if not validated_data.get('codigo_acesso'):
-            if validated_data.get('comanda_pai'):
-                validated_data['codigo_acesso'] = validated_data['comanda_pai'].codigo_acesso
-            else:
-                validated_data['codigo_acesso'] = gerar_codigo_acesso_unico()
-
-        with transaction.atomic():
-            pedido = Pedido.objects.create(**validated_data)
-
-            for item in itens_data:
-                PedidoItem.objects.create(
-                    pedido=pedido,
-                    prato=item['prato'],
-                    usuario=usuario,
-                    quantidade=item['quantidade'],
-                    observacao=item.get('observacao', ''),
-                    preco_unitario=item['prato'].preco
-                )
+        # Pedido.save() herda o código do pai ou sorteia um novo
+        validated_data.pop('codigo_acesso', None)
+        if validated_data.get('tempo_estimado') is None and itens_data:
+            validated_data['tempo_estimado'] = estimar_tempo(self._pratos)
+
+        try:
+            with transaction.atomic():
+                pedido = Pedido.objects.create(**validated_data)
+                criar_itens(pedido, itens_data, self._pratos, usuario)
+        except EstoqueInsuficiente as erro:
+            raise serializers.ValidationError(str(erro))
 
         return pedido
 
@@ -255,21 +302,16 @@ class PedidoWriteSerializer(serializers.ModelSerializer):
         usuario = self.context.get('request').user if self.context.get('request') else None
         usuario = usuario if usuario and usuario.is_authenticated else None
 
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
-
-        if itens_data is not None:
-            instance.itens.all().delete()
-            for item in itens_data:
-                PedidoItem.objects.create(
-                    pedido=instance,
-                    prato=item['prato'],
-                    usuario=usuario,
-                    quantidade=item['quantidade'],
-                    observacao=item.get('observacao', ''),
-                    preco_unitario=item['prato'].preco
-                )
+        try:
+            with transaction.atomic():
+                for attr, value in validated_data.items():
+                    setattr(instance, attr, value)
+                instance.save()
+
+                if itens_data is not None:
+                    sincronizar_itens(instance, itens_data, self._pratos, usuario)
+        except EstoqueInsuficiente as erro:
+            raise serializers.ValidationError(str(erro))
 
         return instance
 
@@ -0,0 +1,45 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .auditoria import conectar_sinais
+from .autenticacao import tokens
+from .cardapio import invalidar_cardapio
+from .estoque import atualizar_disponibilidade
+from .models import Categoria, Ingrediente, Prato, PratoIngrediente, Usuario
+
+
+@receiver([post_save, post_delete], sender=Prato)
+@receiver([post_save, post_delete], sender=PratoIngrediente)
+@receiver([post_save, post_delete], sender=Categoria)
+def cardapio_alterado(sender, **kwargs):
+    # Ficha técnica também versiona o cardápio: o mapa de receitas em memória
+    # (estoque.py) é recarregado pela versão
+    invalidar_cardapio()
+
+
+@receiver([post_save, post_delete], sender=PratoIngrediente)
+def ficha_tecnica_alterada(sender, instance, **kwargs):
+    atualizar_disponibilidade(prato_ids=[instance.prato_id])
+
+
+@receiver(post_save, sender=Ingrediente)
+def estoque_alterado(sender, instance, **kwargs):
+    # Entrada de mercadoria / ajuste manual; as baixas de pedido usam
+    # UPDATE direto e atualizam o índice por conta própria
+    atualizar_disponibilidade(ingrediente_ids=[instance.pk])
+
+
+@receiver(post_delete, sender=Token)
+def token_apagado(sender, instance, **kwargs):
+    # Logout apaga o token
+    tokens.invalidar_token(instance.key)
+
+
+@receiver(post_save, sender=Usuario)
+def usuario_alterado(sender, instance, **kwargs):
+    # Troca de senha, desativação, mudança de papel: o próximo request relê do banco
+    tokens.invalidar_usuario(instance.pk)
+
+
+conectar_sinais()
@@ -1,3 +1,1203 @@
-from django.test import TestCase
+import base64
+import io
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from urllib.parse import urlencode
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.exceptions import ValidationError
+from django.db import connection, connections, transaction
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from . import auditoria, benchmarks, estacoes, estimativa, estoque, urls
+from .eventos import publicar_evento_pedido
+from .imagens import salvar_imagem
+from .autenticacao import tokens
+from .leitura import linhas_pedidos, mesas_em_dicts, pedidos_em_dicts, renderizar
+from .serializers import MesaSerializer, PedidoReadSerializer
+from .relatorios import reconstruir
+from .models import ImagemPrato, Ingrediente, LogAlteracao, PratoIngrediente, RespostaIdempotente, ResumoVendas, Usuario, Mesa, Categoria, Prato, Pedido, PedidoItem, PedidoStatus, Pagamento, EventoPedido
+
+
+# Auditoria gravada na hora (sem a thread) para caber na transação de cada teste
+@override_settings(AUDITORIA_ASSINCRONA=False)
+class FoodflowTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.gerente = Usuario.objects.create_user(username='gerente', password='senha-forte-123', role='gerente')
+        cls.categoria = Categoria.objects.create(nome='Lanches', criado_por=cls.gerente)
+        cls.prato = Prato.objects.create(nome='X-Burger', preco='25.00', categoria=cls.categoria, criado_por=cls.gerente)
+
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+        # A versão do cardápio volta junto com o rollback de cada teste;
+        # força o mapa de receitas em memória a recarregar
+        estoque._fichas['versao'] = None
+        estimativa.estimador = estimativa.EstimadorPreparo()
+        estacoes.escalonador = estacoes.Escalonador()
+        tokens.limpar()
+
+    def criar_mesa_com_pedidos(self, numero, pedidos=1, itens=1):
+        mesa = Mesa.objects.create(numero=numero, capacidade=4, status='ocupada')
+        for _ in range(pedidos):
+            pedido = Pedido.objects.create(mesa=mesa, criado_por=self.gerente)
+            for _ in range(itens):
+                PedidoItem.objects.create(
+                    pedido=pedido, prato=self.prato, usuario=self.gerente,
+                    quantidade=2, preco_unitario=self.prato.preco,
+                )
+        # Pedido encerrado não entra na conta nem na listagem
+        pago = Pedido.objects.create(mesa=mesa, status=PedidoStatus.PAGO)
+        PedidoItem.objects.create(pedido=pago, prato=self.prato, quantidade=1, preco_unitario=self.prato.preco)
+        return mesa
+
+    def contar_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+
+class QueryCountTests(FoodflowTestCase):
+    def test_listagem_de_mesas_tem_queries_constantes(self):
+        self.criar_mesa_com_pedidos(1)
+        poucas, _ = self.contar_queries('/api/mesas/')
+
+        for numero in range(2, 8):
+            self.criar_mesa_com_pedidos(numero, pedidos=3, itens=4)
+        muitas, response = self.contar_queries('/api/mesas/')
+
+        self.assertEqual(poucas, muitas)
+        mesa = response.json()[-1]
+        self.assertEqual(len(mesa['pedidos']), 3)
+        self.assertEqual(len(mesa['pedidos'][0]['itens']), 4)
+        self.assertEqual(mesa['valor_total_mesa'], 600.0)
+
+    def test_cozinha_tem_queries_constantes(self):
+        self.criar_mesa_com_pedidos(1)
+        poucas, _ = self.contar_queries('/api/pedidos/cozinha/')
+
+        for numero in range(2, 6):
+            self.criar_mesa_com_pedidos(numero, pedidos=2, itens=3)
+        muitas, _ = self.contar_queries('/api/pedidos/cozinha/')
+
+        self.assertEqual(poucas, muitas)
+
+    def test_pedido_por_codigo_tem_queries_constantes(self):
+        mesa = self.criar_mesa_com_pedidos(1, itens=1)
+        pai = Pedido.objects.filter(mesa=mesa).ativos().get()
+        poucas, _ = self.contar_queries(f'/api/pedido-por-codigo/{pai.codigo_acesso}/')
+
+        for _ in range(3):
+            filha = Pedido.objects.create(mesa=mesa, comanda_pai=pai)
+            PedidoItem.objects.create(pedido=filha, prato=self.prato, quantidade=1, preco_unitario=self.prato.preco)
+        muitas, response = self.contar_queries(f'/api/pedido-por-codigo/{pai.codigo_acesso}/')
+
+        self.assertEqual(poucas, muitas)
+        self.assertEqual(len(response.json()), 4)
+
+
+class ValorTotalMesaTests(FoodflowTestCase):
+    def test_total_anotado_ignora_pedidos_encerrados(self):
+        self.criar_mesa_com_pedidos(1, pedidos=2, itens=3)
+        Mesa.objects.create(numero=2, capacidade=2, status='disponivel')
+
+        mesas = {m.numero: m for m in Mesa.objects.com_valor_total()}
+
+        self.assertEqual(mesas[1].valor_total, 300)
+        self.assertEqual(mesas[2].valor_total, 0)
+
+
+class CardapioTests(FoodflowTestCase):
+    def test_etag_responde_304_ate_o_cardapio_mudar(self):
+        response = self.client.get('/api/cardapio/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p['nome'] for p in response.json()['pratos']], ['X-Burger'])
+        etag = response['ETag']
+
+        self.assertEqual(self.client.get('/api/cardapio/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        for enviado in (f'W/{etag}', f'"outro", {etag}', '*'):
+            self.assertEqual(self.client.get('/api/cardapio/', HTTP_IF_NONE_MATCH=enviado).status_code, 304, enviado)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.prato.nome = 'X-Salada'
+            self.prato.save()
+
+        response = self.client.get('/api/cardapio/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual([p['nome'] for p in response.json()['pratos']], ['X-Salada'])
+
+
+class ImagensTests(FoodflowTestCase):
+    def data_url(self, largura=1000, altura=500, formato='PNG'):
+        from PIL import Image
+
+        saida = io.BytesIO()
+        Image.new('RGB', (largura, altura), 'red').save(saida, format=formato)
+        return f'data:image/{formato.lower()};base64,' + base64.b64encode(saida.getvalue()).decode()
+
+    def criar_prato(self, imagem):
+        self.client.force_authenticate(self.gerente)
+        return self.client.post('/api/gerente/pratos/', {
+            'nome': 'Pizza', 'preco': '50.00', 'categoria': self.categoria.id, 'imagem': imagem,
+        }, format='json')
+
+    def test_data_url_vira_variantes_webp(self):
+        response = self.criar_prato(self.data_url())
+        self.assertEqual(response.status_code, 201)
+        caminho = Prato.objects.get(nome='Pizza').imagem
+        self.assertRegex(caminho, r'^/api/imagens/[0-9a-f]{64}/media/$')
+        self.assertTrue(response.json()['imagem'].endswith(caminho))
+
+        from PIL import Image
+
+        tamanhos = {}
+        for imagem in ImagemPrato.objects.exclude(variante='original'):
+            self.assertEqual(imagem.content_type, 'image/webp')
+            tamanhos[imagem.variante] = Image.open(io.BytesIO(bytes(imagem.conteudo))).size
+        self.assertEqual(tamanhos, {'media': (800, 400), 'miniatura': (320, 160)})
+
+    def test_data_url_invalido_e_400(self):
+        for imagem in ('data:text/plain;base64,b2k=', 'data:image/png;base64,@@@', 'data:image/png;base64,b2k='):
+            response = self.criar_prato(imagem)
+            self.assertEqual(response.status_code, 400, imagem)
+            self.assertIn('imagem', response.json())
+        self.assertFalse(Prato.objects.filter(nome='Pizza').exists())
+
+    def test_entrega_com_cache_imutavel(self):
+        caminho = salvar_imagem(self.data_url())
+        response = self.client.get(caminho)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(self.client.get(caminho, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        hash_conteudo = caminho.split('/')[3]
+        # Variante desconhecida cai no original; hash desconhecido não existe
+        self.assertEqual(self.client.get(f'/api/imagens/{hash_conteudo}/gigante/')['Content-Type'], 'image/png')
+        self.assertEqual(self.client.get(f'/api/imagens/{"0" * 64}/media/').status_code, 404)
+
+    def test_comando_converte_pratos_com_base64(self):
+        convertido = Prato.objects.create(nome='Pizza', preco='50.00', categoria=self.categoria, criado_por=self.gerente, imagem=self.data_url())
+        quebrado = Prato.objects.create(nome='Suco', preco='8.00', categoria=self.categoria, criado_por=self.gerente, imagem='data:image/png;base64,@@@')
+
+        saida, erros = io.StringIO(), io.StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('converter_imagens_pratos', stdout=saida, stderr=erros)
+
+        convertido.refresh_from_db()
+        quebrado.refresh_from_db()
+        self.assertRegex(convertido.imagem, r'^/api/imagens/[0-9a-f]{64}/media/$')
+        self.assertTrue(quebrado.imagem.startswith('data:'))
+        self.assertIn('1 convertido(s), 1 falha(s)', saida.getvalue())
+        self.assertIn(f'Prato #{quebrado.id}', erros.getvalue())
+        self.assertEqual(self.client.get(convertido.imagem).status_code, 200)
+
+
+class CodigoAcessoTests(FoodflowTestCase):
+    @mock.patch('foodflow_app.models.gerar_codigo_acesso', side_effect=['AAAAAA', 'AAAAAA', 'BBBBBB'])
+    def test_sorteia_de_novo_quando_colide_com_comanda_ativa(self, _gerar):
+        mesa = Mesa.objects.create(numero=1, capacidade=4, status='ocupada')
+        primeiro = Pedido.objects.create(mesa=mesa)
+        segundo = Pedido.objects.create(mesa=mesa)
+
+        self.assertEqual(primeiro.codigo_acesso, 'AAAAAA')
+        self.assertEqual(segundo.codigo_acesso, 'BBBBBB')
+
+    @mock.patch('foodflow_app.models.gerar_codigo_acesso', return_value='AAAAAA')
+    def test_codigo_de_comanda_encerrada_pode_ser_reaproveitado(self, _gerar):
+        mesa = Mesa.objects.create(numero=1, capacidade=4, status='ocupada')
+        antigo = Pedido.objects.create(mesa=mesa)
+        antigo.status = PedidoStatus.PAGO
+        antigo.save()
+        novo = Pedido.objects.create(mesa=mesa)
+        filha = Pedido.objects.create(mesa=mesa, comanda_pai=novo)
+
+        self.assertEqual(novo.codigo_acesso, 'AAAAAA')
+        self.assertEqual(set(Pedido.objects.da_comanda('AAAAAA')), {novo, filha})
+
+
+class TransicaoStatusTests(FoodflowTestCase):
+    def setUp(self):
+        super().setUp()
+        mesa = self.criar_mesa_com_pedidos(1)
+        self.pedido = Pedido.objects.filter(mesa=mesa).ativos().get()
+
+    def test_mudar_status_faz_um_unico_update(self):
+        with self.assertNumQueries(1):
+            self.pedido.mudar_status(PedidoStatus.EM_PREPARO)
+
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.status, PedidoStatus.EM_PREPARO)
+        self.assertIsNotNone(self.pedido.inicio_preparo)
+
+    def test_save_de_atualizacao_nao_rele_o_pedido(self):
+        codigo = self.pedido.codigo_acesso
+        self.pedido.codigo_acesso = 'XXXXXX'
+        self.pedido.status = PedidoStatus.PRONTO
+
+        # O UPDATE do pedido e o da marca de preparo contabilizado (relatorios.py), sem SELECT
+        with CaptureQueriesContext(connection) as ctx:
+            self.pedido.save()
+        self.assertEqual([q['sql'].split()[0] for q in ctx.captured_queries], ['UPDATE', 'UPDATE'])
+
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.codigo_acesso, codigo)
+        self.assertEqual(self.pedido.status, PedidoStatus.PRONTO)
+
+    def test_filha_nao_pode_ser_pai(self):
+        filha = Pedido.objects.create(mesa=self.pedido.mesa, comanda_pai=self.pedido)
+        neta = Pedido(mesa=self.pedido.mesa, comanda_pai=filha)
+
+        with self.assertRaises(ValidationError):
+            neta.save()
+
+
+class EscritaItensTests(FoodflowTestCase):
+    def setUp(self):
+        super().setUp()
+        self.outro_prato = Prato.objects.create(nome='Suco', preco='8.00', categoria=self.categoria, criado_por=self.gerente)
+
+    def iniciar(self, numero, itens):
+        Mesa.objects.create(numero=numero, capacidade=4, status='disponivel')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/iniciar-comanda/', {'mesa': numero, 'itens': itens}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return len(ctx.captured_queries), response.json()
+
+    def test_iniciar_comanda_tem_queries_constantes(self):
+        estoque.receitas()  # o primeiro pedido carregaria o mapa de receitas
+        estimativa.estimar_tempo([])  # e o histórico de preparo
+        poucas, _ = self.iniciar(1, [{'prato': self.prato.id, 'quantidade': 1}])
+        itens = [{'prato': p.id, 'quantidade': 2, 'observacao': str(i)} for i in range(4) for p in (self.prato, self.outro_prato)]
+        muitas, pedido = self.iniciar(2, itens)
+
+        self.assertEqual(poucas, muitas)
+        self.assertEqual(len(pedido['itens']), 8)
+
+    def test_iniciar_comanda_com_prato_inexistente(self):
+        Mesa.objects.create(numero=1, capacidade=4, status='disponivel')
+        response = self.client.post('/api/iniciar-comanda/', {'mesa': 1, 'itens': [{'prato': 999, 'quantidade': 1}]}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Pedido.objects.exists())
+
+    def test_atualizacao_so_mexe_nos_itens_que_mudaram(self):
+        _, pedido = self.iniciar(1, [
+            {'prato': self.prato.id, 'quantidade': 1},
+            {'prato': self.outro_prato.id, 'quantidade': 1},
+        ])
+        mantido = next(i for i in pedido['itens'] if i['prato'] == self.prato.id)
+
+        response = self.client.patch(f"/api/pedidos/{pedido['id']}/", {'itens': [
+            {'prato': self.prato.id, 'quantidade': 3},
+            {'prato': self.outro_prato.id, 'quantidade': 1, 'observacao': 'sem gelo'},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        itens = {(i.prato_id, i.observacao): i for i in PedidoItem.objects.filter(pedido_id=pedido['id'])}
+        self.assertEqual(len(itens), 2)
+        self.assertEqual(itens[(self.prato.id, '')].id, mantido['id'])
+        self.assertEqual(itens[(self.prato.id, '')].quantidade, 3)
+        self.assertIn((self.outro_prato.id, 'sem gelo'), itens)
+
+
+class CozinhaSincronizacaoTests(FoodflowTestCase):
+    def test_lista_paginada_so_com_pedidos_ativos(self):
+        for numero in range(1, 4):
+            self.criar_mesa_com_pedidos(numero, pedidos=2)
+
+        response = self.client.get('/api/pedidos/cozinha/', {'page_size': 4})
+        primeira = response.json()
+        segunda = self.client.get(primeira['next']).json()
+
+        self.assertEqual(len(primeira['results']), 4)
+        self.assertEqual(len(segunda['results']), 2)
+        self.assertIsNone(segunda['next'])
+        self.assertIn('sincronizado_em', primeira)
+        self.assertTrue(all(p['status'] != PedidoStatus.PAGO for p in primeira['results'] + segunda['results']))
+
+    def test_updated_since_traz_so_o_que_mudou(self):
+        mesa = self.criar_mesa_com_pedidos(1, pedidos=3)
+        uma_hora = (timezone.now() - timedelta(hours=1)).isoformat()
+        inicial = self.client.get('/api/pedidos/cozinha/', {'updated_since': uma_hora}).json()
+        self.assertEqual(len(inicial['resultados']), 4)
+
+        desde = timezone.now()
+        alterado = Pedido.objects.filter(mesa=mesa).ativos().first()
+        alterado.mudar_status(PedidoStatus.PRONTO)
+        removido = Pedido.objects.filter(mesa=mesa).ativos().last()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/pedidos/{removido.id}/')
+
+        delta = self.client.get('/api/pedidos/cozinha/', {'updated_since': desde.isoformat()}).json()
+
+        self.assertEqual([p['id'] for p in delta['resultados']], [alterado.id])
+        self.assertEqual(delta['removidos'], [removido.id])
+        self.assertIn('sincronizado_em', delta)
+
+    def test_updated_since_invalido_e_400(self):
+        for valor in ('ontem', '2024-02-30T00:00:00Z'):
+            self.assertEqual(self.client.get('/api/cozinha/', {'updated_since': valor}).status_code, 400)
+
+    def test_updated_since_anterior_aos_eventos_pede_reset(self):
+        self.criar_mesa_com_pedidos(1, pedidos=2)
+        antigo = (timezone.now() - timedelta(hours=settings.EVENTOS_RETENCAO_HORAS, minutes=1)).isoformat()
+
+        self.assertEqual(self.client.get('/api/cozinha/', {'updated_since': antigo}).json(), {'reset': True})
+
+    def test_delta_acima_do_limite_pede_reset(self):
+        self.criar_mesa_com_pedidos(1, pedidos=3)
+        uma_hora = (timezone.now() - timedelta(hours=1)).isoformat()
+
+        with override_settings(COZINHA_DELTA_LIMITE=4):
+            self.assertFalse(self.client.get('/api/cozinha/', {'updated_since': uma_hora}).json()['reset'])
+        with override_settings(COZINHA_DELTA_LIMITE=3):
+            self.assertEqual(self.client.get('/api/cozinha/', {'updated_since': uma_hora}).json(), {'reset': True})
+
+
+@override_settings(EVENTOS_SSE_DURACAO=0.3, EVENTOS_SSE_INTERVALO=0.05)
+class EventosPedidosTests(FoodflowTestCase):
+    def publicar(self, *pedidos, tipo='atualizado'):
+        with self.captureOnCommitCallbacks(execute=True):
+            for pedido in pedidos:
+                publicar_evento_pedido(pedido, tipo)
+        return list(EventoPedido.objects.order_by('id').values_list('id', flat=True))
+
+    def stream(self, **extra):
+        response = self.client.get('/api/eventos/pedidos/', HTTP_ACCEPT='text/event-stream', **extra)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return b''.join(response.streaming_content).decode()
+
+    def test_retoma_do_cursor_e_do_last_event_id(self):
+        mesa = self.criar_mesa_com_pedidos(1, pedidos=3)
+        pedidos = list(Pedido.objects.filter(mesa=mesa).ativos().order_by('id'))
+        ids = self.publicar(*pedidos)
+
+        resposta = self.client.get('/api/eventos/pedidos/', {'cursor': ids[0]}).json()
+        self.assertFalse(resposta['reset'])
+        self.assertEqual([e['id'] for e in resposta['eventos']], ids[1:])
+        self.assertEqual(resposta['cursor'], ids[-1])
+
+        conteudo = self.stream(HTTP_LAST_EVENT_ID=str(ids[1]))
+        self.assertTrue(conteudo.startswith(f'retry: 2000\nid: {ids[1]}\n\n'))
+        self.assertIn(f'id: {ids[2]}\nevent: pedido\n', conteudo)
+        self.assertNotIn(f'id: {ids[1]}\nevent: pedido\n', conteudo)
+
+    def test_cursor_expirado_manda_reset(self):
+        mesa = self.criar_mesa_com_pedidos(1, pedidos=3)
+        ids = self.publicar(*Pedido.objects.filter(mesa=mesa).ativos().order_by('id'))
+        # Limpeza levou os primeiros eventos: quem parou antes deles recarrega tudo
+        EventoPedido.objects.filter(id__in=ids[:2]).delete()
+
+        resposta = self.client.get('/api/eventos/pedidos/', {'cursor': ids[0] - 1}).json()
+        self.assertEqual(resposta, {'reset': True, 'cursor': ids[-1], 'eventos': []})
+        self.assertIn(f'id: {ids[-1]}\nevent: reset\n', self.stream(HTTP_LAST_EVENT_ID=str(ids[0] - 1)))
+
+    def test_filtro_por_codigo(self):
+        pedidos = [Pedido.objects.filter(mesa=self.criar_mesa_com_pedidos(numero)).ativos().get() for numero in (1, 2)]
+        self.publicar(*pedidos)
+
+        resposta = self.client.get('/api/eventos/pedidos/', {'cursor': 0, 'codigo': pedidos[1].codigo_acesso}).json()
+        self.assertEqual([e['pedido_id'] for e in resposta['eventos']], [pedidos[1].id])
+        conteudo = self.stream(data={'cursor': 0, 'codigo': pedidos[0].codigo_acesso})
+        self.assertEqual(conteudo.count('event: pedido'), 1)
+        self.assertIn(f'"pedido_id": {pedidos[0].id}', conteudo)
+
+    def test_rollback_nao_publica(self):
+        pedido = Pedido.objects.filter(mesa=self.criar_mesa_com_pedidos(1)).ativos().get()
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                publicar_evento_pedido(pedido)
+                transaction.set_rollback(True)
+        self.assertFalse(EventoPedido.objects.exists())
+
+    def test_sem_cursor_comeca_do_evento_mais_recente(self):
+        pedido = Pedido.objects.filter(mesa=self.criar_mesa_com_pedidos(1)).ativos().get()
+        ids = self.publicar(pedido)
+        resposta = self.client.get('/api/eventos/pedidos/').json()
+        self.assertEqual((resposta['cursor'], resposta['eventos']), (ids[-1], []))
+
+class StatusResumoTests(FoodflowTestCase):
+    def test_resumo_vem_do_cache_e_e_invalidado_na_transicao(self):
+        mesa = Mesa.objects.create(numero=1, capacidade=4)
+        pai = Pedido.objects.create(mesa=mesa, criado_por=self.gerente)
+        filha = Pedido.objects.create(mesa=mesa, comanda_pai=pai)
+        url = f'/api/pedidos/status_resumo/?codigo={pai.codigo_acesso}'
+
+        queries, response = self.contar_queries(url)
+        self.assertEqual(queries, 1)
+        self.assertEqual([p['id'] for p in response.json()], [pai.id, filha.id])
+        self.assertNotIn('itens', response.json()[0])
+
+        queries, _ = self.contar_queries(url)
+        self.assertEqual(queries, 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/pedidos/{filha.id}/finalizar/')
+        _, response = self.contar_queries(url)
+        self.assertEqual(response.json()[1]['status'], PedidoStatus.PRONTO)
+
+    def test_codigo_inexistente(self):
+        self.assertEqual(self.client.get('/api/pedidos/status_resumo/?codigo=NADA00').status_code, 404)
+
+
+class ComandaAbertaTests(FoodflowTestCase):
+    def test_iniciar_comanda_e_adicionar_item_reusam_a_comanda_aberta(self):
+        mesa = Mesa.objects.create(numero=7, capacidade=4)
+        payload = {'mesa': 7, 'nome_cliente': 'Ana', 'itens': [{'prato': self.prato.id, 'quantidade': 1}]}
+
+        primeira = self.client.post('/api/iniciar-comanda/', payload, format='json')
+        Pedido.objects.create(mesa=mesa, comanda_pai_id=primeira.json()['id'])
+        segunda = self.client.post('/api/iniciar-comanda/', payload, format='json')
+        item = self.client.post(f'/api/mesas/{mesa.id}/adicionar_item/', {'prato_id': self.prato.id}, format='json')
+
+        self.assertEqual(primeira.status_code, 201)
+        self.assertEqual(segunda.status_code, 200)
+        self.assertEqual(segunda.json()['id'], primeira.json()['id'])
+        self.assertEqual(item.json()['pedido_id'], primeira.json()['id'])
+        self.assertEqual(Pedido.objects.filter(mesa=mesa, comanda_pai__isnull=True).count(), 1)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+@override_settings(AUDITORIA_ASSINCRONA=False)
+class ComandaAbertaConcorrenciaTests(TransactionTestCase):
+    """Precisa de um banco com lock de linha de verdade (PostgreSQL)."""
+
+    PARALELOS = 8
+
+    def test_pedidos_simultaneos_na_mesma_mesa_abrem_uma_comanda(self):
+        Mesa.objects.create(numero=1, capacidade=4)
+        barreira = threading.Barrier(self.PARALELOS)
+        respostas = []
+
+        def iniciar():
+            try:
+                barreira.wait()
+                respostas.append(APIClient().post('/api/iniciar-comanda/', {'mesa': 1}, format='json'))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=iniciar) for _ in range(self.PARALELOS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(r.status_code for r in respostas), [200] * (self.PARALELOS - 1) + [201])
+        self.assertEqual(len({r.json()['id'] for r in respostas}), 1)
+        self.assertEqual(Pedido.objects.filter(mesa__numero=1).count(), 1)
+
+
+class FechamentoMesasTests(FoodflowTestCase):
+    def test_fechar_varias_mesas_em_lote(self):
+        mesas = [self.criar_mesa_com_pedidos(numero, pedidos=2) for numero in (1, 2, 3)]
+        livre = Mesa.objects.create(numero=4, capacidade=4)
+        self.client.force_authenticate(self.gerente)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.post(
+                    '/api/mesas/fechar/',
+                    {'mesas': [m.id for m in mesas] + [livre.id], 'metodo_pagamento': 'pix'},
+                    format='json',
+                )
+        self.assertLessEqual(len(ctx.captured_queries), 10)
+
+        dados = response.json()
+        self.assertEqual(response.status_code, 200)
+        # 2 pedidos x 1 item x 2 unidades x 25.00 por mesa
+        self.assertEqual([m['total'] for m in dados['mesas']], [100.0, 100.0, 100.0, 0.0])
+        self.assertEqual(Pedido.objects.filter(mesa__in=mesas).ativos().count(), 0)
+        self.assertEqual(Pagamento.objects.filter(metodo_pagamento='pix', status='aprovado').count(), 6)
+        self.assertFalse(Mesa.objects.filter(status='ocupada').exists())
+        self.assertEqual(EventoPedido.objects.filter(tipo='atualizado').count(), 6)
+
+    def test_liberar_uma_mesa_sem_pagamento(self):
+        mesa = self.criar_mesa_com_pedidos(1)
+
+        response = self.client.post(f'/api/mesas/{mesa.id}/liberar/')
+
+        self.assertEqual(response.json()['total'], 50.0)
+        self.assertEqual(Pedido.objects.filter(mesa=mesa).ativos().count(), 0)
+        self.assertFalse(Pagamento.objects.exists())
+
+    def test_pagamento_exige_usuario_autenticado(self):
+        mesa = self.criar_mesa_com_pedidos(1)
+
+        self.assertEqual(self.client.post('/api/mesas/fechar/', {'mesas': [mesa.id], 'metodo_pagamento': 'pix'}, format='json').status_code, 401)
+        self.assertEqual(self.client.post(f'/api/mesas/{mesa.id}/liberar/', {'metodo_pagamento': 'pix'}, format='json').status_code, 401)
+        self.assertEqual(Pedido.objects.filter(mesa=mesa).ativos().count(), 1)
+        self.assertFalse(Pagamento.objects.exists())
+
+    def test_fechar_recusa_ids_que_nao_sao_inteiros(self):
+        self.client.force_authenticate(self.gerente)
+
+        for mesas in (['a'], [1.5], [True]):
+            response = self.client.post('/api/mesas/fechar/', {'mesas': mesas, 'metodo_pagamento': 'pix'}, format='json')
+            self.assertEqual(response.status_code, 400, mesas)
+
+
+class EstoqueTests(FoodflowTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pao = Ingrediente.objects.create(nome='Pão', quantidade_estoque='10', unidade_medida='un', estoque_minimo='5')
+        self.carne = Ingrediente.objects.create(nome='Carne', quantidade_estoque='2.00', unidade_medida='kg', estoque_minimo='1')
+        PratoIngrediente.objects.create(prato=self.prato, ingrediente=self.pao, quantidade_utilizada='1')
+        PratoIngrediente.objects.create(prato=self.prato, ingrediente=self.carne, quantidade_utilizada='0.15')
+        Mesa.objects.create(numero=1, capacidade=4)
+
+    def estoque(self):
+        return dict(Ingrediente.objects.values_list('nome', 'quantidade_estoque'))
+
+    def test_baixa_um_update_por_ingrediente_para_o_pedido_inteiro(self):
+        itens = [{'prato': self.prato.id, 'quantidade': 2, 'observacao': str(i)} for i in range(3)]
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/iniciar-comanda/', {'mesa': 1, 'itens': itens}, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE') and 'ingrediente' in q['sql']]
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(self.estoque(), {'Pão': Decimal('4'), 'Carne': Decimal('1.10')})
+
+    def test_edicao_de_itens_acerta_a_diferenca(self):
+        pedido = self.client.post(
+            '/api/iniciar-comanda/', {'mesa': 1, 'itens': [{'prato': self.prato.id, 'quantidade': 3}]}, format='json'
+        ).json()
+
+        self.client.patch(f"/api/pedidos/{pedido['id']}/", {'itens': [{'prato': self.prato.id, 'quantidade': 1}]}, format='json')
+        self.assertEqual(self.estoque()['Pão'], Decimal('9'))
+
+        self.client.patch(f"/api/pedidos/{pedido['id']}/", {'itens': []}, format='json')
+        self.assertEqual(self.estoque()['Pão'], Decimal('10'))
+
+    def test_baixa_condicional_recusa_o_que_outro_pedido_ja_levou(self):
+        # Outro pedido levou a carne depois do índice de disponibilidade ser lido
+        Ingrediente.objects.filter(pk=self.carne.pk).update(quantidade_estoque='0.20')
+        itens = [{'prato': self.prato.id, 'quantidade': 2}]
+        mesa = Mesa.objects.get(numero=1)
+
+        response = self.client.post('/api/iniciar-comanda/', {'mesa': 1, 'itens': itens}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'erro': 'Sem estoque para: X-Burger.'})
+        response = self.client.post('/api/cozinha/', {'mesa': mesa.id, 'itens': itens}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        self.assertEqual(self.estoque(), {'Pão': Decimal('10'), 'Carne': Decimal('0.20')})
+        self.assertFalse(PedidoItem.objects.exists())
+
+    def test_pedido_itens_acertam_o_estoque(self):
+        pedido = self.client.post(
+            '/api/iniciar-comanda/', {'mesa': 1, 'itens': [{'prato': self.prato.id, 'quantidade': 3}]}, format='json'
+        ).json()
+        item_id = pedido['itens'][0]['id']
+
+        self.assertEqual(self.client.patch(f'/api/pedido-itens/{item_id}/', {'quantidade': 5}, format='json').status_code, 200)
+        self.assertEqual(self.estoque()['Pão'], Decimal('5'))
+
+        response = self.client.patch(f'/api/pedido-itens/{item_id}/', {'quantidade': 20}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(PedidoItem.objects.get(pk=item_id).quantidade, 5)
+        self.assertEqual(self.estoque()['Pão'], Decimal('5'))
+
+        self.client.delete(f'/api/pedido-itens/{item_id}/')
+        self.assertEqual(self.estoque(), {'Pão': Decimal('10'), 'Carne': Decimal('2.00')})
+
+    def test_estoque_baixo(self):
+        self.client.force_authenticate(self.gerente)
+        self.client.post('/api/iniciar-comanda/', {'mesa': 1, 'itens': [{'prato': self.prato.id, 'quantidade': 6}]}, format='json')
+
+        response = self.client.get('/api/gerente/estoque-baixo/')
+
+        self.assertEqual([i['nome'] for i in response.json()], ['Pão'])
+
+
+class DisponibilidadeTests(FoodflowTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pao = Ingrediente.objects.create(nome='Pão', quantidade_estoque='3', unidade_medida='un', estoque_minimo='1')
+        PratoIngrediente.objects.create(prato=self.prato, ingrediente=self.pao, quantidade_utilizada='1')
+        self.mesa = Mesa.objects.create(numero=1, capacidade=4)
+
+    def pedir(self, quantidade):
+        return self.client.post(
+            '/api/pedidos/', {'mesa': self.mesa.id, 'itens': [{'prato': self.prato.id, 'quantidade': quantidade}]},
+            format='json',
+        )
+
+    def test_indice_acompanha_o_estoque(self):
+        self.prato.refresh_from_db()
+        self.assertEqual(self.prato.porcoes_disponiveis, 3)
+
+        self.pedir(2)
+        self.prato.refresh_from_db()
+        self.assertEqual(self.prato.porcoes_disponiveis, 1)
+
+        self.pao.quantidade_estoque = 10
+        self.pao.save()
+        self.prato.refresh_from_db()
+        self.assertEqual(self.prato.porcoes_disponiveis, 10)
+
+    def test_pedido_acima_do_estoque_e_recusado(self):
+        response = self.pedir(4)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Pedido.objects.exists())
+
+    def test_prato_esgotado_sai_do_cardapio(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pedir(3)
+
+        pratos = self.client.get('/api/cardapio/').json()['pratos']
+
+        self.assertEqual(pratos, [])
+        self.assertEqual(self.client.get('/api/pratos/').json(), [])
+
+
+class AuditoriaTests(FoodflowTestCase):
+    def test_registra_antes_e_depois_so_apos_o_commit(self):
+        self.client.force_authenticate(self.gerente)
+        mesa = Mesa.objects.create(numero=1, capacidade=4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                '/api/pedidos/', {'mesa': mesa.id, 'itens': [{'prato': self.prato.id, 'quantidade': 1}]}, format='json'
+            )
+        pedido = Pedido.objects.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/pedidos/{pedido.id}/finalizar/')
+
+        logs = LogAlteracao.objects.filter(tabela_nome='foodflow_app_pedido', registro_id=pedido.id).order_by('id')
+        self.assertEqual([log.acao for log in logs], ['insert', 'update'])
+        self.assertEqual(logs[1].dados_anteriores['status'], PedidoStatus.PENDENTE)
+        self.assertEqual(logs[1].dados_novos['status'], PedidoStatus.PRONTO)
+        self.assertEqual(logs[1].usuario, self.gerente)
+        self.assertTrue(LogAlteracao.objects.filter(tabela_nome='foodflow_app_pedidoitem', acao='insert').exists())
+
+    def test_rollback_nao_gera_log(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    Mesa.objects.create(numero=1, capacidade=4)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+
+        self.assertEqual(callbacks, [])
+        self.assertFalse(LogAlteracao.objects.exists())
+
+    @override_settings(AUDITORIA_ASSINCRONA=True)
+    def test_fila_cheia_descarta_e_conta(self):
+        escritor = auditoria.EscritorAuditoria(tamanho_max=2, lote=10, intervalo=0, espera=0.01)
+        mesa = Mesa.objects.create(numero=1, capacidade=4)
+
+        with mock.patch.object(escritor, 'iniciar'):
+            for _ in range(3):
+                escritor.enfileirar(LogAlteracao(tabela_nome='mesa', registro_id=mesa.id, acao='update'))
+        metricas = escritor.metricas()
+        escritor.descarregar()
+
+        self.assertEqual((metricas['enfileirados'], metricas['descartados'], metricas['na_fila']), (2, 1, 2))
+        self.assertEqual(escritor.metricas()['gravados'], 2)
+        self.assertEqual(LogAlteracao.objects.count(), 2)
+
+
+class RelatoriosTests(FoodflowTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.gerente)
+
+    def fechar(self, mesa):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/mesas/{mesa.id}/liberar/')
+
+    def test_agregados_incrementais_batem_com_a_reconstrucao(self):
+        mesa = self.criar_mesa_com_pedidos(1, pedidos=2, itens=2)
+        # O pedido que a fixture já cria pago nunca passou por uma transição
+        Pedido.objects.filter(mesa=mesa, status=PedidoStatus.PAGO).delete()
+        pedido = Pedido.objects.filter(mesa=mesa).ativos().first()
+        with self.captureOnCommitCallbacks(execute=True):
+            pedido.mudar_status(PedidoStatus.EM_PREPARO)
+            Pedido.objects.filter(pk=pedido.pk).update(inicio_preparo=timezone.now() - timedelta(minutes=12))
+            pedido.refresh_from_db()
+            pedido.mudar_status(PedidoStatus.PRONTO)
+        self.fechar(mesa)
+
+        ranking = self.client.get('/api/gerente/relatorios/ranking/', {'dimensao': 'prato'}).json()
+        # 2 pedidos x 2 itens x 2 unidades x 25.00
+        self.assertEqual(ranking, [{
+            'chave_id': self.prato.id, 'rotulo': 'X-Burger', 'receita': 200.0, 'itens': 8, 'pedidos': 2,
+            'preparo_medio_segundos': 720,
+        }])
+
+        incrementais = sorted(ResumoVendas.objects.values_list('dimensao', 'granularidade', 'chave_id', 'receita', 'itens', 'pedidos', 'preparo_segundos'))
+        reconstruir()
+        self.assertEqual(
+            sorted(ResumoVendas.objects.values_list('dimensao', 'granularidade', 'chave_id', 'receita', 'itens', 'pedidos', 'preparo_segundos')),
+            incrementais,
+        )
+
+    def receita_do_prato(self):
+        return ResumoVendas.objects.get(dimensao='prato', granularidade='dia', chave_id=self.prato.id)
+
+    def test_transicao_repetida_nao_conta_o_pedido_de_novo(self):
+        mesa = self.criar_mesa_com_pedidos(1)
+        Pedido.objects.filter(mesa=mesa, status=PedidoStatus.PAGO).delete()
+        pedido = Pedido.objects.get(mesa=mesa)
+        with self.captureOnCommitCallbacks(execute=True):
+            for status in (PedidoStatus.EM_PREPARO, PedidoStatus.PRONTO, PedidoStatus.EM_PREPARO, PedidoStatus.PRONTO):
+                pedido.mudar_status(status)
+        self.fechar(mesa)
+        # Reaberto por PATCH e fechado de novo
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/pedidos/{pedido.id}/', {'status': PedidoStatus.ENTREGUE}, format='json')
+        self.assertEqual(self.receita_do_prato().pedidos, 0)
+        self.fechar(mesa)
+
+        resumo = self.receita_do_prato()
+        self.assertEqual((resumo.receita, resumo.pedidos, resumo.preparo_pedidos), (Decimal('50.00'), 1, 1))
+
+    def test_cancelar_pedido_pago_desconta_a_venda(self):
+        mesa = self.criar_mesa_com_pedidos(1)
+        Pedido.objects.filter(mesa=mesa, status=PedidoStatus.PAGO).delete()
+        self.fechar(mesa)
+        pedido = Pedido.objects.get(mesa=mesa)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            pedido.mudar_status(PedidoStatus.CANCELADO)
+
+        resumo = self.receita_do_prato()
+        self.assertEqual((resumo.receita, resumo.itens, resumo.pedidos), (Decimal('0.00'), 0, 0))
+        reconstruir()
+        self.assertFalse(ResumoVendas.objects.filter(pedidos__gt=0).exists())
+
+    def test_chave_nao_numerica_e_400(self):
+        response = self.client.get('/api/gerente/relatorios/vendas/', {'chave': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_leitura_usa_so_os_agregados(self):
+        self.fechar(self.criar_mesa_com_pedidos(1))
+
+        with CaptureQueriesContext(connection) as ctx:
+            serie = self.client.get('/api/gerente/relatorios/vendas/', {'dimensao': 'mesa', 'granularidade': 'hora'}).json()
+
+        self.assertEqual([linha['receita'] for linha in serie], [50.0])
+        self.assertFalse([q for q in ctx.captured_queries if '"foodflow_app_pedido' in q['sql']])
+
+
+class EstimativaTests(FoodflowTestCase):
+    def pedido_pronto(self, prato, minutos):
+        mesa = Mesa.objects.get_or_create(numero=90, defaults={'capacidade': 4})[0]
+        agora = timezone.now()
+        pedido = Pedido.objects.create(
+            mesa=mesa, status=PedidoStatus.ENTREGUE, inicio_preparo=agora - timedelta(minutes=minutos), pronto_em=agora,
+        )
+        PedidoItem.objects.create(pedido=pedido, prato=prato, quantidade=1, preco_unitario=prato.preco)
+
+    def test_aprende_com_o_historico_e_soma_a_fila(self):
+        pizza = Prato.objects.create(nome='Pizza', preco='50.00', categoria=self.categoria, criado_por=self.gerente)
+        self.pedido_pronto(self.prato, 8)
+        self.pedido_pronto(self.prato, 12)
+        self.pedido_pronto(pizza, 30)
+
+        # O pedido sai quando o prato mais demorado fica pronto
+        self.assertEqual(estimativa.estimar_tempo([self.prato.id]), 10)
+        self.assertEqual(estimativa.estimar_tempo([self.prato.id, pizza.id]), 30)
+
+        # Fila de 4 pedidos / 4 simultâneos = uma média geral (20 min) a mais
+        mesa = Mesa.objects.create(numero=91, capacidade=4)
+        for _ in range(4):
+            Pedido.objects.create(mesa=mesa, status=PedidoStatus.PENDENTE)
+        with override_settings(ESTIMATIVA_ATUALIZACAO=0):
+            self.assertEqual(estimativa.estimar_tempo([self.prato.id]), 30)
+
+    def test_prato_sem_historico_usa_o_padrao(self):
+        self.assertEqual(estimativa.estimar_tempo([self.prato.id]), 15)
+
+    def test_criacao_preenche_tempo_sem_consultar_o_historico(self):
+        self.pedido_pronto(self.prato, 9)
+        estimativa.estimar_tempo([self.prato.id])
+        mesa = Mesa.objects.create(numero=5, capacidade=4)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/iniciar-comanda/', {
+                'mesa': mesa.numero, 'itens': [{'prato': self.prato.id, 'quantidade': 1}],
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Pedido.objects.get(mesa=mesa).tempo_estimado, 9)
+        self.assertFalse(any('"pronto_em" >' in q['sql'] for q in ctx.captured_queries))
+
+
+@override_settings(COZINHA_ATUALIZACAO=0)
+class EstacoesTests(FoodflowTestCase):
+    def setUp(self):
+        super().setUp()
+        bebidas = Categoria.objects.create(nome='Bebidas', estacao='bar', criado_por=self.gerente)
+        self.suco = Prato.objects.create(nome='Suco', preco='8.00', categoria=bebidas, criado_por=self.gerente)
+        self.mesa = Mesa.objects.create(numero=1, capacidade=4, status='ocupada')
+
+    def pedido(self, *pratos, minutos_atras=0, **campos):
+        pedido = Pedido.objects.create(mesa=self.mesa, **campos)
+        Pedido.objects.filter(pk=pedido.pk).update(criado_em=timezone.now() - timedelta(minutes=minutos_atras))
+        for prato in pratos:
+            PedidoItem.objects.create(pedido=pedido, prato=prato, quantidade=1, preco_unitario=prato.preco)
+        return pedido
+
+    def fila(self, estacao):
+        response = self.client.get(f'/api/cozinha/estacoes/{estacao}/')
+        self.assertEqual(response.status_code, 200)
+        return [(item['pedido_id'], item['prato']) for item in response.json()['itens']]
+
+    def test_itens_vao_para_a_praca_da_categoria(self):
+        pedido = self.pedido(self.prato, self.suco)
+
+        self.assertEqual(self.fila('geral'), [(pedido.id, 'X-Burger')])
+        self.assertEqual(self.fila('bar'), [(pedido.id, 'Suco')])
+        self.assertEqual(self.client.get('/api/cozinha/estacoes/').json(), [
+            {'estacao': 'bar', 'itens': 1}, {'estacao': 'geral', 'itens': 1},
+        ])
+
+    def test_ordem_por_preparo_idade_e_espera_da_mesa(self):
+        novo = self.pedido(self.prato, minutos_atras=1)
+        antigo = self.pedido(self.prato, minutos_atras=10)
+        em_preparo = self.pedido(self.prato, status=PedidoStatus.EM_PREPARO)
+        self.assertEqual([p for p, _ in self.fila('geral')], [em_preparo.id, antigo.id, novo.id])
+
+        # Filha de uma comanda aberta há uma hora passa na frente do pedido antigo
+        principal = self.pedido(minutos_atras=60, status=PedidoStatus.ENTREGUE)
+        filha = self.pedido(self.prato, minutos_atras=2, comanda_pai=principal)
+        self.assertEqual([p for p, _ in self.fila('geral')], [em_preparo.id, filha.id, antigo.id, novo.id])
+
+    def test_pedido_pronto_ou_apagado_sai_da_fila(self):
+        pronto = self.pedido(self.prato)
+        apagado = self.pedido(self.prato)
+        fica = self.pedido(self.prato)
+        self.assertEqual(len(self.fila('geral')), 3)
+
+        pronto.mudar_status(PedidoStatus.PRONTO)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/pedidos/{apagado.id}/')
+        self.assertEqual(self.fila('geral'), [(fica.id, 'X-Burger')])
+
+    def test_leitura_entre_atualizacoes_nao_consulta_o_banco(self):
+        self.pedido(self.prato)
+        self.fila('geral')
+        with override_settings(COZINHA_ATUALIZACAO=60), CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(len(self.fila('geral')), 1)
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+
+class BenchmarkTests(FoodflowTestCase):
+    def test_micro_benchmarks_rodam_com_dados_gerados(self):
+        _, pratos = benchmarks.gerar_cardapio(categorias=1, pratos_por_categoria=3)
+        benchmarks.gerar_historico(benchmarks.gerar_mesas(2), pratos, fechados=10)
+
+        resultado = benchmarks.medir_endpoints(pratos, repeticoes=2)
+
+        self.assertEqual(set(resultado), {
+            'iniciar_comanda (3 itens)', 'listagem de mesas (/api/mesas/)',
+            'fila da cozinha (PedidoViewSet.cozinha)', 'pedido_por_codigo',
+        })
+        self.assertTrue(all(medicao['queries'] > 0 for medicao in resultado.values()))
+
+    def test_serializacao_usa_o_historico_e_avisa_quando_falta(self):
+        _, pratos = benchmarks.gerar_cardapio(categorias=1, pratos_por_categoria=3)
+        benchmarks.gerar_historico(benchmarks.gerar_mesas(2), pratos, fechados=10)
+
+        # 10 fechados + 2 ativos: os fechados entram na comparação
+        self.assertTrue(all(nome.startswith('8 pedidos') for nome in benchmarks.comparar_serializacao(8, repeticoes=1)))
+        self.assertEqual(benchmarks.pedidos_disponiveis(500), Pedido.objects.count())
+
+        saida = io.StringIO()
+        call_command('benchmark_pedidos', sem_popular=True, sem_carga=True, repeticoes=1, serializacao=500, stdout=saida)
+        self.assertIn(f'Só {Pedido.objects.count()} pedido(s) no banco', saida.getvalue())
+
+    def test_segunda_rodada_reaproveita_as_mesas_livres(self):
+        _, pratos = benchmarks.gerar_cardapio(categorias=1, pratos_por_categoria=3)
+        benchmarks.gerar_historico(benchmarks.gerar_mesas(2), pratos, fechados=10)
+
+        for _ in range(2):
+            benchmarks.medir_endpoints(pratos, repeticoes=2)
+
+        self.assertEqual(Mesa.objects.filter(numero__gte=benchmarks.NUMERO_MESAS_LIVRES).count(), 3)
+
+
+class AutenticacaoTests(FoodflowTestCase):
+    def setUp(self):
+        super().setUp()
+        self.token = Token.objects.create(user=self.gerente)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def queries_do_perfil(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/gerente/perfil/')
+        return response.status_code, [q['sql'] for q in ctx.captured_queries]
+
+    def test_token_resolvido_uma_vez_por_worker(self):
+        self.assertEqual(self.queries_do_perfil()[0], 200)
+        status_code, queries = self.queries_do_perfil()
+        self.assertEqual(status_code, 200)
+        self.assertEqual(queries, [])
+
+    def test_logout_e_troca_de_senha_invalidam_o_cache(self):
+        self.queries_do_perfil()
+        self.gerente.set_password('outra-senha-456')
+        self.gerente.save()
+        status_code, queries = self.queries_do_perfil()
+        self.assertEqual(status_code, 200)
+        self.assertTrue(any('authtoken_token' in sql for sql in queries))
+
+        self.assertEqual(self.client.post('/api/gerente/logout/').status_code, 200)
+        self.assertEqual(self.queries_do_perfil()[0], 401)
+
+    def test_rotas_publicas_nao_leem_a_sessao(self):
+        self.client.credentials()
+        self.client.force_login(self.gerente)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/cardapio/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any('django_session' in q['sql'] for q in ctx.captured_queries))
+        self.assertNotIn('sessionid', response.cookies)
+
+
+class LeituraRapidaTests(FoodflowTestCase):
+    def test_mesmo_formato_dos_serializers(self):
+        from rest_framework.renderers import JSONRenderer
+
+        mesa = self.criar_mesa_com_pedidos(1, pedidos=2, itens=2)
+        Mesa.objects.create(numero=2, capacidade=2, status='disponivel')
+        pedido = Pedido.objects.filter(mesa=mesa).ativos().first()
+        Pedido.objects.filter(pk=pedido.pk).update(inicio_preparo=timezone.now(), tempo_estimado=12)
+        filha = Pedido.objects.create(mesa=mesa, comanda_pai=pedido, nome_cliente='Ção')
+        PedidoItem.objects.create(pedido=filha, prato=self.prato, quantidade=1, preco_unitario='7.5', observacao='sem sal')
+
+        pedidos = Pedido.objects.order_by('id')
+        self.assertEqual(
+            renderizar(pedidos_em_dicts(linhas_pedidos(pedidos))),
+            JSONRenderer().render(PedidoReadSerializer(pedidos.com_relacionados(), many=True).data),
+        )
+        mesas = Mesa.objects.order_by('numero').com_valor_total()
+        self.assertEqual(
+            renderizar(mesas_em_dicts(mesas)),
+            JSONRenderer().render(MesaSerializer(mesas.com_pedidos_ativos(), many=True).data),
+        )
+
+    def test_endpoints_de_polling_usam_o_caminho_rapido(self):
+        mesa = self.criar_mesa_com_pedidos(1, pedidos=2)
+        codigo = Pedido.objects.filter(mesa=mesa).ativos().first().codigo_acesso
+
+        for url in ('/api/mesas/', '/api/cozinha/', f'/api/pedido-por-codigo/{codigo}/'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(len(response.json()), 1)
+
+
+class RespostasApiTests(FoodflowTestCase):
+    def test_304_sem_rodar_a_view_ate_a_lista_mudar(self):
+        mesa = self.criar_mesa_com_pedidos(1, pedidos=2)
+        for url in ('/api/mesas/', '/api/cozinha/', '/api/pratos/'):
+            primeira = self.client.get(url)
+            etag = primeira['ETag']
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304, url)
+            self.assertLessEqual(len(ctx.captured_queries), 1, url)
+
+        etag = self.client.get('/api/mesas/')['ETag']
+        pedido = Pedido.objects.filter(mesa=mesa).ativos().first()
+        pedido.mudar_status(PedidoStatus.EM_PREPARO)
+        self.assertEqual(self.client.get('/api/mesas/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etag = self.client.get('/api/cozinha/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/pedidos/{pedido.id}/')
+        self.assertEqual(self.client.get('/api/cozinha/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_json_grande_sai_comprimido(self):
+        import gzip
+
+        for numero in range(1, 6):
+            self.criar_mesa_com_pedidos(numero, pedidos=2, itens=3)
+        normal = self.client.get('/api/mesas/')
+        response = self.client.get('/api/mesas/', HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), normal.content)
+        self.assertLess(len(response.content), len(normal.content))
+
+    def test_resposta_pequena_nao_e_comprimida(self):
+        response = self.client.get('/api/pedidos/status_resumo/', {'codigo': 'XXXXXX'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    @override_settings(COMPRESSAO_MINIMO=0)
+    def test_etag_forte_enfraquece_quando_comprime(self):
+        normal = self.client.get('/api/cardapio/')
+        response = self.client.get('/api/cardapio/', HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['ETag'], f'W/{normal["ETag"]}')
+        revalidada = self.client.get('/api/cardapio/', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidada.status_code, 304)
+        self.assertIn('Accept-Encoding', revalidada['Vary'])
+
+
+
+class IdempotenciaTests(FoodflowTestCase):
+    def confirmar(self, payload, chave):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/iniciar-comanda/', payload, format='json', HTTP_IDEMPOTENCY_KEY=chave)
+
+    def test_repeticao_devolve_a_primeira_resposta_sem_criar_de_novo(self):
+        Mesa.objects.create(numero=1, capacidade=4)
+        payload = {'mesa': 1, 'itens': [{'prato': self.prato.id, 'quantidade': 2}]}
+        primeira = self.confirmar(payload, 'confirmar-1')
+
+        with CaptureQueriesContext(connection) as ctx:
+            repetida = self.confirmar(payload, 'confirmar-1')
+
+        self.assertEqual(primeira.status_code, 201)
+        self.assertEqual(repetida.status_code, 201)
+        self.assertEqual(repetida.content, primeira.content)
+        self.assertEqual(repetida['Idempotent-Replayed'], 'true')
+        self.assertFalse(any('foodflow_app_pedido' in q['sql'] for q in ctx.captured_queries))
+        self.assertEqual(PedidoItem.objects.count(), 1)
+        self.assertEqual(EventoPedido.objects.count(), 1)
+
+    def test_mesma_chave_com_outro_pedido_e_recusada(self):
+        Mesa.objects.create(numero=1, capacidade=4)
+        self.confirmar({'mesa': 1, 'itens': [{'prato': self.prato.id, 'quantidade': 1}]}, 'confirmar-1')
+        response = self.confirmar({'mesa': 1, 'itens': [{'prato': self.prato.id, 'quantidade': 3}]}, 'confirmar-1')
+        self.assertEqual(response.status_code, 422)
+
+    def test_erro_nao_fica_guardado(self):
+        payload = {'mesa': 7, 'itens': [{'prato': self.prato.id, 'quantidade': 1}]}
+        self.assertEqual(self.confirmar(payload, 'confirmar-1').status_code, 404)
+        self.assertFalse(RespostaIdempotente.objects.exists())
+
+        Mesa.objects.create(numero=7, capacidade=4)
+        self.assertEqual(self.confirmar(payload, 'confirmar-1').status_code, 201)
+
+    def test_post_da_cozinha_e_chave_vencida(self):
+        mesa = Mesa.objects.create(numero=1, capacidade=4)
+        payload = {'mesa': mesa.id, 'itens': [{'prato': self.prato.id, 'quantidade': 1}]}
+        for _ in range(2):
+            response = self.client.post('/api/cozinha/', payload, format='json', HTTP_IDEMPOTENCY_KEY='cozinha-1')
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(Pedido.objects.filter(mesa=mesa).count(), 1)
+
+        with override_settings(IDEMPOTENCIA_RETENCAO_HORAS=0):
+            self.client.post('/api/cozinha/', payload, format='json', HTTP_IDEMPOTENCY_KEY='cozinha-1')
+        self.assertEqual(Pedido.objects.filter(mesa=mesa).count(), 2)
+
+        # Sem a chave, nada muda
+        self.client.post('/api/cozinha/', payload, format='json')
+        self.assertEqual(Pedido.objects.filter(mesa=mesa).count(), 3)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+@override_settings(AUDITORIA_ASSINCRONA=False)
+class IdempotenciaConcorrenciaTests(TransactionTestCase):
+    """Repetições simultâneas esperam no índice único; precisa de PostgreSQL."""
+
+    PARALELOS = 8
+
+    def test_repeticoes_simultaneas_criam_um_pedido(self):
+        gerente = Usuario.objects.create_user(username='gerente', password='senha-forte-123', role='gerente')
+        prato = Prato.objects.create(
+            nome='X-Burger', preco='25.00', criado_por=gerente,
+            categoria=Categoria.objects.create(nome='Lanches', criado_por=gerente),
+        )
+        mesa = Mesa.objects.create(numero=1, capacidade=4)
+        payload = {'mesa': mesa.id, 'itens': [{'prato': prato.id, 'quantidade': 1}]}
+        barreira = threading.Barrier(self.PARALELOS)
+        respostas = []
+
+        def confirmar():
+            try:
+                barreira.wait()
+                respostas.append(
+                    APIClient().post('/api/cozinha/', payload, format='json', HTTP_IDEMPOTENCY_KEY='confirmar-1')
+                )
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=confirmar) for _ in range(self.PARALELOS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([r.status_code for r in respostas], [201] * self.PARALELOS)
+        self.assertEqual(len({r.content for r in respostas}), 1)
+        self.assertEqual(Pedido.objects.filter(mesa=mesa).count(), 1)
+
+# URLconf do deploy ASGI (VIEWS_ASSINCRONAS=True), para AssincronoTests
+urlpatterns = [path('api/', include(urls.rotas_polling_assincronas + urls.urlpatterns))]
+
+
+class AssincronoTests(FoodflowTestCase):
+    def get_async(self, url, **extra):
+        # AsyncClient passa pelo handler ASGI, com a cadeia de middlewares em modo async
+        with override_settings(ROOT_URLCONF='foodflow_app.tests'):
+            return async_to_sync(AsyncClient().get)(url, **extra)
+
+    def test_views_async_respondem_igual_as_sincronas(self):
+        mesa = self.criar_mesa_com_pedidos(1, pedidos=2, itens=2)
+        self.criar_mesa_com_pedidos(2)
+        codigo = Pedido.objects.filter(mesa=mesa).ativos().first().codigo_acesso
+
+        for url in ('/api/mesas/', f'/api/pedido-por-codigo/{codigo}/', '/api/pedido-por-codigo/XXXXXX/'):
+            sincrona, assincrona = self.client.get(url), self.get_async(url)
+            self.assertEqual(assincrona.status_code, sincrona.status_code, url)
+            self.assertEqual(assincrona.content, sincrona.content, url)
+            self.assertEqual(assincrona['Content-Type'], 'application/json')
+
+        for url in (
+            '/api/cozinha/?page_size=2',
+            '/api/pedidos/cozinha/?status=pago',
+            '/api/cozinha/?' + urlencode({'updated_since': (timezone.now() - timedelta(hours=1)).isoformat()}),
+            '/api/cozinha/?updated_since=2000-01-01T00:00:00Z',
+        ):
+            sincrona, assincrona = self.client.get(url).json(), self.get_async(url).json()
+            sincrona.pop('sincronizado_em', None), assincrona.pop('sincronizado_em', None)
+            self.assertEqual(assincrona, sincrona, url)
+
+        self.assertEqual(self.get_async('/api/cozinha/?cursor=invalido').status_code, 404)
+        self.assertEqual(self.get_async('/api/cozinha/?updated_since=ontem').status_code, 400)
+        self.assertEqual(self.get_async('/api/cozinha/?updated_since=2024-02-30T00:00:00Z').status_code, 400)
+
+    def test_etag_e_compressao_no_modo_async(self):
+        import gzip
+
+        for numero in range(1, 6):
+            self.criar_mesa_com_pedidos(numero, pedidos=2, itens=3)
+        primeira = self.get_async('/api/mesas/', headers={'Accept-Encoding': 'gzip'})
+
+        self.assertEqual(primeira['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(primeira.content), self.client.get('/api/mesas/').content)
+        self.assertEqual(self.get_async('/api/mesas/', headers={'If-None-Match': primeira['ETag']}).status_code, 304)
+
+    def test_escrita_na_rota_async_vai_para_o_viewset(self):
+        with override_settings(ROOT_URLCONF='foodflow_app.tests'):
+            response = async_to_sync(AsyncClient().post)(
+                '/api/mesas/', {'numero': 50, 'capacidade': 4, 'status': 'disponivel'}, content_type='application/json',
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Mesa.objects.filter(numero=50).exists())
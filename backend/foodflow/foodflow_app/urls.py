@@ -1,4 +1,5 @@
 from rest_framework import routers
+from django.conf import settings
 from django.urls import path, include
 from .views import (
     # ViewSets principais
@@ -25,6 +26,14 @@ from .views import (
     CategoriaGerenteViewSet,
     PratoGerenteViewSet,
 )
+from . import assincrono
+from .eventos import eventos_pedidos
+from .imagens import imagem_prato
+from .auditoria import metricas_auditoria
+from .cardapio import cardapio
+from .estacoes import estacoes_cozinha, fila_estacao
+from .estoque import estoque_baixo
+from .relatorios import relatorio_ranking, relatorio_vendas
 
 # -------------------------------------------------------------------
 
@@ -45,6 +54,25 @@ router.register(r'pagamentos', PagamentoViewSet)
 router.register(r'gerente/categorias', CategoriaGerenteViewSet, basename='gerente-categoria')
 router.register(r'gerente/pratos', PratoGerenteViewSet, basename='gerente-prato')
 
+# -------------------------------------------------------------------
+# POLLING — síncrono (WSGI) ou async (ASGI, VIEWS_ASSINCRONAS)
+# -------------------------------------------------------------------
+
+rotas_polling_sincronas = [
+    path('pedido-por-codigo/<str:codigo>/', pedido_por_codigo, name='pedido-por-codigo'),
+    path('cozinha/', PedidoViewSet.as_view({'post': 'cozinha', 'get': 'cozinha'}), name='pedido-cozinha'),
+]
+
+rotas_polling_assincronas = [
+    path('pedido-por-codigo/<str:codigo>/', assincrono.pedido_por_codigo, name='pedido-por-codigo'),
+    path('cozinha/', assincrono.cozinha, name='pedido-cozinha'),
+    # Antes do router, que tem as mesmas URLs nos viewsets
+    path('pedidos/cozinha/', assincrono.cozinha, name='pedido-cozinha'),
+    path('mesas/', assincrono.mesas, name='mesa-list'),
+]
+
+rotas_polling = rotas_polling_assincronas if settings.VIEWS_ASSINCRONAS else rotas_polling_sincronas
+
 # -------------------------------------------------------------------
 # URLS FINAIS — ORDEM CORRETA
 # -------------------------------------------------------------------
@@ -52,8 +80,12 @@ router.register(r'gerente/pratos', PratoGerenteViewSet, basename='gerente-prato'
 urlpatterns = [
     # 1. Funções (devem vir antes dos routers)
     path('iniciar-comanda/', iniciar_comanda, name='iniciar-comanda'),
-    path('pedido-por-codigo/<str:codigo>/', pedido_por_codigo, name='pedido-por-codigo'),
-    path('cozinha/', PedidoViewSet.as_view({'post': 'cozinha', 'get': 'cozinha'}), name='pedido-cozinha'),
+    *rotas_polling,
+    path('cozinha/estacoes/', estacoes_cozinha, name='cozinha-estacoes'),
+    path('cozinha/estacoes/<str:estacao>/', fila_estacao, name='cozinha-fila-estacao'),
+    path('eventos/pedidos/', eventos_pedidos, name='eventos-pedidos'),
+    path('imagens/<str:hash_conteudo>/<str:variante>/', imagem_prato, name='imagem-prato'),
+    path('cardapio/', cardapio, name='cardapio'),
 
     # 2. Rotas de login/cadastro do gerente
     path('gerente/registro/', gerente_registro, name='gerente-registro'),
@@ -61,6 +93,10 @@ urlpatterns = [
     path('gerente/logout/', gerente_logout, name='gerente-logout'),
     path('gerente/perfil/', gerente_perfil, name='gerente-perfil'),
     path('gerente/esqueceu-senha/', gerente_esqueceu_senha, name='gerente-esqueceu-senha'),
+    path('gerente/estoque-baixo/', estoque_baixo, name='gerente-estoque-baixo'),
+    path('gerente/auditoria/metricas/', metricas_auditoria, name='gerente-auditoria-metricas'),
+    path('gerente/relatorios/vendas/', relatorio_vendas, name='gerente-relatorio-vendas'),
+    path('gerente/relatorios/ranking/', relatorio_ranking, name='gerente-relatorio-ranking'),
 
     # 3. Rotas de viewsets (sempre por último)
     path('', include(router.urls)),
@@ -1,18 +1,24 @@
 from rest_framework import viewsets, status
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework.decorators import action, api_view, permission_classes, authentication_classes
 from rest_framework.authtoken.models import Token
+from django.conf import settings
 from django.contrib.auth import authenticate
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from django.db import transaction
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from datetime import timedelta
 import traceback
 
 from .models import (
     Usuario, Mesa, Categoria, Prato, Pedido, PedidoItem, Pagamento,
-    PedidoStatus
+    PedidoStatus, MetodoPagamento, EventoPedido
 )
 from .serializers import (
     UsuarioSerializer, MesaSerializer, CategoriaSerializer, PratoSerializer,
@@ -22,6 +28,14 @@ from .serializers import (
     GerenteRegistroSerializer, GerenteLoginSerializer, GerentePerfilSerializer,
     CategoriaGerenteSerializer, PratoGerenteSerializer
 )
+from .estimativa import estimar_tempo
+from .estoque import EstoqueInsuficiente, baixar_estoque, indisponiveis
+from .leitura import RespostaJSON, instante, linhas_pedidos, mesas_em_dicts, pedidos_em_dicts
+from .eventos import publicar_evento_pedido, publicar_eventos_pedidos
+from .idempotencia import idempotente
+from .pedidos import (
+    abrir_comanda, carregar_pratos, criar_itens, fechar_mesas, porcoes_pedidas, resumo_status, tocar_pedido,
+)
 
 # ============================================================================
 # 1. AUTENTICAÇÃO E GERENTE
@@ -133,6 +147,18 @@ class MesaViewSet(viewsets.ModelViewSet):
     serializer_class = MesaSerializer
     permission_classes = [AllowAny]
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # Só as ações que serializam a mesa precisam dos pedidos pré-carregados
+        if self.action in ['list', 'retrieve']:
+            queryset = queryset.com_valor_total().com_pedidos_ativos()
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        # Polling do garçom: caminho rápido (leitura.py), mesmo formato do MesaSerializer
+        mesas = self.filter_queryset(Mesa.objects.order_by('numero').com_valor_total())
+        return RespostaJSON(mesas_em_dicts(mesas))
+
     # --- AÇÃO: Adicionar Item (Garçom de Emergência) ---
     @action(detail=True, methods=['post'])
     def adicionar_item(self, request, pk=None):
@@ -145,20 +171,13 @@ class MesaViewSet(viewsets.ModelViewSet):
             return Response({'error': 'ID do prato obrigatório'}, status=400)
         
         prato = get_object_or_404(Prato, pk=prato_id)
+        if indisponiveis({prato.id: prato}, {prato.id: quantidade}):
+            return Response({'error': f'Sem estoque para {prato.nome}'}, status=400)
         usuario_atual = request.user if request.user.is_authenticated else Usuario.objects.filter(is_superuser=True).first()
 
         try:
             with transaction.atomic():
-                pedido = Pedido.objects.filter(mesa=mesa).exclude(status__in=['pago', 'cancelado']).first()
-                if not pedido:
-                    pedido = Pedido.objects.create(
-                        mesa=mesa,
-                        criado_por=usuario_atual,
-                        status=PedidoStatus.PENDENTE,
-                        nome_cliente=f"Mesa {mesa.numero}"
-                    )
-                    mesa.status = 'ocupada'
-                    mesa.save()
+                pedido, _ = abrir_comanda(mesa, usuario_atual)
 
                 PedidoItem.objects.create(
                     pedido=pedido,
@@ -168,23 +187,49 @@ class MesaViewSet(viewsets.ModelViewSet):
                     preco_unitario=prato.preco,
                     observacao=observacao
                 )
+                baixar_estoque({prato.id: quantidade})
+                tocar_pedido(pedido.pk)
+                publicar_evento_pedido(pedido)
                 return Response({'status': 'Item adicionado', 'pedido_id': pedido.id, 'item': f"{quantidade}x {prato.nome}"})
 
+        except EstoqueInsuficiente:
+            return Response({'error': f'Sem estoque para {prato.nome}'}, status=400)
         except Exception as e:
             return Response({'error': str(e)}, status=500)
 
     @action(detail=True, methods=['post'])
     def liberar(self, request, pk=None):
         mesa = self.get_object()
-        pedidos = Pedido.objects.filter(mesa=mesa).exclude(status__in=['pago', 'cancelado'])
-        for pedido in pedidos:
-            pedido.status = PedidoStatus.PAGO
-            pedido.save()
-        mesa.status = 'disponivel'
-        mesa.solicitou_atencao = False
-        mesa.save()
-        return Response({'status': 'Mesa liberada'})
-    
+        metodo = request.data.get('metodo_pagamento')
+        if metodo and metodo not in MetodoPagamento.values:
+            return Response({'erro': 'Método de pagamento inválido.'}, status=400)
+        # O garçom libera a mesa sem login; pagamento só com alguém responsável por ele
+        if metodo and not request.user.is_authenticated:
+            self.permission_denied(request, message='Entre para registrar o pagamento.')
+        [fechada] = self._fechar([mesa.id], metodo)
+        return Response({'status': 'Mesa liberada', 'total': fechada['total']})
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def fechar(self, request):
+        """Fechamento em lote: {"mesas": [ids], "metodo_pagamento": "pix"}."""
+        mesa_ids = request.data.get('mesas') or []
+        metodo = request.data.get('metodo_pagamento')
+        if not isinstance(mesa_ids, list) or not mesa_ids:
+            return Response({'erro': 'Informe a lista de mesas.'}, status=400)
+        if not all(type(mesa_id) is int for mesa_id in mesa_ids):
+            return Response({'erro': 'Os ids das mesas devem ser números inteiros.'}, status=400)
+        if metodo not in MetodoPagamento.values:
+            return Response({'erro': 'Método de pagamento inválido.'}, status=400)
+        fechadas = self._fechar(mesa_ids, metodo)
+        return Response({'mesas': fechadas, 'total': sum(m['total'] for m in fechadas)})
+
+    def _fechar(self, mesa_ids, metodo):
+        # Sem usuário, fechar_mesas não cria pagamentos (liberar do garçom)
+        usuario = self.request.user if self.request.user.is_authenticated else None
+        fechadas = fechar_mesas(mesa_ids, usuario, metodo)
+        publicar_eventos_pedidos(pedido_id for mesa in fechadas for pedido_id in mesa['pedidos'])
+        return fechadas
+
     @action(detail=True, methods=['post'])
     def chamar_garcom(self, request, pk=None):
         mesa = self.get_object()
@@ -207,11 +252,10 @@ class MesaViewSet(viewsets.ModelViewSet):
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def pedido_por_codigo(request, codigo):
-    pedidos = Pedido.objects.filter(codigo_acesso=codigo)
-    if not pedidos.exists():
+    linhas = list(linhas_pedidos(Pedido.objects.da_comanda(codigo)))
+    if not linhas:
         return Response({'erro': 'Nenhuma comanda encontrada.'}, status=404)
-    serializer = PedidoReadSerializer(pedidos, many=True)
-    return Response(serializer.data)
+    return RespostaJSON(pedidos_em_dicts(linhas))
 
 
 # No seu arquivo views.py
@@ -220,6 +264,7 @@ def pedido_por_codigo(request, codigo):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@idempotente
 def iniciar_comanda(request):
     print("--- INICIANDO COMANDA (DEBUG) ---") 
     print("Dados recebidos:", request.data)
@@ -239,74 +284,58 @@ def iniciar_comanda(request):
         if not mesa:
             return Response({'erro': f'A Mesa {mesa_numero} não existe ou não está ativa.'}, status=404)
 
-        # Verifica comanda existente
-        comanda_existente = Pedido.objects.filter(
-            mesa=mesa
-        ).exclude(
-            status__in=[PedidoStatus.PAGO, PedidoStatus.CANCELADO]
-        ).first()
-
-        if comanda_existente:
-            print(f"Comanda existente encontrada: {comanda_existente.id}")
-            # Se a comanda já existe, podemos optar por adicionar os novos itens nela
-            # ou apenas retornar a comanda atual.
-            if nome_cliente and not comanda_existente.nome_cliente:
-                comanda_existente.nome_cliente = nome_cliente
-                comanda_existente.save()
-            
-            # ATENÇÃO: Se quiser que "Confirmar" adicione itens em comanda aberta, 
-            # você deve copiar a lógica do 'for item in itens_data' para cá também.
-            
-            return Response(PedidoReadSerializer(comanda_existente).data)
-
-        # --- CRIAÇÃO DE NOVA COMANDA ---
         usuario = request.user if request.user.is_authenticated else None
-        
+        itens_validos = [item for item in itens_data if item.get('prato') and item.get('quantidade')]
+        # Estimativa sai da memória do worker, sem consulta nesta requisição
+        tempo_estimado = estimar_tempo(item['prato'] for item in itens_validos) if itens_validos else None
+
         # 2. USA TRANSACTION PARA GARANTIR QUE SALVA TUDO OU NADA
         with transaction.atomic():
-            print("Tentando criar novo pedido...")
-            pedido = Pedido.objects.create(
-                mesa=mesa,
-                criado_por=usuario,
-                nome_cliente=nome_cliente or f"Cliente Mesa {mesa.numero}",
-                status=PedidoStatus.PENDENTE
+            # Trava a mesa: pedidos simultâneos na mesma mesa caem na mesma comanda
+            pedido, criada = abrir_comanda(
+                mesa, usuario, nome_cliente or f"Cliente Mesa {mesa.numero}", tempo_estimado=tempo_estimado
             )
-            
-            # 3. SALVA OS ITENS NO BANCO
-            if itens_data:
-                print(f"Adicionando {len(itens_data)} itens ao pedido...")
-                for item in itens_data:
-                    prato_id = item.get('prato')
-                    quantidade = item.get('quantidade')
-                    observacao = item.get('observacao', '')
-
-                    if prato_id and quantidade:
-                        # Busca o preço atual do prato para congelar no pedido
-                        prato_obj = Prato.objects.get(pk=prato_id)
-                        
-                        PedidoItem.objects.create(
-                            pedido=pedido,
-                            prato=prato_obj,
-                            quantidade=quantidade,
-                            preco_unitario=prato_obj.preco, # Salva o preço da época
-                            observacao=observacao,
-                            usuario=usuario
-                        )
-
-            # Atualiza status da mesa
-            mesa.status = 'ocupada'
-            mesa.save()
+
+            if not criada:
+                print(f"Comanda existente encontrada: {pedido.id}")
+                # Se a comanda já existe, podemos optar por adicionar os novos itens nela
+                # ou apenas retornar a comanda atual.
+                if nome_cliente and not pedido.nome_cliente:
+                    pedido.nome_cliente = nome_cliente
+                    pedido.save()
+                    publicar_evento_pedido(pedido)
+
+                # ATENÇÃO: Se quiser que "Confirmar" adicione itens em comanda aberta,
+                # você deve copiar a lógica do 'for item in itens_data' para cá também.
+
+                return Response(PedidoReadSerializer(pedido).data)
+
+            # --- CRIAÇÃO DE NOVA COMANDA ---
+            # 3. SALVA OS ITENS NO BANCO (uma query para os pratos, um INSERT para os itens)
+            if itens_validos:
+                print(f"Adicionando {len(itens_validos)} itens ao pedido...")
+                pratos = carregar_pratos(item['prato'] for item in itens_validos)
+                esgotados = indisponiveis(pratos, porcoes_pedidas(itens_validos))
+                if esgotados:
+                    transaction.set_rollback(True)
+                    return Response({'erro': f"Sem estoque para: {', '.join(esgotados)}."}, status=400)
+                criar_itens(pedido, itens_validos, pratos, usuario)
+
+            publicar_evento_pedido(pedido, 'criado')
 
         print(f"Pedido criado com sucesso: ID {pedido.id}")
 
         # 4. RETORNA O PEDIDO COMPLETO (Recarrega do banco para pegar os itens criados)
-        pedido_final = Pedido.objects.get(id=pedido.id)
+        pedido_final = Pedido.objects.com_relacionados().get(id=pedido.id)
         serializer = PedidoReadSerializer(pedido_final)
 
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     except Prato.DoesNotExist:
         return Response({'erro': 'Um dos pratos enviados não existe.'}, status=400)
+    except EstoqueInsuficiente as erro:
+        # Outro pedido levou o estoque entre a validação e a baixa
+        return Response({'erro': str(erro)}, status=400)
     except Exception as e:
         print("!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
         print("ERRO FATAL EM INICIAR_COMANDA:")
@@ -326,7 +355,7 @@ class CategoriaViewSet(viewsets.ModelViewSet):
 
 
 class PratoViewSet(viewsets.ModelViewSet):
-    queryset = Prato.objects.filter(ativo=True)
+    queryset = Prato.objects.filter(ativo=True).exclude(porcoes_disponiveis=0)
     serializer_class = PratoSerializer
     permission_classes = [AllowAny]
 
@@ -336,42 +365,185 @@ class PedidoItemViewSet(viewsets.ModelViewSet):
     serializer_class = PedidoItemSerializer
     permission_classes = [AllowAny]
 
+    # Mesma conta de estoque de sincronizar_itens: cada escrita baixa (ou
+    # devolve) a diferença de porções, na transação da própria escrita
+
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            item = serializer.save()
+            self._baixar(item.prato_id, item.quantidade)
+            tocar_pedido(item.pedido_id)
+        publicar_evento_pedido(item.pedido)
+
+    def perform_update(self, serializer):
+        anterior = serializer.instance.quantidade
+        with transaction.atomic():
+            item = serializer.save()
+            self._baixar(item.prato_id, item.quantidade - anterior)
+            tocar_pedido(item.pedido_id)
+        publicar_evento_pedido(item.pedido)
+
+    def perform_destroy(self, instance):
+        pedido = instance.pedido
+        with transaction.atomic():
+            instance.delete()
+            self._baixar(instance.prato_id, -instance.quantidade)
+            tocar_pedido(pedido.pk)
+        publicar_evento_pedido(pedido)
+
+    def _baixar(self, prato_id, porcoes):
+        if not porcoes:
+            return
+        try:
+            baixar_estoque({prato_id: porcoes})
+        except EstoqueInsuficiente as erro:
+            raise ValidationError({'erro': str(erro)})
+
 
 class PagamentoViewSet(viewsets.ModelViewSet):
     queryset = Pagamento.objects.all()
     serializer_class = PagamentoSerializer
 
 
+# Folga no carimbo devolvido ao cliente: pega transações que gravaram
+# atualizado_em antes da consulta mas só confirmaram depois dela
+MARGEM_SINCRONIA = timedelta(seconds=5)
+
+
+def ler_updated_since(valor):
+    # O '+' do fuso chega como espaço quando o cliente não codifica a URL
+    try:
+        desde = parse_datetime(valor.replace(' ', '+'))
+    except ValueError:  # bem formada mas impossível (30 de fevereiro)
+        return None
+    if desde is not None and timezone.is_naive(desde):
+        desde = timezone.make_aware(desde)
+    return desde
+
+
+# Delta que não compensa responder: o cliente recarrega a fila paginada
+RESET_DELTA = {'reset': True}
+
+
+def delta_expirado(desde):
+    # Os eventos de remoção só ficam EVENTOS_RETENCAO_HORAS; antes disso o
+    # delta não saberia dos pedidos apagados (e traria o histórico inteiro)
+    return desde < timezone.now() - timedelta(hours=settings.EVENTOS_RETENCAO_HORAS)
+
+
+def consultas_delta(pedidos, desde):
+    # Pedidos alterados desde a última sincronização do cliente, de qualquer
+    # status (para ele saber quem saiu da fila), mais os ids apagados.
+    # Um além do limite, só para saber se passou dele
+    alterados = pedidos.filter(atualizado_em__gt=desde).order_by('atualizado_em', 'id')
+    removidos = EventoPedido.objects.filter(tipo='removido', criado_em__gt=desde).values_list('pedido_id', flat=True)
+    return linhas_pedidos(alterados)[:settings.COZINHA_DELTA_LIMITE + 1], removidos
+
+
+class CozinhaPagination(CursorPagination):
+    ordering = 'id'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.sincronizado_em = timezone.now() - MARGEM_SINCRONIA
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        # Carimbo para o cliente seguir depois só com ?updated_since=; os
+        # resultados já vêm em dicts (leitura.py), sem passar pelo renderer
+        return RespostaJSON({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+            'sincronizado_em': instante(self.sincronizado_em),
+        })
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class PedidoViewSet(viewsets.ModelViewSet):
     queryset = Pedido.objects.all()
     permission_classes = [AllowAny]
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ['list', 'retrieve', 'finalizar', 'entregar']:
+            queryset = queryset.com_relacionados()
+        return queryset
+
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update', 'adicionar_filha', 'cozinha']:
             return PedidoWriteSerializer
         return PedidoReadSerializer
 
+    def perform_create(self, serializer):
+        pedido = serializer.save()
+        publicar_evento_pedido(pedido, 'criado')
+
+    def perform_update(self, serializer):
+        pedido = serializer.save()
+        publicar_evento_pedido(pedido)
+
+    def perform_destroy(self, instance):
+        publicar_evento_pedido(instance, 'removido')
+        instance.delete()
+
     @action(detail=False, methods=['get', 'post'])
+    @method_decorator(idempotente)
     def cozinha(self, request):
         if request.method == 'GET':
             status_param = request.GET.get('status')
             pedidos = self.get_queryset()
-            if status_param:
-                pedidos = pedidos.filter(status=status_param)
-            serializer = PedidoReadSerializer(pedidos, many=True)
-            return Response(serializer.data)
+            if request.GET.get('updated_since'):
+                return self._cozinha_delta(request, pedidos)
+            # Sem filtro de status, só a fila ativa; histórico só pedindo o status
+            pedidos = pedidos.filter(status=status_param) if status_param else pedidos.ativos()
+            paginator = CozinhaPagination()
+            pagina = paginator.paginate_queryset(linhas_pedidos(pedidos), request, view=self)
+            return paginator.get_paginated_response(pedidos_em_dicts(pagina))
         
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         pedido = serializer.save()
+        publicar_evento_pedido(pedido, 'criado')
         return Response(PedidoReadSerializer(pedido).data, status=status.HTTP_201_CREATED)
 
+    def _cozinha_delta(self, request, pedidos):
+        desde = ler_updated_since(request.GET['updated_since'])
+        if desde is None:
+            return Response({'erro': 'updated_since inválido.'}, status=400)
+        if delta_expirado(desde):
+            return RespostaJSON(RESET_DELTA)
+
+        inicio = timezone.now()
+        alterados, removidos = consultas_delta(pedidos, desde)
+        alterados = list(alterados)
+        if len(alterados) > settings.COZINHA_DELTA_LIMITE:
+            return RespostaJSON(RESET_DELTA)
+        return RespostaJSON({
+            'reset': False,
+            'sincronizado_em': instante(inicio - MARGEM_SINCRONIA),
+            'resultados': pedidos_em_dicts(alterados),
+            'removidos': list(removidos),
+        })
+
+    @action(detail=False, methods=['get'])
+    def status_resumo(self, request):
+        """Só ids e status da comanda, para o polling do cliente (sem itens)."""
+        codigo = request.GET.get('codigo')
+        if not codigo:
+            return Response({'erro': 'Informe o código.'}, status=400)
+        resumo = resumo_status(codigo)
+        if not resumo:
+            return Response({'erro': 'Nenhuma comanda encontrada.'}, status=404)
+        return Response(resumo)
+
     @action(detail=True, methods=['post'])
     def finalizar(self, request, pk=None):
         pedido = self.get_object()
-        pedido.status = PedidoStatus.PRONTO
-        pedido.save()
+        pedido.mudar_status(PedidoStatus.PRONTO)
+        publicar_evento_pedido(pedido)
         return Response(PedidoReadSerializer(pedido).data)
 
     @action(detail=True, methods=['post'])
@@ -379,8 +551,8 @@ class PedidoViewSet(viewsets.ModelViewSet):
         pedido = self.get_object()
         if pedido.status != PedidoStatus.PRONTO:
             return Response({'erro': 'Apenas pedidos prontos podem ser entregues.'}, status=400)
-        pedido.status = PedidoStatus.ENTREGUE
-        pedido.save()
+        pedido.mudar_status(PedidoStatus.ENTREGUE)
+        publicar_evento_pedido(pedido)
         return Response(PedidoReadSerializer(pedido).data)
 
     @action(detail=True, methods=['post'])
@@ -394,7 +566,8 @@ class PedidoViewSet(viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
         with transaction.atomic():
             pedido_filho = serializer.save()
-        pedidos_relacionados = Pedido.objects.filter(codigo_acesso=comanda_pai.codigo_acesso)
+            publicar_evento_pedido(pedido_filho, 'criado')
+        pedidos_relacionados = Pedido.objects.da_comanda(comanda_pai.codigo_acesso).com_relacionados()
         return Response(PedidoReadSerializer(pedidos_relacionados, many=True).data, status=status.HTTP_201_CREATED)
 
     @action(detail=False, methods=['post'])
@@ -402,7 +575,7 @@ class PedidoViewSet(viewsets.ModelViewSet):
         codigo = request.data.get('codigo_acesso')
         if not codigo: 
             return Response({'erro': 'Código obrigatório'}, status=400)
-        pedido = Pedido.objects.filter(codigo_acesso=codigo).first()
+        pedido = Pedido.objects.da_comanda(codigo).order_by('id').first()
         if not pedido: 
             return Response({'erro': 'Pedido não encontrado'}, status=404)
         return Response(PedidoReadSerializer(pedido).data)
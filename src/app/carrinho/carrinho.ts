@@ -25,6 +25,8 @@ export class CarrinhoComponent implements OnInit, OnDestroy {
   @Output() fechar = new EventEmitter<void>();
   confirmandoPedido = false;
   private destroy$ = new Subject<void>();
+  // Mesma chave enquanto o cliente repete o "Confirmar" do mesmo carrinho
+  private confirmacao: { chave: string; payload: string } | null = null;
 
   constructor(
     private carrinhoService: CarrinhoService,
@@ -162,9 +164,10 @@ export class CarrinhoComponent implements OnInit, OnDestroy {
       };
 
       // Envia para a rota /iniciar-comanda/
-      this.apiService.iniciarComanda(payload).subscribe({
+      this.apiService.iniciarComanda(payload, this.chaveConfirmacao(payload)).subscribe({
         next: (pedidoCriado) => {
   this.confirmandoPedido = false;
+  this.confirmacao = null;
 
   // 1. O Backend criou o pedido e retornou o ID real (ex: 55)
   console.log('🚀 Pedido enviado para cozinha! ID:', pedidoCriado.id);
@@ -189,6 +192,17 @@ export class CarrinhoComponent implements OnInit, OnDestroy {
     }
   }
 
+  private chaveConfirmacao(payload: object): string {
+    const texto = JSON.stringify(payload);
+    // Carrinho alterado depois do erro é outro pedido: chave nova
+    if (!this.confirmacao || this.confirmacao.payload !== texto) {
+      // getRandomValues funciona também fora de HTTPS (randomUUID não)
+      const chave = Array.from(crypto.getRandomValues(new Uint8Array(16)), b => b.toString(16).padStart(2, '0')).join('');
+      this.confirmacao = { chave, payload: texto };
+    }
+    return this.confirmacao.chave;
+  }
+
   get carrinhoVazio(): boolean {
     return !this.comanda || this.comanda.itens.length === 0;
   }
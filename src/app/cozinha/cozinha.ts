@@ -1,9 +1,10 @@
 import { Component, OnInit } from '@angular/core';
-import { PedidosService } from '../services/pedidos.service';
+import { PedidosService, EventoPedido } from '../services/pedidos.service';
 import { OrderCardComponent } from './components/order-card/order-card';
 import { TimeModalComponent } from './components/time-modal/time-modal';
 import { CommonModule } from '@angular/common';
-import { timer, switchMap, retry, share, takeUntil, Subject } from 'rxjs';import { Order, OrderStatus } from '../models/ordel.model';
+import { takeUntil, Subject } from 'rxjs';
+import { Order, OrderStatus } from '../models/ordel.model';
 import { HeaderComponent } from './components/header/header';
 import { ItemCardapio } from '../models/item-cardapio.model';
 import { PratoService } from '../services/prato.service';
@@ -19,6 +20,9 @@ export class CozinhaComponent implements OnInit {
   private destroy$ = new Subject<void>();
   OrderStatus = OrderStatus;
   pedidos: Order[] = [];
+  // Carimbo do servidor da última carga/sincronização da fila
+  private sincronizadoEm = '';
+  private statusAtivos: string[] = ['pendente', 'em_preparo', 'pronto', 'entregue'];
   pratosCardapio: ItemCardapio[] = [];
   filteredOrders: Order[] = [];
   currentFilter: string = 'all';
@@ -43,35 +47,44 @@ export class CozinhaComponent implements OnInit {
   ) {}
 
   ngOnInit(): void {
-  // Configura um timer que dispara agora (0ms) e depois a cada 5000ms
-  timer(0, 5000)
-    .pipe(
-      // Cancela a requisição anterior se demorar mais que 5s e inicia a nova
-      switchMap(() => this.pedidoService.listarPedidosPendentes()),
-      // Se der erro na API, não mata o intervalo, apenas tenta de novo na próxima
-      retry(), 
-      // Limpa o intervalo quando o componente for destruído
-      takeUntil(this.destroy$)
-    )
+  // Em vez de baixar a lista inteira a cada 5s, carrega uma vez e aplica
+  // as mudanças empurradas pelo servidor (SSE)
+  let carregado = false;
+  this.pedidoService.escutarEventos()
+    .pipe(takeUntil(this.destroy$))
     .subscribe({
-      next: (pedidos) => {
-        console.log('🔄 Atualizando pedidos da cozinha...', pedidos.length);
-        
-        // Verifica se houve mudança real para evitar "piscar" a tela à toa
-        // (Opcional, mas recomendado se a lista for grande)
-        if (JSON.stringify(this.pedidos) !== JSON.stringify(pedidos)) {
-           this.pedidos = pedidos;
-           this.aplicarFiltro();
+      next: (evento) => {
+        if (evento.tipo === 'conectado') {
+          // Na reconexão o servidor retoma do Last-Event-ID, não precisa recarregar
+          if (!carregado) {
+            carregado = true;
+            this.carregarPedidosPendentes();
+          }
+          return;
         }
+        if (evento.tipo === 'reset') {
+          // Perdeu o histórico de eventos: busca só o que mudou desde a última carga
+          this.sincronizarPedidos();
+          return;
+        }
+        this.aplicarEvento(evento);
       },
-      error: (err) => {
-        console.error('Erro no polling da cozinha:', err);
-        // Não mostre notificação visual a cada 5s para não irritar o usuário
-        // Apenas logue no console.
-      }
+      error: (err) => console.error('Erro nos eventos da cozinha:', err)
     });
 }
 
+aplicarEvento(evento: EventoPedido): void {
+  const outros = this.pedidos.filter(p => p.id !== evento.pedido_id);
+  const pedido = evento.dados as Order;
+  // Como no delta: pedido que saiu da fila (pago, cancelado) só some da tela
+  if (evento.tipo === 'removido' || !this.statusAtivos.includes(pedido.status)) {
+    this.pedidos = outros;
+  } else {
+    this.pedidos = [...outros, this.normalizarPedido(pedido)].sort((a, b) => a.id - b.id);
+  }
+  this.aplicarFiltro();
+}
+
 ngOnDestroy(): void {
   this.destroy$.next();
   this.destroy$.complete();
@@ -79,23 +92,52 @@ ngOnDestroy(): void {
 
 carregarPedidosPendentes(): void {
   this.pedidoService.listarPedidosPendentes().subscribe({
-    next: pedidos => {
-      // Mapeia cada pedido para garantir que os itens tenham prato_nome e quantidade
-      this.pedidos = pedidos.map(pedido => ({
-        ...pedido,
-        itens: pedido.itens.map((item: any) => ({
-          prato_nome: item.prato_nome,
-          quantidade: item.quantidade,
-          observacao: item.observacao || ''
-        }))
-      }));
-
+    next: fila => {
+      this.sincronizadoEm = fila.sincronizado_em;
+      this.pedidos = fila.pedidos.map(pedido => this.normalizarPedido(pedido));
       this.aplicarFiltro();
     },
     error: () => this.mostrarNotificacao('Erro ao carregar pedidos', 'error')
   });
 }
 
+sincronizarPedidos(): void {
+  if (!this.sincronizadoEm) {
+    this.carregarPedidosPendentes();
+    return;
+  }
+  this.pedidoService.sincronizarPedidos(this.sincronizadoEm).subscribe({
+    next: delta => {
+      if (delta.reset) {
+        this.carregarPedidosPendentes();
+        return;
+      }
+      this.sincronizadoEm = delta.sincronizado_em;
+      const mudaram = new Set([...delta.removidos, ...delta.resultados.map(p => p.id)]);
+      // Pedidos que saíram da fila (pagos, cancelados) vêm no delta mas não voltam para a tela
+      const ativos = delta.resultados
+        .filter(p => this.statusAtivos.includes(p.status))
+        .map(p => this.normalizarPedido(p));
+      this.pedidos = [...this.pedidos.filter(p => !mudaram.has(p.id)), ...ativos]
+        .sort((a, b) => a.id - b.id);
+      this.aplicarFiltro();
+    },
+    error: () => this.carregarPedidosPendentes()
+  });
+}
+
+// Garante que os itens tenham prato_nome e quantidade
+private normalizarPedido(pedido: Order): Order {
+  return {
+    ...pedido,
+    itens: pedido.itens.map((item: any) => ({
+      prato_nome: item.prato_nome,
+      quantidade: item.quantidade,
+      observacao: item.observacao || ''
+    }))
+  };
+}
+
 
   carregarPedidos(): void {
     this.pedidoService.listarPedidos().subscribe({
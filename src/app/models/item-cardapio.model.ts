@@ -11,4 +11,5 @@ export interface ItemCardapio {
   preco: number;
   categoria: CategoriaCardapio;
   imagem?: string;
+  imagem_miniatura?: string;
 }
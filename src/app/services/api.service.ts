@@ -1,6 +1,7 @@
 import { Injectable } from '@angular/core';
-import { HttpClient } from '@angular/common/http';
-import { Observable } from 'rxjs';
+import { HttpClient, HttpErrorResponse } from '@angular/common/http';
+import { Observable, throwError, timer } from 'rxjs';
+import { map, retry } from 'rxjs/operators';
 // Mantendo o seu caminho (com 'enviroments' se for o caso)
 import { environment } from '../../environments/environment';
 
@@ -55,12 +56,27 @@ export class ApiService {
     return this.http.post<Pedido>(`${this.baseUrl}/pedidos/`, pedido);
   }
 
-  iniciarComanda(pedido: any): Observable<any> {
-    return this.http.post(`${this.baseUrl}/iniciar-comanda/`, pedido);
+  // Com a chave, o backend devolve a primeira resposta nas repetições em vez
+  // de criar o pedido de novo; por isso dá para repetir sozinho quando a rede cai
+  iniciarComanda(pedido: any, chaveIdempotencia?: string): Observable<any> {
+    if (!chaveIdempotencia) {
+      return this.http.post(`${this.baseUrl}/iniciar-comanda/`, pedido);
+    }
+    return this.http.post(`${this.baseUrl}/iniciar-comanda/`, pedido, {
+      headers: { 'Idempotency-Key': chaveIdempotencia }
+    }).pipe(
+      retry({
+        count: 2,
+        delay: (erro: HttpErrorResponse, tentativa: number) =>
+          erro.status === 0 ? timer(1000 * tentativa) : throwError(() => erro)
+      })
+    );
   }
 
   listarPedidosCozinha(): Observable<Pedido[]> {
-    return this.http.get<Pedido[]>(`${this.baseUrl}/pedidos/cozinha/`);
+    return this.http.get<{ results: Pedido[] }>(`${this.baseUrl}/pedidos/cozinha/`).pipe(
+      map(pagina => pagina.results)
+    );
   }
 
   // --- MÉTODOS DO GARÇOM ---
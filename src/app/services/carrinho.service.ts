@@ -1,5 +1,5 @@
 import { Injectable } from '@angular/core';
-import { BehaviorSubject, Observable } from 'rxjs';
+import { BehaviorSubject, Observable, map } from 'rxjs';
 import { HttpClient } from '@angular/common/http';
 import { ItemCardapio } from '../models/item-cardapio.model';
 import { ComandaService } from './comanda.service';
@@ -23,7 +23,8 @@ export class CarrinhoService {
   get pratosCardapio$(): Observable<ItemCardapio[]> { return this.pratosCardapioSubject.asObservable(); }
 
   private carregarPratosCardapio(): void {
-    this.http.get<ItemCardapio[]>(environment.apiUrl + '/pratos/')
+    this.http.get<{ pratos: ItemCardapio[] }>(environment.apiUrl + '/cardapio/')
+      .pipe(map(cardapio => cardapio.pratos))
       .subscribe(pratos => this.pratosCardapioSubject.next(pratos));
   }
 
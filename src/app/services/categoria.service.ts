@@ -1,6 +1,6 @@
 import { Injectable } from '@angular/core';
 import { HttpClient } from '@angular/common/http';
-import { Observable } from 'rxjs';
+import { Observable, map } from 'rxjs';
 import { environment } from '../../environments/environment';
 import { CategoriaCardapio } from '../models/item-cardapio.model';
 
@@ -14,6 +14,8 @@ export class CategoriaService {
   constructor(private http: HttpClient) {}
 
   listarCategorias(): Observable<CategoriaCardapio[]> {
-    return this.http.get<CategoriaCardapio[]>(`${this.apiUrl}/`);
+    // Mesmo snapshot do PratoService: uma só resposta em cache para o cardápio todo
+    return this.http.get<{ categorias: CategoriaCardapio[] }>(`${environment.apiUrl}/cardapio/`)
+      .pipe(map(cardapio => cardapio.categorias));
   }
 }
\ No newline at end of file
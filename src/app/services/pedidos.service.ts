@@ -1,22 +1,74 @@
-import { Injectable } from '@angular/core';
+import { Injectable, NgZone } from '@angular/core';
 import { HttpClient } from '@angular/common/http';
-import { Observable } from 'rxjs';
+import { EMPTY, Observable } from 'rxjs';
+import { expand, reduce } from 'rxjs/operators';
 import { Order, OrderStatus } from '../models/ordel.model';
 import { environment } from '../../environments/environment';
 
+export interface EventoPedido {
+  // 'conectado' e 'reset' são gerados localmente / pelo servidor para pedir recarga completa
+  tipo: 'criado' | 'atualizado' | 'removido' | 'conectado' | 'reset';
+  pedido_id?: number;
+  dados?: any;
+}
+
+interface PaginaPedidos {
+  next: string | null;
+  previous: string | null;
+  results: Order[];
+  sincronizado_em: string;
+}
+
+export interface FilaPedidos {
+  pedidos: Order[];
+  sincronizado_em: string;
+}
+
+export interface DeltaPedidos {
+  // Delta antigo ou grande demais: recarregar a fila inteira (sem os demais campos)
+  reset: boolean;
+  // Usar como updated_since na próxima sincronização
+  sincronizado_em: string;
+  resultados: Order[];
+  removidos: number[];
+}
+
 @Injectable({
   providedIn: 'root'
 })
 export class PedidosService {
   private apiUrl = environment.apiUrl + '/pedidos/';
+  private eventosUrl = environment.apiUrl + '/eventos/pedidos/';
 
-  constructor(private http: HttpClient) {}
+  constructor(private http: HttpClient, private zone: NgZone) {}
 
   listarPedidos(): Observable<Order[]> {
     return this.http.get<Order[]>(this.apiUrl);
   }
-  listarPedidosPendentes(): Observable<Order[]> {
-    return this.http.get<Order[]>(this.apiUrl + 'cozinha/'); 
+  /**
+   * Pedidos em andamento da cozinha. O backend pagina por cursor,
+   * então segue o `next` até a última página e junta tudo.
+   * O `sincronizado_em` da primeira página serve de ponto de partida para sincronizarPedidos.
+   */
+  listarPedidosPendentes(): Observable<FilaPedidos> {
+    return this.http.get<PaginaPedidos>(this.apiUrl + 'cozinha/').pipe(
+      expand(pagina => pagina.next ? this.http.get<PaginaPedidos>(pagina.next) : EMPTY),
+      reduce(
+        (fila, pagina) => ({
+          pedidos: [...fila.pedidos, ...pagina.results],
+          sincronizado_em: fila.sincronizado_em || pagina.sincronizado_em
+        }),
+        { pedidos: [], sincronizado_em: '' } as FilaPedidos
+      )
+    );
+  }
+
+  /**
+   * Só o que mudou desde `desde` (qualquer status, para saber o que saiu da fila)
+   * e os ids removidos.
+   */
+  sincronizarPedidos(desde: string): Observable<DeltaPedidos> {
+    return this.http.get<DeltaPedidos>(this.apiUrl + 'cozinha/', { params: { updated_since: desde } });
   }
 
   atualizarTempoEStatus(pedidoId: number, tempo: number, status: OrderStatus): Observable<any> {
@@ -35,13 +87,34 @@ export class PedidosService {
   }
 
   /**
-   * NOVO MÉTODO: Consulta o status e tempo estimado de um pedido de forma resumida (Polling).
+   * Consulta só o status e tempo estimado da comanda (polling leve, sem itens).
+   * Retorna a principal primeiro e depois as filhas.
    * @param codigo O código de acesso do pedido.
-   * @returns Um Observable que retorna o status e tempo estimado.
    */
   consultarStatusResumido(codigo: string): Observable<any> {
-    // ⚠️ ATENÇÃO: Ajuste este endpoint para o seu backend.
-    // Exemplo de Endpoint Leve: /api/pedidos/status_resumo/?codigo=YTFZYE
     return this.http.get<any>(`${this.apiUrl}status_resumo/?codigo=${codigo}`);
   }
-}
\ No newline at end of file
+
+  /**
+   * Escuta as mudanças de pedidos via SSE (substitui o polling de 5s).
+   * O EventSource reconecta sozinho e reenvia o Last-Event-ID, então nada se perde.
+   * Emite 'conectado' a cada (re)conexão e 'reset' quando o servidor pede recarga completa.
+   * @param codigo Opcional: limita aos pedidos de uma comanda.
+   */
+  escutarEventos(codigo?: string): Observable<EventoPedido> {
+    return new Observable<EventoPedido>(observer => {
+      const url = codigo ? `${this.eventosUrl}?codigo=${codigo}` : this.eventosUrl;
+      const source = new EventSource(url);
+
+      source.onopen = () => this.zone.run(() => observer.next({ tipo: 'conectado' }));
+      source.addEventListener('pedido', (e: MessageEvent) => {
+        this.zone.run(() => observer.next(JSON.parse(e.data)));
+      });
+      source.addEventListener('reset', () => {
+        this.zone.run(() => observer.next({ tipo: 'reset' }));
+      });
+
+      return () => source.close();
+    });
+  }
+}
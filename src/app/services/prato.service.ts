@@ -1,6 +1,6 @@
 import { Injectable } from '@angular/core';
 import { HttpClient } from '@angular/common/http';
-import { Observable } from 'rxjs';
+import { Observable, map } from 'rxjs';
 import { environment } from '../../environments/environment';
 // Reaproveitando a interface ou definindo uma nova se preferir
 import { ItemCardapio } from '../models/item-cardapio.model'; 
@@ -16,6 +16,8 @@ export class PratoService {
 
   listarPratos(): Observable<ItemCardapio[]> {
     // 🔴 ATENÇÃO: Sem headers de Authorization
-    return this.http.get<ItemCardapio[]>(`${this.apiUrl}/`);
+    // Snapshot versionado: repetições voltam 304 e o navegador reaproveita o cache
+    return this.http.get<{ pratos: ItemCardapio[] }>(`${environment.apiUrl}/cardapio/`)
+      .pipe(map(cardapio => cardapio.pratos));
   }
 }
\ No newline at end of file